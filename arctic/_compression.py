@@ -1,20 +1,40 @@
 import logging
+import struct
+import threading
+import time
+from collections import namedtuple, defaultdict, deque
+from functools import partial
 from multiprocessing.pool import ThreadPool
 
+import numpy as np
+
 try:
     from lz4.block import compress as lz4_compress, decompress as lz4_decompress
     lz4_compressHC = lambda _str: lz4_compress(_str, mode='high_compression')
 except ImportError as e:
     from lz4 import compress as lz4_compress, compressHC as lz4_compressHC, decompress as lz4_decompress
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 # ENABLE_PARALLEL mutated in global_scope. Do not remove.
 from ._config import ENABLE_PARALLEL, LZ4_HIGH_COMPRESSION, LZ4_WORKERS, LZ4_N_PARALLEL, LZ4_MINSZ_PARALLEL, \
-    BENCHMARK_MODE  # noqa # pylint: disable=unused-import
+    BENCHMARK_MODE, ZSTD_LEVEL, ZSTD_HC_LEVEL, LZ4_ADAPTIVE, LZ4_ADAPTIVE_MAX_WORKERS, \
+    LZ4_ADAPTIVE_EXPLORE_EVERY, LZ4_MINSZ_PARALLEL_DECOMPRESS  # noqa # pylint: disable=unused-import
 
 logger = logging.getLogger(__name__)
 
 
 _compress_thread_pool = None
+_compress_pool_size = None
+
+# The codec used when none is specified, and by all data written before codecs were selectable.
+DEFAULT_CODEC = 'lz4'
+
+Codec = namedtuple('Codec', ['compress', 'compressHC', 'decompress', 'decompressed_size'])
+_CODECS = {}
 
 
 def enable_parallel_lz4(mode):
@@ -31,6 +51,25 @@ def enable_parallel_lz4(mode):
     logger.info("Setting parallelisation mode to {}".format("multi-threaded" if mode else "single-threaded"))
 
 
+def enable_adaptive_compression(mode):
+    """
+    Set the global adaptive compression mode
+
+    In adaptive mode compress_array/decompress_array ignore LZ4_N_PARALLEL/LZ4_MINSZ_PARALLEL, and instead split
+    each batch across as many of the compression pool's workers (1 meaning serial) as gave the best throughput so far
+    for batches of similar chunk size. A pool created in adaptive mode has LZ4_ADAPTIVE_MAX_WORKERS workers, use
+    set_compression_pool_size to resize an existing one. See compression_stats().
+
+    Parameters
+    ----------
+        mode: `bool`
+            True: Use adaptive compression. False: Use the static LZ4_* configuration
+    """
+    global LZ4_ADAPTIVE
+    LZ4_ADAPTIVE = bool(mode)
+    logger.info("Setting adaptive compression mode to {}".format(LZ4_ADAPTIVE))
+
+
 def set_compression_pool_size(pool_size):
     """
     Set the size of the compression workers thread pool.
@@ -49,14 +88,237 @@ def set_compression_pool_size(pool_size):
     if pool_size < 1:
         raise ValueError("The compression thread pool size cannot be of size {}".format(pool_size))
 
-    global _compress_thread_pool
+    global _compress_thread_pool, _compress_pool_size
     if _compress_thread_pool is not None:
         _compress_thread_pool.close()
         _compress_thread_pool.join()
     _compress_thread_pool = ThreadPool(pool_size)
+    _compress_pool_size = pool_size
+
+
+def _get_compression_pool():
+    global _compress_thread_pool, _compress_pool_size
+    if _compress_thread_pool is None:
+        _compress_pool_size = int(LZ4_ADAPTIVE_MAX_WORKERS if LZ4_ADAPTIVE else LZ4_WORKERS)
+        _compress_thread_pool = ThreadPool(_compress_pool_size)
+    return _compress_thread_pool
+
+
+class _AdaptiveTuner(object):
+    """
+    Chooses how many workers to split a batch of (de)compressions across, from the throughput (bytes/sec) observed
+    for previous batches of the same operation and of similar average chunk size.
+    Every `explore_every` decisions the runner-up is tried instead, so the estimates follow changes in load.
+    """
+
+    # Weight of the latest observation in the throughput / queue wait estimates
+    _ALPHA = 0.3
+
+    def __init__(self, explore_every=LZ4_ADAPTIVE_EXPLORE_EVERY):
+        self._explore_every = explore_every
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._calls = 0
+            self._throughput = {}  # (op, size class, workers) -> bytes/sec
+            self._decisions = defaultdict(lambda: defaultdict(int))  # op -> workers -> count
+            self._queue_wait = {}  # op -> seconds a batch waited for a pool worker
+
+    @staticmethod
+    def _size_class(nbytes, nchunks):
+        # Chunks within a factor 2 of each other behave alike
+        return int(nbytes // nchunks).bit_length()
+
+    @staticmethod
+    def _candidates(max_workers, nchunks):
+        candidates, workers = [1], 2
+        while workers < min(max_workers, nchunks):
+            candidates.append(workers)
+            workers *= 2
+        if min(max_workers, nchunks) > 1:
+            candidates.append(min(max_workers, nchunks))
+        return candidates
+
+    def choose(self, op, nbytes, nchunks, max_workers):
+        candidates = self._candidates(max_workers, nchunks)
+        size_class = self._size_class(nbytes, nchunks)
+        with self._lock:
+            self._calls += 1
+            unexplored = [w for w in candidates if (op, size_class, w) not in self._throughput]
+            if unexplored:
+                workers = unexplored[0]
+            else:
+                ranked = sorted(candidates, key=lambda w: self._throughput[(op, size_class, w)], reverse=True)
+                explore = len(ranked) > 1 and self._calls % self._explore_every == 0
+                workers = ranked[1] if explore else ranked[0]
+            self._decisions[op][workers] += 1
+        return workers
+
+    def record(self, op, nbytes, nchunks, workers, seconds, queue_wait=0.):
+        key = (op, self._size_class(nbytes, nchunks), workers)
+        throughput = nbytes / max(seconds, 1e-9)
+        with self._lock:
+            previous = self._throughput.get(key)
+            self._throughput[key] = throughput if previous is None else \
+                self._ALPHA * throughput + (1 - self._ALPHA) * previous
+            if workers > 1:
+                previous = self._queue_wait.get(op)
+                self._queue_wait[op] = queue_wait if previous is None else \
+                    self._ALPHA * queue_wait + (1 - self._ALPHA) * previous
+
+    def stats(self):
+        with self._lock:
+            return {op: {'decisions': dict(decisions),
+                         'throughput': {(size_class, workers): tp
+                                        for (o, size_class, workers), tp in self._throughput.items() if o == op},
+                         'queue_wait': self._queue_wait.get(op, 0.)}
+                    for op, decisions in self._decisions.items()}
+
+
+_tuner = _AdaptiveTuner()
+
+
+def compression_stats():
+    """
+    Return the decisions made, and the measurements they were based on, by the adaptive compression mode
+
+    Returns
+    -------
+    `dict`
+        'adaptive': whether adaptive mode is on, 'pool_size': the size of the compression thread pool, and
+        'operations': for each operation ('compress', 'compressHC', 'decompress', suffixed with the codec if not LZ4,
+        and 'decompress_into' for reads decompressed straight into their output buffer) the number of batches run
+        on each number of workers ('decisions'), the estimated throughput in bytes/sec keyed by (chunk size class,
+        workers) ('throughput') and the average time a batch waited for a pool worker ('queue_wait', seconds).
+    """
+    return {'adaptive': LZ4_ADAPTIVE,
+            'pool_size': _compress_pool_size,
+            'operations': _tuner.stats()}
+
+
+def reset_compression_stats():
+    """
+    Forget everything the adaptive compression mode measured so far
+    """
+    _tuner.reset()
+
+
+def _adaptive_map(op, func, str_list):
+    pool = _get_compression_pool()
+    nbytes = sum(len(s) for s in str_list)
+    nchunks = len(str_list)
+    workers = _tuner.choose(op, nbytes, nchunks, _compress_pool_size)
+
+    start = time.time()
+    if workers == 1:
+        result, queue_wait = [func(s) for s in str_list], 0.
+    else:
+        def _run(batch):
+            return time.time() - start, [func(s) for s in batch]
+        step = -(-nchunks // workers)
+        batches = pool.map(_run, [str_list[i:i + step] for i in range(0, nchunks, step)])
+        result = [x for _, batch in batches for x in batch]
+        queue_wait = max(wait for wait, _ in batches)
+    _tuner.record(op, nbytes, nchunks, workers, time.time() - start, queue_wait)
+    return result
+
+
+def register_codec(name, compress, compressHC, decompress, decompressed_size):
+    """
+    Register a compression codec, so it can be selected by name (e.g. per library)
+
+    Parameters
+    ----------
+        name: `str`
+            The codec id, stored alongside the data it compressed.
+        compress, compressHC: `callable(str, typesize) -> str`
+            Standard / high compression functions. typesize is the size in bytes of the items in the input,
+            codecs that don't use it should ignore it.
+        decompress: `callable(str) -> str`
+            The inverse of compress.
+        decompressed_size: `callable(str) -> int`
+            Return the decompressed length of a compressed string, ideally without decompressing it.
+    """
+    _CODECS[name] = Codec(compress, compressHC, decompress, decompressed_size)
+
+
+def available_codecs():
+    """
+    Return the names of the registered compression codecs
+    """
+    return sorted(_CODECS)
+
+
+def get_codec(name):
+    """
+    Return the Codec registered under name
+    """
+    try:
+        return _CODECS[name]
+    except KeyError:
+        if name == 'zstd':
+            raise ValueError("Compression codec 'zstd' requires the zstandard package to be installed")
+        raise ValueError("Unknown compression codec {!r}, expected one of {}".format(name, available_codecs()))
+
+
+def _lz4_size(_str):
+    # LZ4 blocks are prefixed with their (little-endian, uint32) uncompressed size.
+    return struct.unpack('<I', _str[:4])[0]
+
+
+def _shuffle(_str, typesize):
+    # Group the n-th byte of every item together, which makes numeric data much more compressible.
+    if typesize <= 1 or len(_str) % typesize:
+        return 1, _str
+    return typesize, np.frombuffer(_str, dtype='uint8').reshape(-1, typesize).T.tostring()
+
+
+def _unshuffle(_str, typesize):
+    if typesize <= 1:
+        return _str
+    return np.frombuffer(_str, dtype='uint8').reshape(typesize, -1).T.tostring()
+
+
+def _shuffle_lz4_compress(_str, typesize=1, withHC=False):
+    typesize, _str = _shuffle(_str, typesize)
+    return struct.pack('<I', typesize) + (lz4_compressHC(_str) if withHC else lz4_compress(_str))
 
 
-def compress_array(str_list, withHC=LZ4_HIGH_COMPRESSION):
+def _shuffle_lz4_decompress(_str):
+    typesize = struct.unpack('<I', _str[:4])[0]
+    return _unshuffle(lz4_decompress(_str[4:]), typesize)
+
+
+def _zstd_compress(_str, typesize=1, withHC=False):
+    return zstandard.ZstdCompressor(level=ZSTD_HC_LEVEL if withHC else ZSTD_LEVEL).compress(_str)
+
+
+def _zstd_decompress(_str):
+    return zstandard.ZstdDecompressor().decompress(_str)
+
+
+# lz4_compress etc are looked up on every call, so they can be patched.
+register_codec('lz4',
+               lambda _str, typesize=1: lz4_compress(_str),
+               lambda _str, typesize=1: lz4_compressHC(_str),
+               lambda _str: lz4_decompress(_str),
+               _lz4_size)
+register_codec('shuffle_lz4',
+               _shuffle_lz4_compress,
+               lambda _str, typesize=1: _shuffle_lz4_compress(_str, typesize, withHC=True),
+               _shuffle_lz4_decompress,
+               lambda _str: _lz4_size(_str[4:]))
+if zstandard is not None:
+    register_codec('zstd',
+                   _zstd_compress,
+                   lambda _str, typesize=1: _zstd_compress(_str, typesize, withHC=True),
+                   _zstd_decompress,
+                   zstandard.frame_content_size)
+
+
+def compress_array(str_list, withHC=LZ4_HIGH_COMPRESSION, codec=DEFAULT_CODEC, typesize=1):
     """
     Compress an array of strings
 
@@ -65,19 +327,29 @@ def compress_array(str_list, withHC=LZ4_HIGH_COMPRESSION):
         str_list: `list[str]`
             The input list of strings which need to be compressed.
         withHC: `bool`
-            This flag controls whether lz4HC will be used.
+            This flag controls whether lz4HC (or the codec's high compression mode) will be used.
+        codec: `str`
+            The name of a registered compression codec.
+        typesize: `int`
+            The size in bytes of the items in the strings, used by shuffling codecs.
 
     Returns
     -------
     `list[str`
     The list of the compressed strings.
     """
-    global _compress_thread_pool
-
     if not str_list:
         return str_list
 
-    do_compress = lz4_compressHC if withHC else lz4_compress
+    if codec == DEFAULT_CODEC:
+        do_compress = lz4_compressHC if withHC else lz4_compress
+    else:
+        c = get_codec(codec)
+        do_compress = partial(c.compressHC if withHC else c.compress, typesize=typesize)
+
+    if LZ4_ADAPTIVE:
+        op = 'compressHC' if withHC else 'compress'
+        return _adaptive_map(op if codec == DEFAULT_CODEC else op + ':' + codec, do_compress, str_list)
 
     def can_parallelize_strlist(strlist):
         return len(strlist) > LZ4_N_PARALLEL and len(strlist[0]) > LZ4_MINSZ_PARALLEL
@@ -85,9 +357,7 @@ def compress_array(str_list, withHC=LZ4_HIGH_COMPRESSION):
     use_parallel = (ENABLE_PARALLEL and withHC) or can_parallelize_strlist(str_list)
 
     if BENCHMARK_MODE or use_parallel:
-        if _compress_thread_pool is None:
-            _compress_thread_pool = ThreadPool(LZ4_WORKERS)
-        return _compress_thread_pool.map(do_compress, str_list)
+        return _get_compression_pool().map(do_compress, str_list)
 
     return [do_compress(s) for s in str_list]
 
@@ -116,25 +386,114 @@ def compressHC_array(str_list):
     return compress_array(str_list, withHC=True)
 
 
-def decompress(_str):
+def decompress(_str, codec=DEFAULT_CODEC):
     """
     Decompress a string
     """
-    return lz4_decompress(_str)
+    if codec == DEFAULT_CODEC:
+        return lz4_decompress(_str)
+    return get_codec(codec).decompress(_str)
 
 
-def decompress_array(str_list):
+def decompressed_size(_str, codec=DEFAULT_CODEC):
     """
-    Decompress a list of strings
+    Return the length of the decompressed string, without decompressing it.
     """
-    global _compress_thread_pool
+    return get_codec(codec).decompressed_size(_str)
+
+
+def decompress_array(str_list, codec=DEFAULT_CODEC):
+    """
+    Decompress a list of strings
 
+    The strings are decompressed in parallel when there are several of them and, together, they decompress to more
+    than LZ4_MINSZ_PARALLEL_DECOMPRESS bytes. Decompressing costs roughly the same per output byte whatever the
+    number of chunks, so a few large chunks are worth parallelising as much as many small ones.
+    """
     if not str_list:
         return str_list
 
-    if not ENABLE_PARALLEL or len(str_list) <= LZ4_N_PARALLEL:
-        return [lz4_decompress(chunk) for chunk in str_list]
+    do_decompress = lz4_decompress if codec == DEFAULT_CODEC else get_codec(codec).decompress
 
-    if _compress_thread_pool is None:
-        _compress_thread_pool = ThreadPool(LZ4_WORKERS)
-    return _compress_thread_pool.map(lz4_decompress, str_list)
+    if LZ4_ADAPTIVE:
+        return _adaptive_map('decompress' if codec == DEFAULT_CODEC else 'decompress:' + codec,
+                             do_decompress, str_list)
+
+    if not ENABLE_PARALLEL or len(str_list) < 2 or \
+            sum(decompressed_size(chunk, codec) for chunk in str_list) < LZ4_MINSZ_PARALLEL_DECOMPRESS:
+        return [do_decompress(chunk) for chunk in str_list]
+
+    return _get_compression_pool().map(do_decompress, str_list)
+
+
+def _decompress_into(buf, offset, _str, codec=DEFAULT_CODEC):
+    data = decompress(_str, codec)
+    buf[offset:offset + len(data)] = data
+
+
+def _decompress_stream(chunks, buf, workers):
+    """
+    Decompress the chunks into buf, with at most `workers` of them in flight on the compression thread pool
+    (twice the pool's size if workers is None, none - in this thread - if it is 1). Return the longest time a
+    chunk waited for a pool worker.
+    """
+    if workers == 1:
+        for offset, _str, codec in chunks:
+            _decompress_into(buf, offset, _str, codec)
+        return 0.
+
+    pool = _get_compression_pool()
+    # Bounded, so a fast producer can't queue up all of its (compressed) chunks at once
+    in_flight = workers or 2 * _compress_pool_size
+    waits = []
+
+    def _run(submitted, offset, _str, codec):
+        waits.append(time.time() - submitted)
+        _decompress_into(buf, offset, _str, codec)
+
+    pending = deque()
+    try:
+        for offset, _str, codec in chunks:
+            pending.append(pool.apply_async(_run, (time.time(), offset, _str, codec)))
+            if len(pending) >= in_flight:
+                pending.popleft().get()
+        while pending:
+            pending.popleft().get()
+    finally:
+        # On error, don't leave the other chunks writing into buf once the caller has the exception
+        for p in pending:
+            p.wait()
+    return max(waits) if waits else 0.
+
+
+def decompress_into(chunks, buf, nchunks=None):
+    """
+    Decompress a stream of strings into slices of a preallocated buffer
+
+    Parameters
+    ----------
+        chunks: iterable of (`int`, `str`, `str`)
+            Triples of (offset into buf, compressed string, codec). In parallel mode, and when buf is at least
+            LZ4_MINSZ_PARALLEL_DECOMPRESS bytes, each chunk is handed to the compression thread pool as soon as it
+            is produced, so decompression overlaps with producing the next chunk (e.g. fetching it from mongo).
+            In adaptive mode the number of chunks in flight at once is chosen like the workers of decompress_array.
+        buf: `memoryview`
+            A writable buffer, large enough to hold all the decompressed chunks.
+        nchunks: `int`
+            The number of chunks, if known up front. Only used by the adaptive mode to tell reads apart by
+            their chunk size.
+    """
+    if LZ4_ADAPTIVE:
+        _get_compression_pool()
+        nbytes, nchunks = len(buf), max(nchunks or 1, 1)
+        workers = _tuner.choose('decompress_into', nbytes, nchunks, _compress_pool_size)
+        # The time measured includes producing the chunks, which costs the same whatever the choice
+        start = time.time()
+        queue_wait = _decompress_stream(chunks, buf, workers)
+        _tuner.record('decompress_into', nbytes, nchunks, workers, time.time() - start, queue_wait)
+        return
+
+    if not ENABLE_PARALLEL or len(buf) < LZ4_MINSZ_PARALLEL_DECOMPRESS:
+        _decompress_stream(chunks, buf, 1)
+    else:
+        _decompress_stream(chunks, buf, None)
@@ -1,4 +1,5 @@
 import logging
+import multiprocessing
 import os
 
 import pymongo
@@ -13,6 +14,28 @@ logger = logging.getLogger(__name__)
 # Controls is the write handler can only match handlers for the specific data type. No fallback to pickling if True.
 STRICT_WRITE_HANDLER_MATCH = bool(os.environ.get('STRICT_WRITE_HANDLER_MATCH'))
 
+# VersionStore.read_batch fetches the segments of this many symbols with each query...
+ARCTIC_READ_BATCH_SIZE = int(os.environ.get('ARCTIC_READ_BATCH_SIZE', 100))
+
+# ...and decodes the symbols on this many threads
+ARCTIC_READ_BATCH_WORKERS = int(os.environ.get('ARCTIC_READ_BATCH_WORKERS', 4))
+
+# VersionStore.write_batch writes the data of the symbols on this many threads
+ARCTIC_WRITE_BATCH_WORKERS = int(os.environ.get('ARCTIC_WRITE_BATCH_WORKERS', 4))
+
+# Library metadata field recording the state of the library's symbol catalogue, a collection holding the latest
+# version number and deleted flag of each symbol, which list_symbols and has_symbol are then served from.
+# Enable it with arctic.initialize_library(..., symbol_catalogue=True) or VersionStore.rebuild_symbol_catalogue().
+SYMBOL_CATALOGUE_KEY = 'SYMBOL_CATALOGUE'
+# How long a VersionStore relies on the state of its library's symbol catalogue, while the catalogue isn't ready, before
+# looking it up again. rebuild_symbol_catalogue waits this long before cataloguing the existing symbols.
+ARCTIC_SYMBOL_CATALOGUE_STATE_SECONDS = float(os.environ.get('ARCTIC_SYMBOL_CATALOGUE_STATE_SECONDS', 10))
+
+# For how many seconds the in-process cache of symbols' latest version documents may serve them (0, the default,
+# disables it), and how many symbols it holds. This process's own writes invalidate the cached versions at once.
+ARCTIC_VERSION_CACHE_SECONDS = float(os.environ.get('ARCTIC_VERSION_CACHE_SECONDS', 0))
+ARCTIC_VERSION_CACHE_ENTRIES = int(os.environ.get('ARCTIC_VERSION_CACHE_ENTRIES', 100000))
+
 
 # -----------------------------
 # NdArrayStore configuration
@@ -20,6 +43,51 @@ STRICT_WRITE_HANDLER_MATCH = bool(os.environ.get('STRICT_WRITE_HANDLER_MATCH'))
 # Extra sanity checks for corruption during appends. Introduces a 5-7% performance hit (off by default)
 CHECK_CORRUPTION_ON_APPEND = bool(os.environ.get('CHECK_CORRUPTION_ON_APPEND'))
 
+# Fast appends only write the new segment: they never rewrite the symbol's appended segments (see
+# VersionStore.compact) and check the written segments in a background thread rather than before appending.
+ARCTIC_FAST_APPEND = bool(os.environ.get('ARCTIC_FAST_APPEND'))
+
+# Number of concurrent cursors used to fetch the segments of a single read (1 disables parallel fetching).
+# Only worth raising for symbols with many segments, where a single cursor can't keep up with the cluster.
+ARCTIC_FETCH_PARALLELISM = int(os.environ.get('ARCTIC_FETCH_PARALLELISM', 1))
+
+# Number of threads decoding the buckets of a TickStore read while its cursor is being iterated
+# (1, the default, decodes each bucket in the reading thread as it is fetched).
+ARCTIC_TICKSTORE_DECODE_WORKERS = int(os.environ.get('ARCTIC_TICKSTORE_DECODE_WORKERS', 1))
+
+# TickStore reads first gather the buckets' headers to size their result, then decode each bucket straight into its
+# slice of columns allocated once, rather than concatenating per-bucket arrays (off by default).
+ARCTIC_TICKSTORE_PREALLOCATE = bool(os.environ.get('ARCTIC_TICKSTORE_PREALLOCATE'))
+
+# Upper bound on the uncompressed bytes a write slices, compresses and sends to mongo in one batch.
+# Large writes are streamed in batches of this size, which bounds their memory overhead.
+ARCTIC_WRITE_INFLIGHT_BYTES = int(os.environ.get('ARCTIC_WRITE_INFLIGHT_BYTES', 256 * 1024 ** 2))  # 256 MB
+
+# Size of the in-process cache of decompressed segments, shared by all libraries (0, the default, disables it).
+# Repeated reads of the same data are then served from memory, only the segments' SHAs are fetched from mongo.
+ARCTIC_SEGMENT_CACHE_BYTES = int(os.environ.get('ARCTIC_SEGMENT_CACHE_BYTES', 0))
+
+# Directory of an on-disk cache of whole (decompressed) versions, shared by the processes of a host, and its size.
+# Cached versions are read back as memory-mapped arrays (disabled unless a directory is set).
+ARCTIC_DISK_CACHE_DIR = os.environ.get('ARCTIC_DISK_CACHE_DIR')
+ARCTIC_DISK_CACHE_BYTES = int(os.environ.get('ARCTIC_DISK_CACHE_BYTES', 10 * 1024 ** 3))  # 10 GB
+
+# Library metadata field which makes PandasDataFrameStore write each column of a segment as its own compressed block,
+# so reads with columns=[...] fetch and decompress only those columns.
+# Set it with arctic.initialize_library(..., columnar_layout=True) or ArcticLibraryBinding.set_library_metadata.
+COLUMNAR_LAYOUT_KEY = 'COLUMNAR_LAYOUT'
+
+# Whether libraries which don't set COLUMNAR_LAYOUT write DataFrames column by column (off by default)
+ARCTIC_COLUMNAR_LAYOUT = bool(os.environ.get('ARCTIC_COLUMNAR_LAYOUT'))
+
+# Library metadata field listing the fields (DataFrame columns) whose per-segment min/max/NaN count statistics
+# (zone maps) are kept in the version document, or True for all the numeric ones. Reads with where=... skip the
+# segments the statistics rule out. Set it with arctic.initialize_library(..., zone_maps=['price']).
+ZONE_MAPS_KEY = 'ZONE_MAPS'
+
+# Whether libraries which don't set ZONE_MAPS keep zone maps of all the numeric fields (off by default)
+ARCTIC_ZONE_MAPS = bool(os.environ.get('ARCTIC_ZONE_MAPS'))
+
 
 # -----------------------------
 # Serialization configuration
@@ -83,9 +151,34 @@ LZ4_N_PARALLEL = os.environ.get('LZ4_N_PARALLEL', 16)
 # Minimum data size to use parallel compression
 LZ4_MINSZ_PARALLEL = os.environ.get('LZ4_MINSZ_PARALLEL', 0.5 * 1024 ** 2)  # 0.5 MB
 
+# Minimum total (decompressed) size of a batch of chunks to use parallel decompression
+LZ4_MINSZ_PARALLEL_DECOMPRESS = int(os.environ.get('LZ4_MINSZ_PARALLEL_DECOMPRESS', 1024 ** 2))  # 1 MB
+
 # Enable this when you run the benchmark_lz4.py
 BENCHMARK_MODE = False
 
+# Adaptive mode: pick serial or parallel (de)compression, and how many workers to use, from the throughput observed
+# at runtime instead of the static LZ4_WORKERS/LZ4_N_PARALLEL/LZ4_MINSZ_PARALLEL above (default is False).
+LZ4_ADAPTIVE = bool(os.environ.get('LZ4_ADAPTIVE'))
+
+# The largest number of workers the adaptive mode may use (the compression pool is created with this size)
+LZ4_ADAPTIVE_MAX_WORKERS = int(os.environ.get('LZ4_ADAPTIVE_MAX_WORKERS', min(multiprocessing.cpu_count(), 8)))
+
+# How often (in batches) the adaptive mode re-measures its second best choice
+LZ4_ADAPTIVE_EXPLORE_EVERY = int(os.environ.get('LZ4_ADAPTIVE_EXPLORE_EVERY', 20))
+
+# Compression levels used by the (optional) zstd codec, for standard and high compression respectively
+ZSTD_LEVEL = int(os.environ.get('ZSTD_LEVEL', 3))
+ZSTD_HC_LEVEL = int(os.environ.get('ZSTD_HC_LEVEL', 19))
+
+# Library metadata field holding the codec the NdarrayStore-based handlers compress new segments with.
+# Set it with arctic.initialize_library(..., compression_codec='zstd') or ArcticLibraryBinding.set_library_metadata.
+COMPRESSION_CODEC_KEY = 'COMPRESSION_CODEC'
+
+# Codec used by libraries which don't set one ('lz4', 'shuffle_lz4' or, if zstandard is installed, 'zstd').
+# Data written with any of them can be read back regardless of this setting.
+ARCTIC_COMPRESSION_CODEC = os.environ.get('ARCTIC_COMPRESSION_CODEC', 'lz4')
+
 
 # ---------------------------
 # Async arctic
@@ -503,6 +503,8 @@ class ArcticLibraryBinding(object):
         database_name, library = self._parse_db_lib(library)
         self.library = library
         self.database_name = database_name
+        # The library's metadata document, as read by get_cached_library_metadata
+        self._cached_metadata = None
         self._auth(self.arctic._conn[self.database_name])
 
     @property
@@ -644,7 +646,20 @@ class ArcticLibraryBinding(object):
         else:
             return None
 
+    @mongo_retry
+    def get_cached_library_metadata(self, field):
+        """
+        As get_library_metadata, but the metadata document is only fetched the first time, for settings read on
+        every write (e.g. the compression codec). Changes made with set_library_metadata through another binding
+        (e.g. by another process) aren't seen by this one.
+        """
+        if self._cached_metadata is None:
+            lib_metadata = self._library_coll[self.arctic.METADATA_COLL].find_one({"_id": self.arctic.METADATA_DOC_ID})
+            self._cached_metadata = lib_metadata or {}
+        return self._cached_metadata.get(field)
+
     @mongo_retry
     def set_library_metadata(self, field, value):
         self._library_coll[self.arctic.METADATA_COLL].update_one({'_id': self.arctic.METADATA_DOC_ID},
                                                                  {'$set': {field: value}}, upsert=True)
+        self._cached_metadata = None
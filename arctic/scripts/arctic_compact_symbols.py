@@ -0,0 +1,88 @@
+from __future__ import print_function
+
+import logging
+import optparse
+from multiprocessing.pool import ThreadPool
+
+import pymongo
+
+from .utils import do_db_auth, setup_logging
+from ..arctic import Arctic, ArcticLibraryBinding
+from ..hooks import get_mongodb_uri
+
+logger = logging.getLogger(__name__)
+
+
+def compact_symbols(lib, symbols, workers=4):
+    """
+    Compact the symbols on a pool of workers threads.
+    Returns a dict of symbol -> (segments before, segments after), or the exception raised compacting it.
+    """
+    def _compact(symbol):
+        try:
+            return symbol, lib.compact(symbol)
+        except Exception as e:
+            logger.exception("Failed to compact %s" % symbol)
+            return symbol, e
+
+    pool = ThreadPool(workers)
+    try:
+        return dict(pool.map(_compact, symbols))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def main():
+    usage = """usage: %prog [options]
+
+    Compacts the latest version of symbols whose data is spread over more segments than needed (e.g. after many
+    appends) by rewriting it, as a new version, into full-sized segments. Must be used on a Arctic VersionStore
+    library instance.
+
+    Example:
+        arctic_compact_symbols --host=hostname --library=arctic_jblackburn.my_library
+    """
+    setup_logging()
+
+    parser = optparse.OptionParser(usage=usage)
+    parser.add_option("--host", default='localhost', help="Hostname, or clustername. Default: localhost")
+    parser.add_option("--library", help="The name of the library. e.g. 'arctic_jblackburn.library'")
+    parser.add_option("--symbols", help="The symbols to compact - comma separated (default all)")
+    parser.add_option("--workers", default=4, type='int', help="Symbols to compact concurrently. Default: 4")
+
+    (opts, _) = parser.parse_args()
+
+    if not opts.library:
+        parser.error('Must specify the Arctic library e.g. arctic_jblackburn.library!')
+    db_name, _ = ArcticLibraryBinding._parse_db_lib(opts.library)
+
+    print("Compacting symbols in : %s on mongo %s" % (opts.library, opts.host))
+    c = pymongo.MongoClient(get_mongodb_uri(opts.host))
+
+    if not do_db_auth(opts.host, c, db_name):
+        logger.error('Authentication Failed. Exiting.')
+        return
+    lib = Arctic(c)[opts.library]
+
+    if opts.symbols:
+        symbols = opts.symbols.split(',')
+    else:
+        symbols = lib.list_symbols()
+        logger.info("Found %s symbols" % len(symbols))
+
+    results = compact_symbols(lib, symbols, opts.workers)
+    before = after = 0
+    for symbol in sorted(results):
+        if isinstance(results[symbol], Exception):
+            print("%s: failed (%s)" % (symbol, results[symbol]))
+            continue
+        print("%s: %d -> %d segments" % ((symbol,) + results[symbol]))
+        before += results[symbol][0]
+        after += results[symbol][1]
+    print("Total: %d -> %d segments" % (before, after))
+    logger.info("Done")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+from __future__ import print_function
+
+import logging
+import optparse
+
+import pymongo
+
+from .utils import do_db_auth, setup_logging
+from ..arctic import Arctic, ArcticLibraryBinding
+from ..hooks import get_mongodb_uri
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    usage = """usage: %prog [options]
+
+    Builds (or rebuilds) the symbol catalogue of an Arctic VersionStore library, from which list_symbols and
+    has_symbol are then served. The library can be in use while the catalogue is being built.
+
+    Example:
+        arctic_rebuild_symbol_catalogue --host=hostname --library=arctic_jblackburn.my_library
+    """
+    setup_logging()
+
+    parser = optparse.OptionParser(usage=usage)
+    parser.add_option("--host", default='localhost', help="Hostname, or clustername. Default: localhost")
+    parser.add_option("--library", help="The name of the library. e.g. 'arctic_jblackburn.library'")
+
+    (opts, _) = parser.parse_args()
+
+    if not opts.library:
+        parser.error('Must specify the Arctic library e.g. arctic_jblackburn.library!')
+    db_name, _ = ArcticLibraryBinding._parse_db_lib(opts.library)
+
+    print("Rebuilding the symbol catalogue of: %s on mongo %s" % (opts.library, opts.host))
+    c = pymongo.MongoClient(get_mongodb_uri(opts.host))
+
+    if not do_db_auth(opts.host, c, db_name):
+        logger.error('Authentication Failed. Exiting.')
+        return
+
+    Arctic(c)[opts.library].rebuild_symbol_catalogue()
+    logger.info("Done")
+
+
+if __name__ == '__main__':
+    main()
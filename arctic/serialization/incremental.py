@@ -19,9 +19,24 @@ ABC = abc.ABCMeta('ABC', (object,), {})
 log = logging.getLogger(__name__)
 
 
+# Non-contiguous arrays are hashed in slices of about this many bytes, which bounds the temporary copies
+_CHECKSUM_CHUNK_SIZE = 16 * 1024 * 1024
+
+
 def incremental_checksum(item, curr_sha=None, is_bytes=False):
+    """
+    Update curr_sha (or a new sha1) with the bytes of item, as they would be returned by item.tostring().
+    C-contiguous arrays are hashed in place, other arrays a slice of rows at a time.
+    """
     curr_sha = hashlib.sha1() if curr_sha is None else curr_sha
-    curr_sha.update(item if is_bytes else item.tostring())
+    if is_bytes:
+        curr_sha.update(item)
+    elif item.flags['C_CONTIGUOUS']:
+        curr_sha.update(memoryview(item.reshape(-1).view('uint8')))
+    else:
+        rows = max(1, _CHECKSUM_CHUNK_SIZE // max(1, item[:1].nbytes))
+        for i in range(0, len(item), rows):
+            curr_sha.update(item[i:i + rows].tostring())
     return curr_sha
 
 
@@ -5,7 +5,7 @@ import numpy.ma as ma
 import pandas as pd
 from bson import Binary, SON
 
-from .._compression import compress, decompress, compress_array
+from .._compression import compress, decompress_array, compress_array
 from ._serializer import Serializer
 
 try:
@@ -143,7 +143,27 @@ class FrameConverter(object):
         """
         Decode a Pymongo SON object into an Pandas DataFrame
         """
-        cols = columns or doc[METADATA][COLUMNS]
+        return self.objify_many([doc], columns)[0]
+
+    def objify_many(self, docs, columns=None):
+        """
+        Decode a list of Pymongo SON objects into Pandas DataFrames, decompressing the data of all
+        of them in a single batch
+        """
+        cols = [columns or doc[METADATA][COLUMNS] for doc in docs]
+        compressed = []
+        for doc, doc_cols in zip(docs, cols):
+            for col in doc_cols:
+                if col in doc[METADATA][LENGTHS]:
+                    compressed.append(doc[DATA][doc[METADATA][LENGTHS][col][0]: doc[METADATA][LENGTHS][col][1] + 1])
+                    if MASK in doc[METADATA] and col in doc[METADATA][MASK]:
+                        compressed.append(doc[METADATA][MASK][col])
+        decompressed = iter(decompress_array(compressed))
+
+        return [self._objify(doc, doc_cols, decompressed) for doc, doc_cols in zip(docs, cols)]
+
+    @staticmethod
+    def _objify(doc, cols, decompressed):
         data = {}
 
         for col in cols:
@@ -152,13 +172,11 @@ class FrameConverter(object):
             if col not in doc[METADATA][LENGTHS]:
                 d = [np.nan]
             else:
-                d = decompress(doc[DATA][doc[METADATA][LENGTHS][col][0]: doc[METADATA][LENGTHS][col][1] + 1])
                 # d is ready-only but that's not an issue since DataFrame will copy the data anyway.
-                d = np.frombuffer(d, doc[METADATA][DTYPE][col])
+                d = np.frombuffer(next(decompressed), doc[METADATA][DTYPE][col])
 
                 if MASK in doc[METADATA] and col in doc[METADATA][MASK]:
-                    mask_data = decompress(doc[METADATA][MASK][col])
-                    mask = np.frombuffer(mask_data, 'bool')
+                    mask = np.frombuffer(next(decompressed), 'bool')
                     d = ma.masked_array(d, mask)
             data[col] = d
 
@@ -224,7 +242,7 @@ class FrametoArraySerializer(Serializer):
         if not isinstance(data, list):
             df = self.converter.objify(data, columns)
         else:
-            df = pd.concat([self.converter.objify(d, columns) for d in data], ignore_index=not index)
+            df = pd.concat(self.converter.objify_many(data, columns), ignore_index=not index)
 
         if index:
             df = df.set_index(meta[INDEX])
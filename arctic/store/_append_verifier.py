@@ -0,0 +1,114 @@
+import logging
+import threading
+from collections import defaultdict
+
+from pymongo.errors import PyMongoError
+from six.moves import queue
+
+from .._util import mongo_count
+
+logger = logging.getLogger(__name__)
+
+
+class AppendVerifier(object):
+    """
+    Checks, on a background thread, the segments of the versions created by fast appends: that there are as many
+    of them as the version expects, and that the last one ends at the version's last row. Symbols failing the
+    checks have their next append rewrite (and so repair) the appended segments.
+
+    Also counts the fast appends, and the appends which had to take the slow path instead, by reason.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._failed = set()
+        self.fast = 0
+        self.slow = defaultdict(int)
+        self.verified = 0
+        self.failed = 0
+
+    def fast_path(self):
+        with self._lock:
+            self.fast += 1
+
+    def slow_path(self, reason):
+        with self._lock:
+            self.slow[reason] += 1
+
+    def submit(self, collection, symbol, version, spec):
+        """
+        Verify version, written by a fast append, whose segments are found with spec
+        """
+        self._queue.put((collection, symbol, version['_id'], version['segment_count'], version['up_to'], spec))
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='arctic-append-verifier')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def needs_rewrite(self, collection, symbol):
+        """
+        Whether the symbol failed verification, in which case its next append should rewrite it
+        """
+        with self._lock:
+            if (collection.full_name, symbol) in self._failed:
+                self._failed.discard((collection.full_name, symbol))
+                return True
+            return False
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                self._verify(*item)
+            except PyMongoError as e:
+                logger.warning("Couldn't verify the append to {} (version id {}): {}".format(item[1], item[2], e))
+            finally:
+                self._queue.task_done()
+
+    def _verify(self, collection, symbol, version_id, segment_count, up_to, spec):
+        count = mongo_count(collection, filter=spec)
+        last = collection.find_one(spec, {'segment': 1}, sort=[('segment', -1)])
+        if count == segment_count and (last['segment'] + 1 if last else 0) == up_to:
+            with self._lock:
+                self.verified += 1
+            return
+        logger.error("Append to {} (version id {}) has {} segments up to {}, expected {} up to {}. "
+                     "Its next append will rewrite it".format(symbol, version_id, count,
+                                                              last['segment'] + 1 if last else 0, segment_count, up_to))
+        with self._lock:
+            self.failed += 1
+            self._failed.add((collection.full_name, symbol))
+
+    def join(self):
+        """
+        Wait for the pending verifications
+        """
+        self._queue.join()
+
+    def stats(self):
+        with self._lock:
+            return {'fast': self.fast,
+                    'slow': dict(self.slow),
+                    'verified': self.verified,
+                    'failed': self.failed,
+                    'pending': self._queue.qsize()}
+
+    def reset(self):
+        with self._lock:
+            self.fast = self.verified = self.failed = 0
+            self.slow.clear()
+            self._failed.clear()
+
+
+append_verifier = AppendVerifier()
+
+
+def append_stats():
+    """
+    Return the number of fast appends, of the appends which took the slow path (by reason), and of the fast
+    appends verified, failing verification and pending verification
+    """
+    return append_verifier.stats()
@@ -0,0 +1,140 @@
+import logging
+import os
+import threading
+
+import numpy as np
+
+from .._config import ARCTIC_DISK_CACHE_DIR, ARCTIC_DISK_CACHE_BYTES
+
+logger = logging.getLogger(__name__)
+
+_SUFFIX = '.bin'
+
+
+class DiskCache(object):
+    """
+    A directory of raw (decompressed) NdarrayStore versions, one file per version, served back as memory-mapped
+    arrays. Any number of processes on a host can share a cache directory, and the OS page cache then holds a
+    single copy of the data they read.
+
+    Files are named after the version's _id. A version document is never modified once written (writes and appends
+    create a new version), so neither are the files. The least recently read files are deleted once the directory
+    grows above max_bytes.
+    """
+
+    def __init__(self, directory=None, max_bytes=0):
+        self._lock = threading.Lock()
+        self.configure(directory, max_bytes)
+
+    def configure(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = int(max_bytes)
+        if self.enabled:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            self._evict()
+
+    @property
+    def enabled(self):
+        return bool(self.directory) and self.max_bytes > 0
+
+    def _path(self, version):
+        return os.path.join(self.directory, str(version['_id']) + _SUFFIX)
+
+    def get(self, version, dtype):
+        """
+        Return the version's data as a (copy-on-write) memory-mapped array, or None if it isn't cached
+        """
+        path = self._path(version)
+        shape = (int(version['up_to']),) + tuple(version.get('shape', (-1,))[1:])
+        try:
+            if os.path.getsize(path) != dtype.itemsize * int(np.prod(shape)):
+                logger.warning("Discarding cached %s, its size doesn't match the version" % path)
+                os.remove(path)
+                return None
+            # Move to the back of the (mtime ordered) eviction queue
+            os.utime(path, None)
+            return np.memmap(path, dtype=dtype, mode='c', shape=shape).view(np.ndarray)
+        except (IOError, OSError):
+            return None
+
+    def put(self, version, item):
+        """
+        Cache the (complete) data of version
+        """
+        if not item.nbytes or item.nbytes > self.max_bytes:
+            return
+        path = self._path(version)
+        tmp_path = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.current_thread().ident)
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(memoryview(np.ascontiguousarray(item).reshape(-1).view('uint8')))
+            os.rename(tmp_path, path)
+        except (IOError, OSError) as e:
+            logger.warning("Failed to cache %s: %s" % (path, e))
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._evict()
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(_SUFFIX):
+                self._remove(os.path.join(self.directory, name))
+
+    def stats(self):
+        files = self._files()
+        return {'directory': self.directory,
+                'versions': len(files),
+                'bytes': sum(size for _, size, _ in files),
+                'max_bytes': self.max_bytes}
+
+    def _files(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(_SUFFIX):
+                path = os.path.join(self.directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:  # Evicted by someone else
+                    continue
+                files.append((path, st.st_size, st.st_mtime))
+        return files
+
+    def _evict(self):
+        with self._lock:
+            files = sorted(self._files(), key=lambda f: f[2])
+            nbytes = sum(size for _, size, _ in files)
+            for path, size, _ in files:
+                if nbytes <= self.max_bytes:
+                    break
+                self._remove(path)
+                nbytes -= size
+
+    @staticmethod
+    def _remove(path):
+        # Readers which have the file mapped keep their (unlinked) copy
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+disk_cache = DiskCache(ARCTIC_DISK_CACHE_DIR, ARCTIC_DISK_CACHE_BYTES)
+
+
+def disk_cache_stats():
+    """
+    Return the disk cache's directory, its size in versions and bytes, and its maximum size
+    """
+    return disk_cache.stats() if disk_cache.enabled else {'directory': None, 'versions': 0, 'bytes': 0,
+                                                          'max_bytes': 0}
+
+
+def enable_disk_cache(directory, max_bytes):
+    """
+    Cache the data of NdarrayStore (and so PandasStore) versions in directory, using at most max_bytes of disk.
+    Pass directory=None to disable it.
+    """
+    disk_cache.configure(directory, max_bytes)
+    logger.info("Setting the disk cache to {} ({} bytes)".format(directory, max_bytes))
@@ -1,19 +1,27 @@
-import hashlib
 import logging
+import threading
+from contextlib import contextmanager
 from operator import itemgetter
 
 import numpy as np
 import pymongo
 from bson.binary import Binary
 from pymongo.errors import OperationFailure, DuplicateKeyError, BulkWriteError
-from six.moves import xrange
+from six.moves import xrange, queue
 
+from ._append_verifier import append_verifier
+from ._disk_cache import disk_cache
+from ._segment_cache import segment_cache, segment_key
 from ._version_store_utils import checksum, version_base_or_id, _fast_check_corruption
-from .._compression import compress_array, decompress
+from ._zone_map import zone_map, zone_map_fields, parse_where, where_mask, candidate_ranges
+from .._compression import compress_array, decompress_array, decompressed_size, decompress_into, DEFAULT_CODEC
 # CHECK_CORRUPTION_ON_APPEND used in global scope, do not remove.
 from .._config import CHECK_CORRUPTION_ON_APPEND, FW_POINTERS_CONFIG_KEY, FW_POINTERS_REFS_KEY, \
-    ARCTIC_FORWARD_POINTERS_CFG, ARCTIC_FORWARD_POINTERS_RECONCILE, FwPointersCfg
+    ARCTIC_FORWARD_POINTERS_CFG, ARCTIC_FORWARD_POINTERS_RECONCILE, FwPointersCfg, ARCTIC_FETCH_PARALLELISM, \
+    ARCTIC_COMPRESSION_CODEC, COMPRESSION_CODEC_KEY, ARCTIC_WRITE_INFLIGHT_BYTES, ZONE_MAPS_KEY, ARCTIC_ZONE_MAPS, \
+    ARCTIC_FAST_APPEND
 from .._util import mongo_count, get_fwptr_config
+from ..serialization.incremental import incremental_checksum
 from ..decorators import mongo_retry
 from ..exceptions import UnhandledDtypeException, DataIntegrityException
 
@@ -22,6 +30,8 @@ logger = logging.getLogger(__name__)
 _CHUNK_SIZE = 2 * 1024 * 1024 - 2048  # ~2 MB (a bit less for usePowerOf2Sizes)
 _APPEND_SIZE = 1 * 1024 * 1024  # 1MB
 _APPEND_COUNT = 60  # 1 hour of 1 min data
+# version['layout'] of versions whose (compressed) segments hold each field of the array as a separate block
+COLUMNAR = 'columnar'
 
 
 def _promote_struct_dtypes(dtype1, dtype2):
@@ -113,11 +123,74 @@ def _resize_with_dtype(arr, dtype):
         return arr.astype(dtype)
 
 
+def _segment_size(segment):
+    """
+    The size of the segment's data once decompressed
+    """
+    if not segment['compressed']:
+        return len(segment['data'])
+    return decompressed_size(segment['data'], segment.get('codec', DEFAULT_CODEC))
+
+
+def _segment_rows(segment, dtype):
+    """
+    The number of rows of dtype in the segment
+    """
+    if segment.get('layout') == COLUMNAR:
+        # Any of its (fetched) columns will do
+        i, data = next(iter(segment['columns'].items()))
+        return decompressed_size(data, segment.get('codec', DEFAULT_CODEC)) // dtype[int(i)].itemsize
+    return _segment_size(segment) // dtype.itemsize
+
+
+def _read_bounds(version, index_range):
+    """
+    The [from, to) rows of version a read of index_range covers
+    """
+    from_index = index_range[0] if index_range else None
+    to_index = version['up_to']
+    if index_range and index_range[1] and index_range[1] < version['up_to']:
+        to_index = index_range[1]
+    return from_index, to_index
+
+
+def _project(arr, names):
+    """
+    Copy the fields names (in that order) of the structured array arr into a new array
+    """
+    rtn = np.empty(len(arr), dtype=np.dtype([(n, arr.dtype.fields[n][0]) for n in names],
+                                            metadata=dict(arr.dtype.metadata or {})))
+    for n in names:
+        rtn[n] = arr[n]
+    return rtn
+
+
+def _compression_codec(arctic_lib):
+    """
+    The codec new segments of this library are compressed with
+    """
+    codec = arctic_lib.get_cached_library_metadata(COMPRESSION_CODEC_KEY)
+    return ARCTIC_COMPRESSION_CODEC if codec is None else codec
+
+
+def _zone_map_columns(arctic_lib):
+    """
+    The fields this library keeps zone maps for: a list of names, True for all the numeric ones or False for none
+    """
+    columns = arctic_lib.get_cached_library_metadata(ZONE_MAPS_KEY)
+    return ARCTIC_ZONE_MAPS if columns is None else columns
+
+
 def set_corruption_check_on_append(enable):
     global CHECK_CORRUPTION_ON_APPEND
     CHECK_CORRUPTION_ON_APPEND = bool(enable)
 
 
+def set_fast_append(enable):
+    global ARCTIC_FAST_APPEND
+    ARCTIC_FAST_APPEND = bool(enable)
+
+
 def _update_fw_pointers(collection, symbol, version, previous_version, is_append, shas_to_add=None):
     """
     This function will decide whether to update the version document with forward pointers to segments.
@@ -195,6 +268,98 @@ def _spec_fw_pointers_aware(symbol, version, from_index=None, to_index=None):
         version.get('symbol'), version.get('_id'), version.get('version'), v_fw_config))
 
 
+def _fetch_segments(collection, symbol, version, from_index, to_index, parallelism=1, **kwargs):
+    """
+    Iterate the segment documents of a version in the [from_index, to_index) range, in no particular order.
+    With parallelism > 1 the range is split in as many sub-ranges, each fetched by its own cursor (and thus over
+    its own connection) concurrently. kwargs are passed on to collection.find.
+    """
+    lower = from_index or 0
+    if parallelism <= 1 or to_index - lower < parallelism:
+        return collection.find(_spec_fw_pointers_aware(symbol, version, from_index, to_index), **kwargs)
+
+    bounds = [lower + (to_index - lower) * i // parallelism for i in xrange(parallelism + 1)]
+    specs = [_spec_fw_pointers_aware(symbol, version, start, end) for start, end in zip(bounds[:-1], bounds[1:])]
+    return _find_concurrently(collection, specs, **kwargs)
+
+
+def _fetch_cached_segments(collection, symbol, version, from_index, to_index, parallelism=1):
+    """
+    Like _fetch_segments, but segments found in the segment cache are returned from there, as uncompressed
+    segments marked 'cached'. Only the data of the other segments is fetched from mongo.
+    """
+    missing = []
+    for x in _fetch_segments(collection, symbol, version, from_index, to_index, parallelism,
+                             projection={'_id': 0, 'segment': 1, 'sha': 1}):
+        data = segment_cache.get(segment_key(collection, symbol, x['sha']))
+        if data is None:
+            missing.append(x['sha'])
+        else:
+            yield {'segment': x['segment'], 'sha': x['sha'], 'compressed': False, 'data': data, 'cached': True}
+    if missing:
+        for x in collection.find({'symbol': symbol, 'sha': {'$in': missing}}):
+            yield x
+
+
+def _sorted_segments(collection, symbol, version):
+    """
+    The segment documents (without their data) of the version, in order
+    """
+    spec = _spec_fw_pointers_aware(symbol, version)
+    return sorted(collection.find(spec, projection={'_id': 1, 'segment': 1, 'compressed': 1, 'sha': 1}),
+                  key=itemgetter('segment'))
+
+
+def _find_concurrently(collection, specs, **kwargs):
+    # Bounded, so the cursors can't fetch far ahead of a slow (or abandoned) consumer
+    results = queue.Queue(maxsize=2 * len(specs))
+    stop = threading.Event()
+
+    def _put(item):
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _find(spec):
+        cursor = None
+        try:
+            cursor = collection.find(spec, **kwargs)
+            for doc in cursor:
+                if not _put(doc):
+                    return
+            _put(None)
+        except Exception as e:
+            _put(e)
+        finally:
+            if cursor is not None:
+                cursor.close()
+
+    threads = [threading.Thread(target=_find, args=(spec,)) for spec in specs]
+    for t in threads:
+        t.daemon = True
+        t.start()
+
+    try:
+        remaining = len(specs)
+        while remaining:
+            doc = results.get()
+            if doc is None:
+                remaining -= 1
+            elif isinstance(doc, Exception):
+                raise doc
+            else:
+                yield doc
+    finally:
+        # The consumer is done, or gave up early: stop the other cursors too
+        stop.set()
+        for t in threads:
+            t.join()
+
+
 def _fw_pointers_convert_append_to_write(previous_version):
     """
     This method decides whether to convert an append to a full write  in order to avoid data integrity errors
@@ -208,6 +373,146 @@ def _fw_pointers_convert_append_to_write(previous_version):
     return prev_fw_config is FwPointersCfg.ENABLED and ARCTIC_FORWARD_POINTERS_CFG is not FwPointersCfg.ENABLED
 
 
+def _segment_update(symbol, version_id, sha, segment, exists):
+    """
+    The update writing the segment (with the given SHA) as one of version_id's segments, given whether a segment
+    with that SHA is already stored for the symbol, or None if it needs none
+    """
+    segment_spec = {'symbol': symbol, 'sha': sha, 'segment': segment['segment']}
+
+    if ARCTIC_FORWARD_POINTERS_CFG is FwPointersCfg.DISABLED:
+        if not exists:
+            segment['sha'] = sha
+            return pymongo.UpdateOne(segment_spec, {'$set': segment, '$addToSet': {'parent': version_id}},
+                                     upsert=True)
+        return pymongo.UpdateOne(segment_spec, {'$addToSet': {'parent': version_id}})
+
+    # We only keep for the records the ID of the version which created the segment.
+    # We also need the uniqueness of the parent field for the (symbol, parent, segment) index,
+    # because upon mongo_retry "dirty_append == True", we compress and only the SHA changes
+    # which raises DuplicateKeyError if we don't have a unique (symbol, parent, segment).
+    set_spec = {'$addToSet': {'parent': version_id}}
+
+    if not exists:
+        segment['sha'] = sha
+        set_spec['$set'] = segment
+        return pymongo.UpdateOne(segment_spec, set_spec, upsert=True)
+    elif ARCTIC_FORWARD_POINTERS_CFG is FwPointersCfg.HYBRID:
+        return pymongo.UpdateOne(segment_spec, set_spec)
+    # With FwPointersCfg.ENABLED  we make zero updates on existing segment documents, but:
+    #   - write only the new segment(s) documents
+    #   - write the new version document
+    # This helps with performance as we update as less documents as necessary
+    return None
+
+
+class SegmentBatch(object):
+    """
+    Collects the segments NdarrayStore writes for many symbols at once (see VersionStore.write_batch), and writes
+    them with shared, unordered, bulk writes of at most ARCTIC_WRITE_INFLIGHT_BYTES (compressed), each after a
+    single lookup of the SHAs already stored. Thread safe.
+
+    The writes leave checking their segments to check(), once flush() has written them all.
+    """
+
+    def __init__(self, collection):
+        self._collection = collection
+        self._lock = threading.Lock()
+        self._pending = []
+        self._pending_bytes = 0
+        self._versions = {}
+        self._errors = {}
+
+    def add(self, symbol, version, segments, lookup):
+        """
+        Queue the (sha, segment)s of the symbol's new version, writing the queued segments once they are large
+        enough. lookup: whether segments with these SHAs may already be stored for the symbol.
+        """
+        with self._lock:
+            for sha, segment in segments:
+                self._pending.append((symbol, version['_id'], sha, segment, lookup))
+                if 'columns' in segment:
+                    self._pending_bytes += sum(len(c) for c in segment['columns'].values())
+                else:
+                    self._pending_bytes += len(segment['data'])
+            if self._pending_bytes >= ARCTIC_WRITE_INFLIGHT_BYTES:
+                self._write()
+
+    def check_later(self, symbol, version):
+        """
+        Have check() verify the symbol's version once its segments are written
+        """
+        with self._lock:
+            self._versions[symbol] = version
+
+    def flush(self):
+        """
+        Write the queued segments
+        """
+        with self._lock:
+            self._write()
+
+    def check(self, symbol):
+        """
+        Raise the error writing the symbol's segments, if any, and check they are all written
+        """
+        if symbol in self._errors:
+            raise self._errors[symbol]
+        if symbol in self._versions:
+            NdarrayStore.check_written(self._collection, symbol, self._versions[symbol])
+
+    def _write(self):
+        pending, self._pending, self._pending_bytes = self._pending, [], 0
+        lookups = {}
+        for symbol, _, sha, _, lookup in pending:
+            if lookup:
+                lookups.setdefault(symbol, []).append(sha)
+        existing = set()
+        if lookups:
+            existing.update((x['symbol'], Binary(x['sha'])) for x in self._collection.find(
+                {'$or': [{'symbol': symbol, 'sha': {'$in': shas}} for symbol, shas in lookups.items()]},
+                projection={'symbol': 1, 'sha': 1, '_id': 0}))
+
+        bulk = []
+        symbols = []
+        for symbol, version_id, sha, segment, _ in pending:
+            update = _segment_update(symbol, version_id, sha, segment, (symbol, sha) in existing)
+            if update is not None:
+                bulk.append(update)
+                symbols.append(symbol)
+        if not bulk:
+            return
+        try:
+            self._collection.bulk_write(bulk, ordered=False)
+        except BulkWriteError as bwe:
+            logger.error("Bulk write failed with details: %s (Exception: %s)" % (bwe.details, bwe))
+            for error in bwe.details.get('writeErrors', []):
+                self._errors.setdefault(symbols[error['index']], bwe)
+        except Exception as e:
+            # Any of the segments may be missing
+            for symbol in symbols:
+                self._errors.setdefault(symbol, e)
+
+
+_segment_batches = threading.local()
+
+
+@contextmanager
+def batched_segments(segment_batch):
+    """
+    Have the NdarrayStore writes on this thread queue their segments on segment_batch, rather than write them
+    """
+    _segment_batches.current = segment_batch
+    try:
+        yield
+    finally:
+        _segment_batches.current = None
+
+
+def _current_segment_batch():
+    return getattr(_segment_batches, 'current', None)
+
+
 class NdarrayStore(object):
     """Chunked store for arbitrary ndarrays, supporting append.
 
@@ -269,6 +574,18 @@ class NdarrayStore(object):
       u'symbol': u'test'},
       ]
 
+    Versions written with the columnar layout (version['layout'] == 'columnar') compress each field of a
+    structured array separately, keyed by the field's position in the dtype, so reads can fetch only some fields:
+     {u'_id': ObjectId('55fa9a778b376a68efdd10e7'),
+      u'compressed': True,
+      u'layout': u'columnar',
+      u'columns': {u'0': Binary('.....', 0), u'1': Binary('.....', 0)},
+      u'parent': [ObjectId('55fa9a7781f12654382e58b9')],
+      u'segment': 9,
+      u'sha': Binary('.............', 0),
+      u'symbol': u'test'},
+    Their appended segments are row-major, like those of any other version, until they are compressed.
+
     """
     TYPE = 'ndarray'
 
@@ -341,40 +658,248 @@ class NdarrayStore(object):
 
     @staticmethod
     def read_options():
-        return ['from_version']
+        return ['from_version', 'fetch_parallelism', 'columns', 'where']
 
-    def read(self, arctic_lib, version, symbol, read_preference=None, **kwargs):
+    def segments_spec(self, version, symbol, **kwargs):
+        """
+        The query for the segment documents a read of version with these (read) kwargs fetches. Callers reading
+        many symbols at once fetch their segments together, and pass them to read() with segments=...
+        """
+        from_index, to_index = _read_bounds(version, self._index_range(version, symbol, **kwargs))
+        return _spec_fw_pointers_aware(symbol, version, from_index, to_index)
+
+    def read(self, arctic_lib, version, symbol, read_preference=None, fetch_parallelism=None, columns=None,
+             where=None, segments=None, **kwargs):
+        """
+        segments: the version's segment documents, already fetched with segments_spec(), if any
+        """
         index_range = self._index_range(version, symbol, **kwargs)
+        predicates = None
+        read_columns = columns
+        if where is not None:
+            predicates = parse_where(where)
+            if columns is not None:
+                # The fields the predicates are evaluated on are read too, and dropped after
+                read_columns = list(columns) + [f for f, _, _ in predicates if f not in columns]
+        if disk_cache.enabled:
+            cached = disk_cache.get(version, self._dtype(version['dtype'], version.get('dtype_metadata', {})))
+            if cached is not None:
+                from_index, to_index = index_range or (None, None)
+                cached = cached[from_index:to_index]
+                if predicates:
+                    cached = cached[where_mask(cached, predicates)]
+                return cached if columns is None else _project(cached, columns)
         collection = arctic_lib.get_top_level_collection()
         if read_preference:
             collection = collection.with_options(read_preference=read_preference)
-        return self._do_read(collection, version, symbol, index_range=index_range)
-
-    def _do_read(self, collection, version, symbol, index_range=None):
+        if predicates is not None:
+            return self._read_where(collection, version, symbol, predicates, index_range, fetch_parallelism,
+                                    columns, read_columns)
+        item = self._do_read(collection, version, symbol, index_range=index_range,
+                             fetch_parallelism=fetch_parallelism, columns=columns, segments=segments)
+        if disk_cache.enabled and columns is None and (not index_range or index_range == (None, None)):
+            disk_cache.put(version, item)
+        return item
+
+    def iter_read(self, arctic_lib, version, symbol, rows_per_batch, read_preference=None, fetch_parallelism=None,
+                  columns=None, **kwargs):
+        """
+        Read the version piece by piece: yield the rows of the whole segments whose last rows fall in consecutive
+        ranges of rows_per_batch rows, fetching each batch with its own query. Batches smaller than a segment
+        would mostly be empty, so they cover at least the rows of one (full-sized) segment.
+        """
+        if rows_per_batch < 1:
+            raise ValueError("rows_per_batch must be positive, not {}".format(rows_per_batch))
+        collection = arctic_lib.get_top_level_collection()
+        if read_preference:
+            collection = collection.with_options(read_preference=read_preference)
+        from_index, to_index = _read_bounds(version, self._index_range(version, symbol, **kwargs))
+        dtype = self._dtype(version['dtype'], version.get('dtype_metadata', {}))
+        row_size = int(dtype.itemsize * np.prod(version.get('shape', (-1,))[1:]))
+        rows_per_batch = max(rows_per_batch, int(_CHUNK_SIZE / row_size) if row_size else 1)
+        for batch_start in xrange(from_index or 0, to_index, rows_per_batch):
+            # A segment is fetched by the batch its last row falls in, so each is read exactly once
+            item = self._do_read(collection, version, symbol,
+                                 index_range=(batch_start, min(batch_start + rows_per_batch, to_index)),
+                                 fetch_parallelism=fetch_parallelism, columns=columns)
+            if len(item):
+                yield item
+
+    def _read_where(self, collection, version, symbol, predicates, index_range, fetch_parallelism, columns,
+                    read_columns):
+        """
+        Read the rows matching the predicates: only the runs of segments the version's zone map doesn't rule out
+        are fetched, then the predicates are applied to their rows.
+        """
+        dtype = self._dtype(version['dtype'], version.get('dtype_metadata', {}))
+        if dtype.names is None:
+            raise ValueError("where is only supported for structured arrays")
+        parts = [self._do_read(collection, version, symbol, index_range=r, fetch_parallelism=fetch_parallelism,
+                               columns=read_columns)
+                 for r in candidate_ranges(version, predicates, index_range)]
+        if not parts:
+            empty = np.empty(0, dtype=dtype)
+            parts = [empty if read_columns is None else _project(empty, read_columns)]
+        # Concatenate into an array of the parts' dtype, which carries the dtype metadata
+        item = np.empty(sum(len(p) for p in parts), dtype=parts[0].dtype)
+        offset = 0
+        for p in parts:
+            item[offset:offset + len(p)] = p
+            offset += len(p)
+        item = item[where_mask(item, predicates)]
+        return item if columns is None or read_columns == columns else _project(item, columns)
+
+    def _do_read(self, collection, version, symbol, index_range=None, fetch_parallelism=None, columns=None,
+                 segments=None):
         """
         index_range is a 2-tuple of integers - a [from, to) range of segments to be read.
             Either from or to can be None, indicating no bound.
+        fetch_parallelism is the number of cursors to fetch the segments with concurrently.
+            Defaults to ARCTIC_FETCH_PARALLELISM.
+        columns is a list of the fields (of a structured array) to read, in the order they should be returned in.
+            Only versions written with the columnar layout skip fetching the other fields.
+        segments are the segment documents of the read, if they have already been fetched.
         """
-        from_index = index_range[0] if index_range else None
-        to_index = version['up_to']
-        if index_range and index_range[1] and index_range[1] < version['up_to']:
-            to_index = index_range[1]
+        if version.get('layout') == COLUMNAR:
+            return self._do_read_columnar(collection, version, symbol, index_range, fetch_parallelism, columns,
+                                          segments)
+
+        from_index, to_index = _read_bounds(version, index_range)
         segment_count = version.get('segment_count') if from_index is None else None
 
-        spec = _spec_fw_pointers_aware(symbol, version, from_index, to_index)
+        if fetch_parallelism is None:
+            fetch_parallelism = ARCTIC_FETCH_PARALLELISM
+
+        dtype = self._dtype(version['dtype'], version.get('dtype_metadata', {}))
+        shape = version.get('shape', (-1,))
+        row_size = int(dtype.itemsize * np.prod(shape[1:]))
+
+        # Size the output once and decompress each segment straight into its slice of it.
+        # A segment's slice follows from its last row ('segment') and its decompressed size, so segments can be
+        # placed in whatever order the cursor returns them, and decompression overlaps with fetching the rest.
+        if segments is None:
+            fetch = _fetch_cached_segments if segment_cache.enabled else _fetch_segments
+            segments = fetch(collection, symbol, version, from_index, to_index, fetch_parallelism)
+        if from_index is None and to_index == version['up_to']:
+            nbytes, start = to_index * row_size, 0
+        else:
+            # Partial reads can begin part-way through a segment's rows: size them from the segments themselves
+            segments = list(segments)
+            nbytes = sum(_segment_size(x) for x in segments)
+            start = min((x['segment'] + 1) * row_size - _segment_size(x) for x in segments) if segments else 0
+
+        data = bytearray(nbytes)
+        view = memoryview(data)
+        placed = []
+        to_cache = []
+
+        def _placed_segments():
+            for x in segments:
+                size = _segment_size(x)
+                offset = (x['segment'] + 1) * row_size - size - start
+                if offset < 0 or offset + size > nbytes:
+                    raise DataIntegrityException("Segment {} of {}:{} falls outside the expected {} bytes".format(
+                                                 x['segment'], symbol, version['version'], nbytes))
+                placed.append((offset, size))
+                if segment_cache.enabled and not x.get('cached'):
+                    to_cache.append((x['sha'], offset, size))
+                if x['compressed']:
+                    yield offset, x['data'], x.get('codec', DEFAULT_CODEC)
+                else:
+                    view[offset:offset + size] = x['data']
 
-        data = bytearray()
-        i = -1
-        for i, x in enumerate(sorted(collection.find(spec), key=itemgetter('segment'))):
-            data.extend(decompress(x['data']) if x['compressed'] else x['data'])
+        decompress_into(_placed_segments(), view,
+                        nchunks=len(segments) if isinstance(segments, list) else segment_count)
 
         # Check that the correct number of segments has been returned
-        if segment_count is not None and i + 1 != segment_count:
+        if segment_count is not None and len(placed) != segment_count:
             raise OperationFailure("Incorrect number of segments returned for {}:{}.  Expected: {}, but got {}. {}".format(
-                                   symbol, version['version'], segment_count, i + 1, collection.database.name + '.' + collection.name))
+                                   symbol, version['version'], segment_count, len(placed),
+                                   collection.database.name + '.' + collection.name))
+
+        # ...and that together they cover the whole buffer
+        offset = 0
+        for seg_offset, size in sorted(placed):
+            if seg_offset != offset:
+                break
+            offset += size
+        if offset != nbytes:
+            raise DataIntegrityException("Segments of {}:{} don't add up to the expected {} bytes".format(
+                                         symbol, version['version'], nbytes))
+
+        for sha, seg_offset, size in to_cache:
+            segment_cache.put(segment_key(collection, symbol, sha), bytes(view[seg_offset:seg_offset + size]))
+
+        rtn = np.frombuffer(data, dtype=dtype).reshape(shape)
+        if columns is not None:
+            rtn = _project(rtn, columns)
+        return rtn
+
+    def _do_read_columnar(self, collection, version, symbol, index_range=None, fetch_parallelism=None,
+                          columns=None, segments=None):
+        """
+        _do_read for versions written with the columnar layout: only the blocks of the requested columns of
+        each columnar segment are fetched and decompressed.
+        """
+        from_index, to_index = _read_bounds(version, index_range)
+        segment_count = version.get('segment_count') if from_index is None else None
+
+        if fetch_parallelism is None:
+            fetch_parallelism = ARCTIC_FETCH_PARALLELISM
 
         dtype = self._dtype(version['dtype'], version.get('dtype_metadata', {}))
-        rtn = np.frombuffer(data, dtype=dtype).reshape(version.get('shape', (-1)))
+        names = list(dtype.names) if columns is None else list(columns)
+        if not names:
+            raise ValueError("No columns to read for {}:{}".format(symbol, version['version']))
+        positions = [dtype.names.index(n) for n in names]
+
+        # Row-major (appended, or older) segments only have 'data', columnar ones only 'columns'
+        projection = {'_id': 0, 'segment': 1, 'compressed': 1, 'codec': 1, 'layout': 1, 'data': 1}
+        projection.update(('columns.%d' % i, 1) for i in positions)
+        if segments is None:
+            segments = _fetch_segments(collection, symbol, version, from_index, to_index, fetch_parallelism,
+                                       projection=projection)
+        if from_index is None and to_index == version['up_to']:
+            nrows, start = to_index, 0
+        else:
+            segments = list(segments)
+            nrows = sum(_segment_rows(x, dtype) for x in segments)
+            start = min(x['segment'] + 1 - _segment_rows(x, dtype) for x in segments) if segments else 0
+
+        rtn = np.empty(nrows, dtype=np.dtype([(n, dtype.fields[n][0]) for n in names],
+                                             metadata=dict(dtype.metadata or {})))
+        placed = []
+        for x in segments:
+            rows = _segment_rows(x, dtype)
+            offset = x['segment'] + 1 - rows - start
+            if offset < 0 or offset + rows > nrows:
+                raise DataIntegrityException("Segment {} of {}:{} falls outside the expected {} rows".format(
+                                             x['segment'], symbol, version['version'], nrows))
+            placed.append((offset, rows))
+            codec = x.get('codec', DEFAULT_CODEC)
+            if x.get('layout') == COLUMNAR:
+                blocks = decompress_array([x['columns'][str(i)] for i in positions], codec=codec)
+                for n, block in zip(names, blocks):
+                    rtn[n][offset:offset + rows] = np.frombuffer(block, dtype=dtype.fields[n][0])
+            else:
+                data = decompress_array([x['data']], codec=codec)[0] if x['compressed'] else x['data']
+                arr = np.frombuffer(data, dtype=dtype)
+                for n in names:
+                    rtn[n][offset:offset + rows] = arr[n]
+
+        if segment_count is not None and len(placed) != segment_count:
+            raise OperationFailure("Incorrect number of segments returned for {}:{}.  Expected: {}, but got {}. {}".format(
+                                   symbol, version['version'], segment_count, len(placed),
+                                   collection.database.name + '.' + collection.name))
+
+        offset = 0
+        for seg_offset, rows in sorted(placed):
+            if seg_offset != offset:
+                break
+            offset += rows
+        if offset != nrows:
+            raise DataIntegrityException("Segments of {}:{} don't add up to the expected {} rows".format(
+                                         symbol, version['version'], nrows))
         return rtn
 
     def _promote_types(self, dtype, dtype_str):
@@ -388,8 +913,16 @@ class NdarrayStore(object):
         rtn = np.dtype(rtn, metadata=dict(dtype.metadata or {}))
         return rtn
 
-    def append(self, arctic_lib, version, symbol, item, previous_version, dtype=None, dirty_append=True):
+    def append(self, arctic_lib, version, symbol, item, previous_version, dtype=None, dirty_append=True,
+               fast_append=None):
+        """
+        fast_append: only write the new segment, leaving the checks of the written segments to the append verifier.
+            Defaults to ARCTIC_FAST_APPEND. Appends changing the dtype, or to a symbol whose version numbers or
+            segments are inconsistent, still rewrite it, and every _APPEND_COUNT appends (or _APPEND_SIZE bytes)
+            still rewrite the appended segments into compressed ones.
+        """
         collection = arctic_lib.get_top_level_collection()
+        fast_append = ARCTIC_FAST_APPEND if fast_append is None else fast_append
         if previous_version.get('shape', [-1]) != [-1, ] + list(item.shape)[1:]:
             raise UnhandledDtypeException()
 
@@ -408,6 +941,10 @@ class NdarrayStore(object):
         item = item.astype(dtype)
 
         version['type'] = self.TYPE
+        if 'layout' in previous_version:
+            version['layout'] = previous_version['layout']
+        if 'zone_map' in previous_version:
+            version['zone_map'] = {'fields': previous_version['zone_map']['fields']}
         version[FW_POINTERS_CONFIG_KEY] = ARCTIC_FORWARD_POINTERS_CFG.name
         # Create an empty entry to prevent cases where this field is accessed without being there. (#710)
         if version[FW_POINTERS_CONFIG_KEY] != FwPointersCfg.DISABLED.name:
@@ -416,6 +953,8 @@ class NdarrayStore(object):
         if str(dtype) != previous_version['dtype'] or \
                 _fw_pointers_convert_append_to_write(previous_version):
             logger.debug('Converting %s from %s to %s' % (symbol, previous_version['dtype'], str(dtype)))
+            if fast_append:
+                append_verifier.slow_path('dtype' if str(dtype) != previous_version['dtype'] else 'fw_pointers')
             if item.dtype.hasobject:
                 raise UnhandledDtypeException()
             version['dtype'] = str(dtype)
@@ -430,22 +969,30 @@ class NdarrayStore(object):
             version['up_to'] = len(item)
             version['sha'] = self.checksum(item)
             version['base_sha'] = version['sha']
-            self._do_write(collection, version, symbol, item, previous_version)
+            self._do_write(collection, version, symbol, item, previous_version, codec=_compression_codec(arctic_lib))
         else:
             version['dtype'] = previous_version['dtype']
             version['dtype_metadata'] = previous_version['dtype_metadata']
 
-            # Verify (potential) corruption with append
-            if CHECK_CORRUPTION_ON_APPEND and _fast_check_corruption(
+            # Verify (potential) corruption with append - fast appends leave that to the append verifier
+            if fast_append:
+                if dirty_append:
+                    append_verifier.slow_path('version_mismatch')
+                elif append_verifier.needs_rewrite(collection, symbol):
+                    append_verifier.slow_path('failed_verification')
+                    dirty_append = True
+            elif CHECK_CORRUPTION_ON_APPEND and _fast_check_corruption(
                     collection, symbol, previous_version,
                     check_count=False, check_last_segment=True, check_append_safe=True):
                 logging.warning("Found mismatched segments for {} (version={}). "
                                 "Converting append to concat and rewrite".format(symbol, previous_version['version']))
                 dirty_append = True  # force a concat and re-write (use new base version id)
 
-            self._do_append(collection, version, symbol, item, previous_version, dirty_append)
+            self._do_append(collection, version, symbol, item, previous_version, dirty_append,
+                            codec=_compression_codec(arctic_lib), fast_append=fast_append)
 
-    def _do_append(self, collection, version, symbol, item, previous_version, dirty_append):
+    def _do_append(self, collection, version, symbol, item, previous_version, dirty_append, codec=DEFAULT_CODEC,
+                   fast_append=False):
         data = item.tostring()
         # Compatibility with Arctic 1.22.0 that didn't write base_sha into the version document
         version['base_sha'] = previous_version.get('base_sha', Binary(b''))
@@ -496,7 +1043,9 @@ class NdarrayStore(object):
                        If we concat_and_rewrite here, new chunks will have a different parent id (the _id of this version doc)
                        ...so we can safely write them.
                        '''
-                    self._concat_and_rewrite(collection, version, symbol, item, previous_version)
+                    if fast_append:
+                        append_verifier.slow_path('forked')
+                    self._concat_and_rewrite(collection, version, symbol, item, previous_version, codec=codec)
                     return
 
                 if 'segment_index' in previous_version:
@@ -506,26 +1055,31 @@ class NdarrayStore(object):
                                                         new_segments=[segment['segment'], ])
                     if segment_index:
                         version['segment_index'] = segment_index
+                self._update_zone_map(version, item, previous_version, previous_version['up_to'],
+                                      [segment['segment']])
                 logger.debug("Appended segment %d for parent %s" % (segment['segment'], version['_id']))
+                if fast_append:
+                    append_verifier.fast_path()
+                    append_verifier.submit(collection, symbol, version, _spec_fw_pointers_aware(symbol, version))
             else:
                 if 'segment_index' in previous_version:
                     version['segment_index'] = previous_version['segment_index']
+                if 'zone_map' in version:
+                    version['zone_map'] = previous_version['zone_map']
 
         else:  # Too much data has been appended now, so rewrite (and compress/chunk).
-            self._concat_and_rewrite(collection, version, symbol, item, previous_version)
+            if fast_append and not dirty_append:
+                append_verifier.slow_path('threshold')
+            self._concat_and_rewrite(collection, version, symbol, item, previous_version, codec=codec)
 
-    def _concat_and_rewrite(self, collection, version, symbol, item, previous_version):
+    def _concat_and_rewrite(self, collection, version, symbol, item, previous_version, codec=DEFAULT_CODEC):
 
         version.pop('base_version_id', None)
 
         # Figure out which is the last 'full' chunk
-        spec = _spec_fw_pointers_aware(symbol, previous_version)
-
-        read_index_range = [0, None]
         # The unchanged segments are the compressed ones (apart from the last compressed)
         unchanged_segments = []
-        for segment in sorted(collection.find(spec, projection={'_id': 1, 'segment': 1, 'compressed': 1, 'sha': 1}),
-                              key=itemgetter('segment')):
+        for segment in _sorted_segments(collection, symbol, previous_version):
             # We want to stop iterating when we find the first uncompressed chunks
             if not segment['compressed']:
                 # We include the last compressed chunk in the recompression
@@ -541,22 +1095,28 @@ class NdarrayStore(object):
                                           previous_version['segment_count'] - previous_version['append_count'] - 1,
                                           len(unchanged_segments)
                                           ))
-        if unchanged_segments:
-            read_index_range[0] = unchanged_segments[-1]['segment'] + 1
+        self._rewrite_after(collection, version, symbol, item, previous_version, unchanged_segments, codec)
 
+    def _rewrite_after(self, collection, version, symbol, item, previous_version, unchanged_segments,
+                       codec=DEFAULT_CODEC):
+        """
+        Write the rows of previous_version after its unchanged_segments, followed by item (if any), as the new
+        segments of version, which shares the unchanged segments with previous_version.
+        """
+        start = unchanged_segments[-1]['segment'] + 1 if unchanged_segments else 0
         # Only read back the section that needs to be compressed here (index_range=...)
-        old_arr = self._do_read(collection, previous_version, symbol, index_range=read_index_range)
-        if len(item) == 0:
+        old_arr = self._do_read(collection, previous_version, symbol, index_range=(start, None))
+        if item is None or len(item) == 0:
             logger.debug('Rewrite and compress/chunk item %s, rewrote old_arr' % symbol)
-            self._do_write(collection, version, symbol, old_arr, previous_version, segment_offset=read_index_range[0])
+            self._do_write(collection, version, symbol, old_arr, previous_version, segment_offset=start, codec=codec)
         elif len(old_arr) == 0:
             logger.debug('Rewrite and compress/chunk item %s, wrote item' % symbol)
-            self._do_write(collection, version, symbol, item, previous_version, segment_offset=read_index_range[0])
+            self._do_write(collection, version, symbol, item, previous_version, segment_offset=start, codec=codec)
         else:
             logger.debug("Rewrite and compress/chunk %s, np.concatenate %s to %s" % (symbol,
                                                                                      item.dtype, old_arr.dtype))
             self._do_write(collection, version, symbol, np.concatenate([old_arr, item]), previous_version,
-                           segment_offset=read_index_range[0])
+                           segment_offset=start, codec=codec)
         if unchanged_segments:
             if version.get(FW_POINTERS_CONFIG_KEY) != FwPointersCfg.ENABLED.name:
                 _attempt_update_unchanged(symbol, unchanged_segments, collection, version, previous_version)
@@ -564,7 +1124,52 @@ class NdarrayStore(object):
             _update_fw_pointers(
                 collection, symbol, version, previous_version, is_append=False,
                 shas_to_add=version.get(FW_POINTERS_REFS_KEY, []) + [s['sha'] for s in unchanged_segments])
-            self.check_written(collection, symbol, version)
+            if _current_segment_batch() is None:  # else _do_write left the check to the batch
+                self.check_written(collection, symbol, version)
+
+    def _rows_per_chunk(self, version):
+        dtype = self._dtype(version['dtype'], version.get('dtype_metadata', {}))
+        row_size = int(dtype.itemsize * np.prod(version.get('shape', (-1,))[1:]))
+        return max(1, int(_CHUNK_SIZE / row_size)) if row_size else 1
+
+    def can_compact(self, version):
+        """
+        Whether the version's rows are spread over more segments than writing them afresh would create,
+        e.g. after appends
+        """
+        if not version.get('up_to'):
+            return False
+        return version.get('segment_count', 0) > int(np.ceil(float(version['up_to']) / self._rows_per_chunk(version)))
+
+    def compact(self, arctic_lib, version, symbol, previous_version):
+        """
+        Write the data of previous_version as version, re-chunking its rows from the first segment which isn't a
+        full, compressed one onwards into full segments. The segments before it are shared with previous_version.
+        """
+        collection = arctic_lib.get_top_level_collection()
+        for key in ('dtype', 'shape', 'dtype_metadata', 'type', 'up_to', 'sha', 'layout'):
+            if key in previous_version:
+                version[key] = previous_version[key]
+        if 'sha' in version:
+            version['base_sha'] = version['sha']
+        if 'zone_map' in previous_version:
+            version['zone_map'] = {'fields': previous_version['zone_map']['fields']}
+        version[FW_POINTERS_CONFIG_KEY] = ARCTIC_FORWARD_POINTERS_CFG.name
+        if version[FW_POINTERS_CONFIG_KEY] != FwPointersCfg.DISABLED.name:
+            version[FW_POINTERS_REFS_KEY] = list()
+
+        rows_per_chunk = self._rows_per_chunk(previous_version)
+        # The unchanged segments are the full, compressed ones up to the first which isn't
+        unchanged_segments = []
+        start = 0
+        for segment in _sorted_segments(collection, symbol, previous_version):
+            if not segment['compressed'] or segment['segment'] + 1 - start != rows_per_chunk:
+                break
+            unchanged_segments.append(segment)
+            start = segment['segment'] + 1
+
+        self._rewrite_after(collection, version, symbol, None, previous_version, unchanged_segments,
+                            codec=_compression_codec(arctic_lib))
 
     @staticmethod
     def check_written(collection, symbol, version):
@@ -596,14 +1201,29 @@ class NdarrayStore(object):
                     symbol, parent_id, seen_chunks_reverse_pointers, seen_chunks))
 
     def checksum(self, item):
-        sha = hashlib.sha1()
-        sha.update(item.tostring())
-        return Binary(sha.digest())
+        return Binary(incremental_checksum(item).digest())
 
-    def write(self, arctic_lib, version, symbol, item, previous_version, dtype=None):
+    def _checksum_with_prefix(self, item, prefix_len):
+        """
+        Return the checksums of item and of item[:prefix_len], hashing the prefix only once
+        """
+        sha = incremental_checksum(item[:prefix_len])
+        prefix_sha = Binary(sha.copy().digest())
+        return Binary(incremental_checksum(item[prefix_len:], curr_sha=sha).digest()), prefix_sha
+
+    def write(self, arctic_lib, version, symbol, item, previous_version, dtype=None, columnar=False):
+        """
+        columnar: write the fields of a structured item as separate blocks (see COLUMNAR)
+        """
         collection = arctic_lib.get_top_level_collection()
         if item.dtype.hasobject:
             raise UnhandledDtypeException()
+        codec = _compression_codec(arctic_lib)
+        if columnar and item.dtype.names and len(item.shape) == 1:
+            version['layout'] = COLUMNAR
+        zone_map_columns = _zone_map_columns(arctic_lib)
+        if zone_map_columns and len(item.shape) == 1 and zone_map_fields(item.dtype, zone_map_columns):
+            version['zone_map'] = {'fields': zone_map_fields(item.dtype, zone_map_columns)}
 
         if not dtype:
             dtype = item.dtype
@@ -612,36 +1232,35 @@ class NdarrayStore(object):
         version['dtype_metadata'] = dict(dtype.metadata or {})
         version['type'] = self.TYPE
         version['up_to'] = len(item)
-        version['sha'] = self.checksum(item)
         version[FW_POINTERS_CONFIG_KEY] = ARCTIC_FORWARD_POINTERS_CFG.name
         # Create an empty entry to prevent cases where this field is accessed without being there. (#710)
         if version[FW_POINTERS_CONFIG_KEY] != FwPointersCfg.DISABLED.name:
             version[FW_POINTERS_REFS_KEY] = list()
 
-        if previous_version:
-            if 'sha' in previous_version \
-                    and previous_version['dtype'] == version['dtype'] \
-                    and self.checksum(item[:previous_version['up_to']]) == previous_version['sha']:
+        if previous_version and 'sha' in previous_version and previous_version['dtype'] == version['dtype'] and \
+                previous_version.get('layout') == version.get('layout') and \
+                previous_version.get('zone_map', {}).get('fields') == version.get('zone_map', {}).get('fields'):
+            version['sha'], prefix_sha = self._checksum_with_prefix(item, previous_version['up_to'])
+            if prefix_sha == previous_version['sha']:
                 # The first n rows are identical to the previous version, so just append.
                 # Do a 'dirty' append (i.e. concat & start from a new base version) for safety
                 self._do_append(collection, version, symbol, item[previous_version['up_to']:], previous_version,
-                                dirty_append=True)
+                                dirty_append=True, codec=codec)
                 return
+        else:
+            version['sha'] = self.checksum(item)
 
         version['base_sha'] = version['sha']
-        self._do_write(collection, version, symbol, item, previous_version)
+        self._do_write(collection, version, symbol, item, previous_version, codec=codec)
 
-    def _do_write(self, collection, version, symbol, item, previous_version, segment_offset=0):
+    def _do_write(self, collection, version, symbol, item, previous_version, segment_offset=0, codec=DEFAULT_CODEC):
 
         row_size = int(item.dtype.itemsize * np.prod(item.shape[1:]))
 
         # chunk and store the data by (uncompressed) size
         rows_per_chunk = int(_CHUNK_SIZE / row_size)
 
-        symbol_all_previous_shas, version_shas = set(), set()
-        if previous_version:
-            symbol_all_previous_shas.update(Binary(x['sha']) for x in
-                                            collection.find({'symbol': symbol}, projection={'sha': 1, '_id': 0}))
+        version_shas = set()
 
         length = len(item)
 
@@ -651,71 +1270,103 @@ class NdarrayStore(object):
             existing_index = None
 
         segment_index = []
-
-        # Compress
-        idxs = xrange(int(np.ceil(float(length) / rows_per_chunk)))
-        chunks = [(item[i * rows_per_chunk: (i + 1) * rows_per_chunk]).tostring() for i in idxs]
-        compressed_chunks = compress_array(chunks)
-
-        # Write
-        bulk = []
-        for i, chunk in zip(idxs, compressed_chunks):
-            segment = {
-                'data': Binary(chunk),
-                'compressed': True,
-                'segment': min((i + 1) * rows_per_chunk - 1, length - 1) + segment_offset,
-            }
-            segment_index.append(segment['segment'])
-            sha = checksum(symbol, segment)
-            segment_spec = {'symbol': symbol, 'sha': sha, 'segment': segment['segment']}
-
-            if ARCTIC_FORWARD_POINTERS_CFG is FwPointersCfg.DISABLED:
-                if sha not in symbol_all_previous_shas:
-                    segment['sha'] = sha
-                    bulk.append(pymongo.UpdateOne(segment_spec,
-                                                  {'$set': segment, '$addToSet': {'parent': version['_id']}},
-                                                  upsert=True))
-                else:
-                    bulk.append(pymongo.UpdateOne(segment_spec,
-                                                  {'$addToSet': {'parent': version['_id']}}))
+        segment_count = int(np.ceil(float(length) / rows_per_chunk))
+        segment_batch = _current_segment_batch()
+
+        # Slice, compress and write the chunks in batches of at most ARCTIC_WRITE_INFLIGHT_BYTES (uncompressed),
+        # so only one batch of copies is held in memory at any time, however large the item.
+        chunks_per_batch = max(1, int(ARCTIC_WRITE_INFLIGHT_BYTES // (rows_per_chunk * row_size)))
+        for batch_start in xrange(0, segment_count, chunks_per_batch):
+            idxs = xrange(batch_start, min(batch_start + chunks_per_batch, segment_count))
+            if version.get('layout') == COLUMNAR:
+                # One block per field and chunk, compressed a field at a time (as the fields' item sizes differ)
+                compressed_chunks = list(zip(*[compress_array(
+                    [np.ascontiguousarray(item[name][i * rows_per_chunk: (i + 1) * rows_per_chunk]).tostring()
+                     for i in idxs],
+                    codec=codec, typesize=item.dtype.fields[name][0].base.itemsize) for name in item.dtype.names]))
             else:
-                version_shas.add(sha)
-
-                # We only keep for the records the ID of the version which created the segment.
-                # We also need the uniqueness of the parent field for the (symbol, parent, segment) index,
-                # because upon mongo_retry "dirty_append == True", we compress and only the SHA changes
-                # which raises DuplicateKeyError if we don't have a unique (symbol, parent, segment).
-                set_spec = {'$addToSet': {'parent': version['_id']}}
-
-                if sha not in symbol_all_previous_shas:
-                    segment['sha'] = sha
-                    set_spec['$set'] = segment
-                    bulk.append(pymongo.UpdateOne(segment_spec, set_spec, upsert=True))
-                elif ARCTIC_FORWARD_POINTERS_CFG is FwPointersCfg.HYBRID:
-                    bulk.append(pymongo.UpdateOne(segment_spec, set_spec))
-                # With FwPointersCfg.ENABLED  we make zero updates on existing segment documents, but:
-                #   - write only the new segment(s) documents
-                #   - write the new version document
-                # This helps with performance as we update as less documents as necessary
-
-        if bulk:
-            try:
-                collection.bulk_write(bulk, ordered=False)
-            except BulkWriteError as bwe:
-                logger.error("Bulk write failed with details: %s (Exception: %s)" % (bwe.details, bwe))
-                raise
+                chunks = [(item[i * rows_per_chunk: (i + 1) * rows_per_chunk]).tostring() for i in idxs]
+                compressed_chunks = compress_array(chunks, codec=codec, typesize=item.dtype.itemsize)
+                del chunks
+
+            segments = []
+            for i, chunk in zip(idxs, compressed_chunks):
+                segment = {
+                    'compressed': True,
+                    'segment': min((i + 1) * rows_per_chunk - 1, length - 1) + segment_offset,
+                }
+                if codec != DEFAULT_CODEC:
+                    # Only tag non-default codecs, so LZ4 segments (and their SHAs) match those of older versions
+                    segment['codec'] = codec
+                if version.get('layout') == COLUMNAR:
+                    segment['layout'] = COLUMNAR
+                    # The SHA covers the blocks in field order, rather than the (unordered) 'columns' document
+                    sha = checksum(symbol, dict(segment, data=b''.join(chunk),
+                                                columns=','.join(str(len(c)) for c in chunk)))
+                    segment['columns'] = {str(j): Binary(c) for j, c in enumerate(chunk)}
+                else:
+                    segment['data'] = Binary(chunk)
+                    sha = checksum(symbol, segment)
+                segments.append((sha, segment))
+
+            for sha, segment in segments:
+                segment_index.append(segment['segment'])
+                if ARCTIC_FORWARD_POINTERS_CFG is not FwPointersCfg.DISABLED:
+                    version_shas.add(sha)
+
+            if segment_batch is not None:
+                # The SHA lookup and the write are shared with the other symbols of the batch
+                segment_batch.add(symbol, version, segments, lookup=bool(previous_version))
+                del compressed_chunks, segments
+                continue
+
+            # Only look up the SHAs of this batch, rather than every segment ever written for the symbol
+            symbol_all_previous_shas = set()
+            if previous_version:
+                symbol_all_previous_shas.update(Binary(x['sha']) for x in collection.find(
+                    {'symbol': symbol, 'sha': {'$in': [sha for sha, _ in segments]}}, projection={'sha': 1, '_id': 0}))
+
+            # Write
+            bulk = [update for update in (_segment_update(symbol, version['_id'], sha, segment,
+                                                          sha in symbol_all_previous_shas)
+                                          for sha, segment in segments) if update is not None]
+            if bulk:
+                try:
+                    collection.bulk_write(bulk, ordered=False)
+                except BulkWriteError as bwe:
+                    logger.error("Bulk write failed with details: %s (Exception: %s)" % (bwe.details, bwe))
+                    raise
+            del compressed_chunks, segments, bulk
 
+        self._update_zone_map(version, item, previous_version, segment_offset, segment_index)
         segment_index = self._segment_index(item, existing_index=existing_index, start=segment_offset,
                                             new_segments=segment_index)
         if segment_index:
             version['segment_index'] = segment_index
-        version['segment_count'] = len(chunks)
+        version['segment_count'] = segment_count
         version['append_size'] = 0
         version['append_count'] = 0
 
         _update_fw_pointers(collection, symbol, version, previous_version, is_append=False, shas_to_add=version_shas)
 
-        self.check_written(collection, symbol, version)
+        if segment_batch is not None:
+            segment_batch.check_later(symbol, version)
+        else:
+            self.check_written(collection, symbol, version)
+
+    @staticmethod
+    def _update_zone_map(version, item, previous_version, start, new_segments):
+        """
+        Add the statistics of the new segments to the version's zone map, if it keeps one
+        """
+        if 'zone_map' not in version:
+            return
+        existing = previous_version.get('zone_map') if start > 0 else None
+        zm = zone_map(item, version['zone_map']['fields'], existing, start, new_segments)
+        if zm:
+            version['zone_map'] = zm
+        else:
+            del version['zone_map']
 
     def _segment_index(self, new_data, existing_index, start, new_segments):
         """
@@ -9,7 +9,7 @@ from arctic._util import NP_OBJECT_DTYPE
 from arctic.serialization.numpy_records import SeriesSerializer, DataFrameSerializer
 from ._ndarray_store import NdarrayStore
 from .._compression import compress, decompress
-from .._config import FORCE_BYTES_TO_UNICODE
+from .._config import FORCE_BYTES_TO_UNICODE, COLUMNAR_LAYOUT_KEY, ARCTIC_COLUMNAR_LAYOUT
 from ..date._util import to_pandas_closed_closed
 from ..exceptions import ArcticException
 
@@ -70,7 +70,7 @@ class PandasStore(NdarrayStore):
         return None
 
     def read_options(self):
-        return ['date_range']
+        return ['date_range', 'where']
 
     def _index_range(self, version, symbol, date_range=None, **kwargs):
         """ Given a version, read the segment_index and return the chunks associated
@@ -87,7 +87,10 @@ class PandasStore(NdarrayStore):
                     return -1, -1
                 idxstart = min(np.searchsorted(dts, start), len(dts) - 1)
                 idxend = min(np.searchsorted(dts, end, side='right'), len(dts) - 1)
-                return int(index['index'][idxstart]), int(index['index'][idxend] + 1)
+                # Start right after the last segment which ends before the range: all the rows before from_index
+                # are then outside the date range, which lets the range slice a whole (e.g. cached) version too.
+                from_index = int(index['index'][idxstart - 1] + 1) if idxstart > 0 else 0
+                return from_index, int(index['index'][idxend] + 1)
         return super(PandasStore, self)._index_range(version, symbol, **kwargs)
 
     def _daterange(self, recarr, date_range):
@@ -109,6 +112,16 @@ class PandasStore(NdarrayStore):
             item = self._daterange(item, date_range)
         return item
 
+    def iter_read(self, arctic_lib, version, symbol, rows_per_batch, read_preference=None, date_range=None,
+                  **kwargs):
+        for item in super(PandasStore, self).iter_read(arctic_lib, version, symbol, rows_per_batch, read_preference,
+                                                       date_range=date_range, **kwargs):
+            if date_range:
+                # Only the first and last batches can hold rows outside the range
+                item = self._daterange(item, date_range)
+            if len(item):
+                yield item
+
     def get_info(self, version):
         """
         parses out the relevant information in version
@@ -135,6 +148,14 @@ def _start_end(date_range, dts):
     return start, end
 
 
+def _columnar_layout(arctic_lib):
+    """
+    Whether this library writes DataFrames with the columnar layout
+    """
+    columnar = arctic_lib.get_cached_library_metadata(COLUMNAR_LAYOUT_KEY)
+    return ARCTIC_COLUMNAR_LAYOUT if columnar is None else bool(columnar)
+
+
 def _assert_no_timezone(date_range):
     for _dt in (date_range.start, date_range.end):
         if _dt and _dt.tzinfo is not None:
@@ -172,6 +193,10 @@ class PandasSeriesStore(PandasStore):
         item = super(PandasSeriesStore, self).read(arctic_lib, version, symbol, **kwargs)
         return self.SERIALIZER.deserialize(item)
 
+    def iter_read(self, arctic_lib, version, symbol, rows_per_batch, **kwargs):
+        for item in super(PandasSeriesStore, self).iter_read(arctic_lib, version, symbol, rows_per_batch, **kwargs):
+            yield self.SERIALIZER.deserialize(item)
+
 
 class PandasDataFrameStore(PandasStore):
     TYPE = 'pandasdf'
@@ -190,20 +215,63 @@ class PandasDataFrameStore(PandasStore):
 
     def write(self, arctic_lib, version, symbol, item, previous_version):
         item, md = self.SERIALIZER.serialize(item)
-        super(PandasDataFrameStore, self).write(arctic_lib, version, symbol, item, previous_version, dtype=md)
+        super(PandasDataFrameStore, self).write(arctic_lib, version, symbol, item, previous_version, dtype=md,
+                                                columnar=_columnar_layout(arctic_lib))
 
     def append(self, arctic_lib, version, symbol, item, previous_version, **kwargs):
         item, md = self.SERIALIZER.serialize(item)
         super(PandasDataFrameStore, self).append(arctic_lib, version, symbol, item, previous_version, dtype=md, **kwargs)
 
-    def read(self, arctic_lib, version, symbol, **kwargs):
-        item = super(PandasDataFrameStore, self).read(arctic_lib, version, symbol, **kwargs)
+    def read(self, arctic_lib, version, symbol, columns=None, **kwargs):
+        """
+        columns: only read these columns (and the index) of the DataFrame. Versions written with the columnar layout
+                 fetch and decompress just those, others are read whole.
+        """
+        fields = None
+        if columns is not None:
+            fields, metadata = self._column_fields(version, columns)
+        item = super(PandasDataFrameStore, self).read(arctic_lib, version, symbol, columns=fields, **kwargs)
+        if columns is not None:
+            item = item.view(self._dtype(str(item.dtype), metadata))
         # Try to check if force_bytes_to_unicode is set in kwargs else use the config value (which defaults to False)
         force_bytes_to_unicode = kwargs.get('force_bytes_to_unicode', FORCE_BYTES_TO_UNICODE)
         return self.SERIALIZER.deserialize(item, force_bytes_to_unicode=force_bytes_to_unicode)
 
+    def iter_read(self, arctic_lib, version, symbol, rows_per_batch, columns=None, **kwargs):
+        """
+        Yield the DataFrame (or its columns, as read does) in batches of consecutive rows
+        """
+        fields = None
+        if columns is not None:
+            fields, metadata = self._column_fields(version, columns)
+        force_bytes_to_unicode = kwargs.get('force_bytes_to_unicode', FORCE_BYTES_TO_UNICODE)
+        for item in super(PandasDataFrameStore, self).iter_read(arctic_lib, version, symbol, rows_per_batch,
+                                                                columns=fields, **kwargs):
+            if columns is not None:
+                item = item.view(self._dtype(str(item.dtype), metadata))
+            yield self.SERIALIZER.deserialize(item, force_bytes_to_unicode=force_bytes_to_unicode)
+
+    @staticmethod
+    def _column_fields(version, columns):
+        """
+        Return the fields of the record array storing the index and the given columns, and the dtype metadata
+        describing them
+        """
+        metadata = dict(version['dtype_metadata'])
+        stored = metadata['columns']
+        missing = [c for c in columns if str(c) not in stored]
+        if missing:
+            raise KeyError("Columns {} not found in {}".format(missing, version['symbol']))
+        positions = [stored.index(str(c)) for c in columns]
+        metadata['columns'] = [stored[i] for i in positions]
+        if metadata.get('multi_column'):
+            multi_column = metadata['multi_column']
+            metadata['multi_column'] = {'names': multi_column['names'],
+                                        'values': [[level[i] for i in positions] for level in multi_column['values']]}
+        return [str(i) for i in metadata['index']] + metadata['columns'], metadata
+
     def read_options(self):
-        return super(PandasDataFrameStore, self).read_options()
+        return super(PandasDataFrameStore, self).read_options() + ['columns']
 
 
 class PandasPanelStore(PandasDataFrameStore):
@@ -243,6 +311,10 @@ class PandasPanelStore(PandasDataFrameStore):
             return item.iloc[:, 0].unstack().to_panel()
         return item.to_panel()
 
+    def iter_read(self, arctic_lib, version, symbol, rows_per_batch, **kwargs):
+        # A batch of the rows of the stacked frame isn't a Panel
+        raise ArcticException("iter_read is not supported for pandas.Panel")
+
     def read_options(self):
         return super(PandasPanelStore, self).read_options()
 
@@ -8,9 +8,10 @@ from bson.binary import Binary
 from bson.errors import InvalidDocument
 from six.moves import cPickle, xrange
 
+from ._segment_cache import segment_cache, segment_key
 from ._version_store_utils import checksum, pickle_compat_load, version_base_or_id
-from .._compression import decompress, compress_array
-from ..exceptions import UnsupportedPickleStoreVersion
+from .._compression import decompress, decompress_array, compress_array
+from ..exceptions import UnsupportedPickleStoreVersion, DataIntegrityException
 
 # new versions of chunked pickled objects MUST begin with __chunked__
 _MAGIC_CHUNKED = '__chunked__'
@@ -38,9 +39,12 @@ class PickleStore(object):
         if blob is not None:
             if blob == _MAGIC_CHUNKEDV2:
                 collection = mongoose_lib.get_top_level_collection()
-                data = b''.join(decompress(x['data']) for x in sorted(
-                    collection.find({'symbol': symbol, 'parent': version_base_or_id(version)}),
-                    key=itemgetter('segment')))
+                spec = {'symbol': symbol, 'parent': version_base_or_id(version)}
+                if segment_cache.enabled:
+                    data = b''.join(self._read_cached_segments(collection, symbol, spec))
+                else:
+                    data = b''.join(decompress_array([x['data'] for x in sorted(collection.find(spec),
+                                                                                key=itemgetter('segment'))]))
             elif blob == _MAGIC_CHUNKED:
                 collection = mongoose_lib.get_top_level_collection()
                 data = b''.join(x['data'] for x in sorted(
@@ -71,6 +75,28 @@ class PickleStore(object):
                     return pickle_compat_load(io.BytesIO(data), encoding=encoding)
         return version['data']
 
+    @staticmethod
+    def _read_cached_segments(collection, symbol, spec):
+        """
+        Return the decompressed segments matching spec, in order, getting those in the segment cache from there
+        """
+        segments = sorted(collection.find(spec, projection={'_id': 0, 'segment': 1, 'sha': 1}),
+                          key=itemgetter('segment'))
+        keys = [segment_key(collection, symbol, x['sha']) for x in segments]
+        data = [segment_cache.get(key) for key in keys]
+        missing = [x['sha'] for x, d in zip(segments, data) if d is None]
+        if missing:
+            fetched = {bytes(x['sha']): x['data'] for x in collection.find({'symbol': symbol, 'sha': {'$in': missing}})}
+            if len(fetched) != len(missing):
+                raise DataIntegrityException("Expected {} segments of {}, but found {}".format(
+                                             len(missing), symbol, len(fetched)))
+            decompressed = iter(decompress_array([fetched[bytes(sha)] for sha in missing]))
+            for i, key in enumerate(keys):
+                if data[i] is None:
+                    data[i] = next(decompressed)
+                    segment_cache.put(key, data[i])
+        return data
+
     @staticmethod
     def read_options():
         return []
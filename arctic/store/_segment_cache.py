@@ -0,0 +1,106 @@
+import logging
+import threading
+from collections import OrderedDict
+
+from .._config import ARCTIC_SEGMENT_CACHE_BYTES
+
+logger = logging.getLogger(__name__)
+
+
+class SegmentCache(object):
+    """
+    A thread-safe LRU cache of decompressed segment data, bounded by the total size of the cached data.
+
+    Segments are keyed by (library, symbol, sha). A segment's sha is the checksum of its contents, so a cached
+    segment never goes stale: changed data is written to new segments, with new SHAs.
+    """
+
+    def __init__(self, max_bytes=0):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._max_bytes = int(max_bytes)
+        self._nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self._max_bytes > 0
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.pop(key, None)
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries[key] = data  # Most recently used
+            return data
+
+    def put(self, key, data):
+        if len(data) > self._max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._nbytes -= len(previous)
+            self._entries[key] = data
+            self._nbytes += len(data)
+            self._evict()
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self._max_bytes = int(max_bytes)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'segments': len(self._entries),
+                    'bytes': self._nbytes,
+                    'max_bytes': self._max_bytes}
+
+    def _evict(self):
+        while self._nbytes > self._max_bytes:
+            _, data = self._entries.popitem(last=False)
+            self._nbytes -= len(data)
+            self.evictions += 1
+
+
+segment_cache = SegmentCache(ARCTIC_SEGMENT_CACHE_BYTES)
+
+
+def enable_segment_cache(max_bytes):
+    """
+    Cache up to max_bytes of decompressed segments in this process, and serve repeated reads of the same
+    (NdarrayStore/PandasStore or chunked PickleStore) data from there. 0 disables (and empties) the cache.
+
+    Parameters
+    ----------
+        max_bytes: `int`
+            The maximum total size of the cached segments
+    """
+    segment_cache.resize(max_bytes)
+    if not max_bytes:
+        segment_cache.clear()
+    logger.info("Setting the segment cache size to {} bytes".format(max_bytes))
+
+
+def segment_cache_stats():
+    """
+    Return the segment cache's hit, miss and eviction counts, and its size in segments and bytes
+    """
+    return segment_cache.stats()
+
+
+def segment_key(collection, symbol, sha):
+    return collection.full_name, symbol, bytes(sha)
@@ -0,0 +1,236 @@
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime as dt, timedelta
+
+import bson
+from pymongo.errors import OperationFailure, PyMongoError
+
+from .._config import ARCTIC_VERSION_CACHE_SECONDS, ARCTIC_VERSION_CACHE_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+
+class VersionCache(object):
+    """
+    A thread-safe, in-process LRU cache of the latest version document of symbols, keyed by (library, symbol).
+
+    Unlike segments, latest versions go stale: any write creates a new one. Entries are dropped by the writes and
+    deletes of this process, by a watcher of the versions collection (see watch), if one is running, and otherwise
+    once they are max_age seconds old, which bounds how stale a read can be after another process changed a symbol.
+    """
+
+    def __init__(self, max_age=0, max_entries=0):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._ids = {}
+        # When each (recently) invalidated key was invalidated, so that lookups started before then aren't cached
+        self._invalidated = {}
+        self._watchers = {}
+        self.max_age = float(max_age)
+        self.max_entries = int(max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_age > 0 and self.max_entries > 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and time.time() - entry[0] <= self.max_age:
+                self.hits += 1
+                self._entries[key] = entry  # Most recently used
+                # A deep copy: callers are free to change the document, metadata included
+                return copy.deepcopy(entry[1])
+            if entry is not None:
+                self._ids.pop(entry[1]['_id'], None)
+            self.misses += 1
+            return None
+
+    def put(self, key, version, fetched):
+        """
+        Cache version, the latest version of key as looked up at time fetched (by time.time())
+        """
+        with self._lock:
+            if self._invalidated.get(key, 0) >= fetched:
+                # Changed while being looked up
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._ids.pop(previous[1]['_id'], None)
+            self._entries[key] = (fetched, copy.deepcopy(version))
+            self._ids[version['_id']] = key
+            while len(self._entries) > self.max_entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._ids.pop(evicted['_id'], None)
+                self.evictions += 1
+
+    def invalidate(self, keys):
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                self._invalidated[key] = now
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._ids.pop(entry[1]['_id'], None)
+                    self.invalidations += 1
+            if len(self._invalidated) > self.max_entries:
+                # Lookups which started longer than max_age ago are never served anyway
+                self._invalidated = {k: t for k, t in self._invalidated.items() if now - t <= self.max_age}
+
+    def invalidate_ids(self, version_ids):
+        with self._lock:
+            keys = [self._ids[i] for i in version_ids if i in self._ids]
+        self.invalidate(keys)
+
+    def configure(self, max_age, max_entries):
+        with self._lock:
+            self.max_age = float(max_age)
+            self.max_entries = int(max_entries)
+            if not self.enabled:
+                self._entries.clear()
+                self._ids.clear()
+                self._invalidated.clear()
+            while len(self._entries) > self.max_entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._ids.pop(evicted['_id'], None)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._ids.clear()
+            self._invalidated.clear()
+            self.hits = self.misses = self.invalidations = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_rate': float(self.hits) / lookups if lookups else 0.,
+                    'invalidations': self.invalidations,
+                    'evictions': self.evictions,
+                    'entries': len(self._entries),
+                    'max_entries': self.max_entries,
+                    'max_age': self.max_age,
+                    'watched': sorted(self._watchers)}
+
+    def watch(self, versions, poll_interval=1.):
+        """
+        Start (if not already running) a thread invalidating the entries of the library whose versions are changed by
+        other processes
+        """
+        with self._lock:
+            watcher = self._watchers.get(versions.full_name)
+            if watcher is None or not watcher.is_alive():
+                watcher = self._watchers[versions.full_name] = VersionWatcher(self, versions, poll_interval)
+                watcher.start()
+            return watcher
+
+    def unwatch(self, versions):
+        with self._lock:
+            watcher = self._watchers.pop(versions.full_name, None)
+        if watcher is not None:
+            watcher.stop()
+
+
+class VersionWatcher(threading.Thread):
+    """
+    Follows the inserts and deletes of a versions collection with a change stream, or, where change streams aren't
+    available (standalone servers), polls it for new versions every poll_interval seconds. Deleted versions are only
+    noticed through a change stream: when polling, deletes by other processes are only seen once the entries expire
+    (after the cache's max_age).
+    """
+
+    def __init__(self, cache, versions, poll_interval=1.):
+        super(VersionWatcher, self).__init__(name='arctic-version-watcher-' + versions.full_name)
+        self.daemon = True
+        self._cache = cache
+        self._versions = versions
+        self._poll_interval = poll_interval
+        self._stopped = threading.Event()
+        self._stream = None
+
+    def _key(self, symbol):
+        return version_key(self._versions, symbol)
+
+    def run(self):
+        try:
+            self._watch()
+        except OperationFailure as e:
+            logger.info("Can't watch %s (%s), polling it instead" % (self._versions.full_name, e))
+            self._poll()
+        except PyMongoError as e:
+            if not self._stopped.is_set():
+                logger.warning("Stopped watching %s: %s" % (self._versions.full_name, e))
+
+    def _watch(self):
+        pipeline = [{'$match': {'operationType': {'$in': ['insert', 'delete']}}}]
+        with self._versions.watch(pipeline) as stream:
+            self._stream = stream
+            for change in stream:
+                if change['operationType'] == 'insert':
+                    self._cache.invalidate([self._key(change['fullDocument']['symbol'])])
+                else:
+                    self._cache.invalidate_ids([change['documentKey']['_id']])
+                if self._stopped.is_set():
+                    break
+
+    def _poll(self):
+        # ObjectIds are only roughly ordered across hosts, so overlap the polls by a few seconds
+        since = dt.utcnow()
+        while not self._stopped.wait(self._poll_interval):
+            now = dt.utcnow()
+            try:
+                spec = {'_id': {'$gt': bson.ObjectId.from_datetime(since - timedelta(seconds=5))}}
+                symbols = self._versions.find(spec, projection={'symbol': 1, '_id': 0}).distinct('symbol')
+            except PyMongoError as e:
+                logger.warning("Failed to poll %s: %s" % (self._versions.full_name, e))
+                continue
+            self._cache.invalidate([self._key(s) for s in symbols])
+            since = now
+
+    def stop(self):
+        self._stopped.set()
+        if self._stream is not None:
+            self._stream.close()
+
+
+version_cache = VersionCache(ARCTIC_VERSION_CACHE_SECONDS, ARCTIC_VERSION_CACHE_ENTRIES)
+
+
+def enable_version_cache(max_age, max_entries=ARCTIC_VERSION_CACHE_ENTRIES):
+    """
+    Cache the latest version document of up to max_entries symbols in this process, for at most max_age seconds.
+    VersionStore reads, read_metadata, get_info and has_symbol of the latest version then only query mongo for the
+    version on a miss. 0 disables (and empties) the cache.
+
+    Parameters
+    ----------
+        max_age: `float`
+            The number of seconds a cached version can be served for, i.e. how stale a read can be after a write
+            or delete from another process (unless the library is watched with VersionStore.watch_versions, and
+            for deletes, the watcher can use a change stream)
+        max_entries: `int`
+            The maximum number of cached symbols, over all libraries
+    """
+    version_cache.configure(max_age, max_entries)
+    logger.info("Caching version documents for {} seconds ({} symbols)".format(max_age, max_entries))
+
+
+def version_cache_stats():
+    """
+    Return the version cache's hit, miss, invalidation and eviction counts, its hit rate and size
+    """
+    return version_cache.stats()
+
+
+def version_key(versions, symbol):
+    return versions.full_name, symbol
@@ -0,0 +1,197 @@
+import logging
+import operator
+
+import numpy as np
+from bson.binary import Binary
+
+from .._compression import compress, decompress
+
+logger = logging.getLogger(__name__)
+
+# Zone maps are kept in the version document, which mongo caps at 16MB
+_MAX_ZONE_MAP_SIZE = 4 * 1024 ** 2
+
+_COMPARISONS = {'==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le,
+                '>': operator.gt, '>=': operator.ge}
+OPERATORS = tuple(_COMPARISONS) + ('in', 'isnull', 'notnull')
+
+
+def zone_map_fields(dtype, columns=True):
+    """
+    The fields of dtype that zone maps can be kept for: its numeric (non sub-array) fields, or those of them
+    listed in columns
+    """
+    if dtype.names is None:
+        return []
+    return [n for n in dtype.names if dtype.fields[n][0].kind in 'iuf' and not dtype.fields[n][0].shape and
+            (columns is True or n in columns)]
+
+
+def _zone_map_dtype(dtype, fields):
+    zm_dtype = [('segment', 'i8')]
+    for i, n in enumerate(fields):
+        zm_dtype += [('min_%d' % i, dtype.fields[n][0]), ('max_%d' % i, dtype.fields[n][0]), ('nulls_%d' % i, 'i8')]
+    return np.dtype(zm_dtype)
+
+
+def read_zone_map(zone_map):
+    """
+    Return the per-segment statistics of a version's zone map as an array, or None if it has none
+    """
+    if not zone_map or 'data' not in zone_map:
+        return None
+    # read-only but it's never written to
+    return np.frombuffer(decompress(zone_map['data']), dtype=np.dtype(eval(zone_map['dtype'])))
+
+
+def zone_map(item, fields, existing, start, new_segments):
+    """
+    Compute the min, max and null (NaN) count of the fields of each of the segments just written.
+
+    Parameters:
+    -----------
+    item: the data written (or appended), a structured array
+    fields: the fields to keep statistics for
+    existing: the zone map of the previous version
+    start: first (0-based) offset of item
+    new_segments: the last rows of the new segments, relative to the start of the _original_ item
+
+    Returns:
+    --------
+    The zone map document to store in the version, or None if it can't be kept (e.g. it would be too large)
+    """
+    fields = [n for n in fields if n in zone_map_fields(item.dtype)]
+    zm_dtype = _zone_map_dtype(item.dtype, fields)
+    new_segments = np.array(new_segments, dtype='i8')
+    zm = np.zeros(len(new_segments), dtype=zm_dtype)
+    zm['segment'] = new_segments
+    if len(new_segments):
+        starts = np.concatenate([[0], new_segments[:-1] + 1 - start])
+        for i, n in enumerate(fields):
+            values = item[n]
+            if values.dtype.kind == 'f':
+                # fmin/fmax skip NaNs, all-NaN segments get NaN bounds which no comparison matches
+                zm['min_%d' % i] = np.fmin.reduceat(values, starts)
+                zm['max_%d' % i] = np.fmax.reduceat(values, starts)
+                zm['nulls_%d' % i] = np.add.reduceat(np.isnan(values).astype('i8'), starts)
+            else:
+                zm['min_%d' % i] = np.minimum.reduceat(values, starts)
+                zm['max_%d' % i] = np.maximum.reduceat(values, starts)
+
+    if start > 0:
+        # The statistics of the segments before start are taken from the previous version
+        existing_zm = read_zone_map(existing)
+        if existing_zm is None:
+            return None
+        if existing_zm.dtype != zm_dtype or existing['fields'] != fields:
+            logger.warning("Zone map fields have changed, dropping the zone map")
+            return None
+        zm = np.concatenate((existing_zm[existing_zm['segment'] < start], zm))
+
+    data = compress(zm.tostring())
+    if len(data) > _MAX_ZONE_MAP_SIZE:
+        logger.warning("Zone map of {} segments is too large ({} bytes), dropping it".format(len(zm), len(data)))
+        return None
+    return {'fields': fields, 'dtype': str(zm_dtype), 'data': Binary(data)}
+
+
+def parse_where(where):
+    """
+    Validate a where clause: a (field, operator, value) predicate, or a list of them which must all hold.
+    Operators are ==, !=, <, <=, >, >=, in (value is a list) and isnull/notnull (which take no value).
+    """
+    if isinstance(where, tuple):
+        where = [where]
+    predicates = []
+    for predicate in where:
+        if not isinstance(predicate, tuple) or len(predicate) not in (2, 3) or predicate[1] not in OPERATORS:
+            raise ValueError("Invalid predicate {!r}: expected (field, operator, value) with an operator in {}".format(
+                             predicate, OPERATORS))
+        field, op = predicate[:2]
+        if (op in ('isnull', 'notnull')) != (len(predicate) == 2):
+            raise ValueError("Invalid predicate {!r}: only isnull and notnull take no value".format(predicate))
+        predicates.append((field, op, predicate[2] if len(predicate) == 3 else None))
+    return predicates
+
+
+def _isnull(values):
+    if values.dtype.kind in 'fc':
+        return np.isnan(values)
+    return np.zeros(len(values), dtype=bool)
+
+
+def where_mask(item, predicates):
+    """
+    The rows of item which satisfy all the predicates
+    """
+    mask = np.ones(len(item), dtype=bool)
+    for field, op, value in predicates:
+        if field not in (item.dtype.names or ()):
+            raise ValueError("Unknown field {} in where".format(field))
+        values = item[field]
+        if op == 'in':
+            mask &= np.in1d(values, list(value))
+        elif op == 'isnull':
+            mask &= _isnull(values)
+        elif op == 'notnull':
+            mask &= ~_isnull(values)
+        else:
+            with np.errstate(invalid='ignore'):
+                mask &= _COMPARISONS[op](values, value)
+    return mask
+
+
+def _may_match(zm, i, rows, op, value):
+    mn, mx, nulls = zm['min_%d' % i], zm['max_%d' % i], zm['nulls_%d' % i]
+    with np.errstate(invalid='ignore'):
+        if op == '==':
+            return (mn <= value) & (value <= mx)
+        if op == '!=':
+            return (nulls > 0) | (mn != value) | (mx != value)
+        if op in ('<', '<='):
+            return _COMPARISONS[op](mn, value)
+        if op in ('>', '>='):
+            return _COMPARISONS[op](mx, value)
+        if op == 'in':
+            may_match = np.zeros(len(zm), dtype=bool)
+            for v in value:
+                may_match |= (mn <= v) & (v <= mx)
+            return may_match
+        if op == 'isnull':
+            return nulls > 0
+        return nulls < rows  # notnull
+
+
+def candidate_ranges(version, predicates, index_range=None):
+    """
+    Return the [from, to) row ranges of the version which can hold rows matching the predicates, given the
+    min/max statistics of its segments. Whole segments are returned, restricted to those overlapping index_range.
+    """
+    from_index, to_index = index_range or (None, None)
+    zm = read_zone_map(version.get('zone_map'))
+    if zm is None or not len(zm):
+        return [(from_index, to_index)]
+    fields = version['zone_map']['fields']
+    ends = zm['segment'] + 1
+    starts = np.concatenate([[0], ends[:-1]])
+    keep = np.ones(len(zm), dtype=bool)
+    if from_index is not None:
+        keep &= ends > from_index
+    if to_index is not None:
+        keep &= starts < to_index
+    for field, op, value in predicates:
+        if field in fields:
+            keep &= _may_match(zm, fields.index(field), ends - starts, op, value)
+
+    ranges = []
+    for i in np.flatnonzero(keep):
+        if ranges and ranges[-1][1] == starts[i]:
+            ranges[-1] = (ranges[-1][0], int(ends[i]))
+        else:
+            ranges.append((int(starts[i]), int(ends[i])))
+    if ends[-1] < version['up_to']:
+        # Shouldn't happen, but rows without statistics can't be skipped (if in index_range)
+        start = max(int(ends[-1]), from_index or 0)
+        if to_index is None or start < to_index:
+            ranges.append((start, to_index))
+    return ranges
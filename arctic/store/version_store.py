@@ -1,16 +1,24 @@
 import logging
+import time
+from collections import defaultdict
 from datetime import datetime as dt, timedelta
+from multiprocessing.pool import ThreadPool
 
 import bson
 import pymongo
 import six
 from pymongo import ReadPreference
-from pymongo.errors import OperationFailure, AutoReconnect, DuplicateKeyError
+from pymongo.errors import OperationFailure, AutoReconnect, DuplicateKeyError, BulkWriteError
 
+from ._ndarray_store import SegmentBatch, batched_segments
 from ._pickle_store import PickleStore
+from ._version_cache import version_cache, version_key
 from ._version_store_utils import cleanup, get_symbol_alive_shas, _get_symbol_pointer_cfgs
 from .versioned_item import VersionedItem
-from .._config import STRICT_WRITE_HANDLER_MATCH, FW_POINTERS_REFS_KEY, FW_POINTERS_CONFIG_KEY, FwPointersCfg
+from .._compression import get_codec
+from .._config import STRICT_WRITE_HANDLER_MATCH, FW_POINTERS_REFS_KEY, FW_POINTERS_CONFIG_KEY, FwPointersCfg, \
+    COMPRESSION_CODEC_KEY, COLUMNAR_LAYOUT_KEY, ZONE_MAPS_KEY, ARCTIC_READ_BATCH_SIZE, ARCTIC_READ_BATCH_WORKERS, \
+    ARCTIC_WRITE_BATCH_WORKERS, SYMBOL_CATALOGUE_KEY, ARCTIC_SYMBOL_CATALOGUE_STATE_SECONDS
 from .._util import indent, enable_sharding, mongo_count, get_fwptr_config
 from ..date import mktz, datetime_to_ms, ms_to_datetime
 from ..decorators import mongo_retry
@@ -25,6 +33,10 @@ _TYPE_HANDLERS = []
 ARCTIC_VERSION = None
 ARCTIC_VERSION_NUMERICAL = None
 
+# States of a library's symbol catalogue: being built (so maintained by writers, but not yet read from) and complete
+CATALOGUE_BUILDING = 'building'
+CATALOGUE_READY = 'ready'
+
 
 def register_version(version, numerical):
     global ARCTIC_VERSION, ARCTIC_VERSION_NUMERICAL
@@ -54,6 +66,23 @@ class VersionStore(object):
             arctic_lib.set_library_metadata('STRICT_WRITE_HANDLER_MATCH',
                                             bool(kwargs.pop('strict_write_handler')))
 
+        if 'compression_codec' in kwargs:
+            codec = kwargs.pop('compression_codec')
+            get_codec(codec)  # Fail early on unknown, or unavailable, codecs
+            arctic_lib.set_library_metadata(COMPRESSION_CODEC_KEY, codec)
+
+        if 'columnar_layout' in kwargs:
+            arctic_lib.set_library_metadata(COLUMNAR_LAYOUT_KEY, bool(kwargs.pop('columnar_layout')))
+
+        if 'zone_maps' in kwargs:
+            zone_maps = kwargs.pop('zone_maps')
+            arctic_lib.set_library_metadata(ZONE_MAPS_KEY, zone_maps if isinstance(zone_maps, bool) else
+                                            [str(c) for c in zone_maps])
+
+        if kwargs.pop('symbol_catalogue', False):
+            # The library is empty, so is its catalogue
+            arctic_lib.set_library_metadata(SYMBOL_CATALOGUE_KEY, CATALOGUE_READY)
+
         for th in _TYPE_HANDLERS:
             th.initialize_library(arctic_lib, **kwargs)
         VersionStore._bson_handler.initialize_library(arctic_lib, **kwargs)
@@ -80,6 +109,7 @@ class VersionStore(object):
         collection.versions.create_index([('symbol', pymongo.ASCENDING), ('version', pymongo.DESCENDING)], unique=True,
                                          background=True)
         collection.version_nums.create_index('symbol', unique=True, background=True)
+        collection.symbols.create_index('symbol', unique=True, background=True)
         for th in _TYPE_HANDLERS:
             th._ensure_index(collection)
 
@@ -89,6 +119,8 @@ class VersionStore(object):
         self._allow_secondary = self._arctic_lib.arctic._allow_secondary
         self._reset()
         self._with_strict_handler = None
+        self._symbol_catalogue = None
+        self._symbol_catalogue_checked = None
 
     @property
     def _with_strict_handler_match(self):
@@ -105,6 +137,7 @@ class VersionStore(object):
         self._snapshots = self._collection.snapshots
         self._versions = self._collection.versions
         self._version_nums = self._collection.version_nums
+        self._symbols = self._collection.symbols
 
     def __getstate__(self):
         return {'arctic_lib': self._arctic_lib}
@@ -150,6 +183,12 @@ class VersionStore(object):
         query = {}
         if regex is not None:
             query['symbol'] = {'$regex': regex}
+        if snapshot is None and not kwargs and self._symbol_catalogue_state() == CATALOGUE_READY:
+            # The catalogue has a document for each symbol with any versions, flagging those deleted in the 'trunk'
+            if all_symbols:
+                return self._symbols.find(query).distinct('symbol')
+            query['deleted'] = False
+            return sorted(x['symbol'] for x in self._symbols.find(query, projection={'symbol': 1, '_id': 0}))
         if kwargs:
             for k, v in six.iteritems(kwargs):
                 # TODO: this doesn't work as expected as it ignores the versions with metadata.deleted set
@@ -215,6 +254,8 @@ class VersionStore(object):
             `str` : snapshot name which contains the version
             `datetime.datetime` : the version of the data that existed as_of the requested point in time
         """
+        if as_of is None and self._symbol_catalogue_state() == CATALOGUE_READY:
+            return self._symbols.find_one({'symbol': symbol, 'deleted': False}, projection={'_id': 1}) is not None
         try:
             # Always use the primary for has_symbol, it's safer
             self._read_metadata(symbol, as_of=as_of, read_preference=ReadPreference.PRIMARY)
@@ -357,6 +398,12 @@ class VersionStore(object):
             `None` : use the settings from the top-level `Arctic` object used to query this version store.
             `True` : allow reads from secondary members
             `False` : only allow reads from primary members
+        kwargs :
+            passed through to the read handler. NdArrayStore/PandasStore handlers support:
+            `columns` : list of the DataFrame columns (structured array fields) to read
+            `where` : (field, operator, value) predicate, or list of predicates, that the rows returned match.
+                Operators are '==', '!=', '<', '<=', '>', '>=', 'in', and 'isnull'/'notnull' (no value), e.g.
+                where=[('price', '>', 100)]. Segments the library's zone maps rule out aren't fetched.
 
         Returns
         -------
@@ -382,6 +429,119 @@ class VersionStore(object):
             log_exception('read', e, 1)
             raise
 
+    @mongo_retry
+    def iter_read(self, symbol, as_of=None, date_range=None, rows_per_batch=100000, allow_secondary=None, **kwargs):
+        """
+        Read a symbol piece by piece, rather than materializing all of it as read() does. Only the segments of
+        one batch are held at a time: each is fetched with its own query as the iterator is advanced.
+
+        Parameters
+        ----------
+        symbol : `str`
+            symbol name for the item
+        as_of : `str` or `int` or `datetime.datetime`
+            Return the data as it was as_of the point in time. See read().
+        date_range: `arctic.date.DateRange`
+            DateRange to read data for. Applies to Pandas data, with a DateTime index
+            returns only the part of the data that falls in the DateRange.
+        rows_per_batch : `int`
+            The (approximate) number of rows of each batch. Batches are made of whole segments, so they can
+            hold somewhat more or fewer rows, and hold at least one segment.
+        allow_secondary : `bool` or `None`
+            Override the default behavior for allowing reads from secondary members of a cluster. See read().
+        kwargs :
+            passed through to the read handler, e.g. `columns`
+
+        Returns
+        -------
+        An iterator of the data (DataFrames, Series or arrays) of consecutive ranges of rows. Nothing is
+        yielded if no rows are read.
+        """
+        read_preference = self._read_preference(allow_secondary)
+        version = self._read_metadata(symbol, as_of=as_of, read_preference=read_preference)
+        if version.get('deleted'):
+            raise NoDataFoundException("No data found for %s in library %s" % (symbol, self._arctic_lib.get_name()))
+        handler = self._read_handler(version, symbol)
+        if not callable(getattr(handler, 'iter_read', None)):
+            raise ArcticException("iter_read is not supported by the handler of %s" % symbol)
+        if self._with_strict_handler_match and date_range and \
+                not self.handler_supports_read_option(handler, 'date_range'):
+            raise ArcticException("Date range arguments not supported by handler in %s" % symbol)
+        if kwargs.get('where') is not None:
+            raise ArcticException("where is not supported by iter_read")
+        return handler.iter_read(self._arctic_lib, version, symbol, rows_per_batch, read_preference=read_preference,
+                                 date_range=date_range, **kwargs)
+
+    def read_batch(self, symbols, as_of=None, date_range=None, allow_secondary=None, **kwargs):
+        """
+        Read many symbols at once. All their versions are looked up with a single query, the segments of
+        ARCTIC_READ_BATCH_SIZE symbols are fetched with each query, and the symbols are decoded on
+        ARCTIC_READ_BATCH_WORKERS threads.
+
+        Parameters
+        ----------
+        symbols : `list` of `str`
+            symbol names of the items
+        as_of : `str` or `int` or `datetime.datetime`
+            Return the data as it was as_of the point in time, for all the symbols. See read().
+        date_range: `arctic.date.DateRange`
+            DateRange to read data for.  Applies to Pandas data, with a DateTime index
+            returns only the part of the data that falls in the DateRange.
+        allow_secondary : `bool` or `None`
+            Override the default behavior for allowing reads from secondary members of a cluster. See read().
+        kwargs :
+            passed through to the read handlers
+
+        Returns
+        -------
+        dict of symbol -> VersionedItem, or the exception raised reading that symbol
+        """
+        read_preference = self._read_preference(allow_secondary)
+        kwargs['date_range'] = date_range
+        kwargs['read_preference'] = read_preference
+        results = {}
+        batched = []
+        pool = ThreadPool(ARCTIC_READ_BATCH_WORKERS)
+        try:
+            pending = []
+            for symbol, version in self._read_metadata_batch(symbols, as_of, read_preference).items():
+                if isinstance(version, Exception):
+                    results[symbol] = version
+                    continue
+                handler = self._read_handler(version, symbol)
+                # Reads which pick the rows (where) or columns they fetch, fetch their own segments
+                if callable(getattr(handler, 'segments_spec', None)) and kwargs.get('where') is None and \
+                        kwargs.get('columns') is None and not version.get('deleted'):
+                    batched.append((symbol, version, handler.segments_spec(version, symbol, **kwargs)))
+                else:
+                    pending.append((symbol, pool.apply_async(self._do_read, (symbol, version), kwargs)))
+
+            collection = self._collection.with_options(read_preference=read_preference)
+            for i in range(0, len(batched), ARCTIC_READ_BATCH_SIZE):
+                batch = batched[i:i + ARCTIC_READ_BATCH_SIZE]
+                segments = defaultdict(list)
+                try:
+                    for segment in collection.find({'$or': [spec for _, _, spec in batch]}):
+                        segments[segment['symbol']].append(segment)
+                except (OperationFailure, AutoReconnect) as e:
+                    # Let the symbols fetch their own segments
+                    log_exception('read_batch', e, 1)
+                    segments = None
+                for symbol, version, _ in batch:
+                    symbol_kwargs = dict(kwargs, segments=segments[symbol]) if segments is not None else kwargs
+                    pending.append((symbol, pool.apply_async(self._do_read, (symbol, version), symbol_kwargs)))
+
+            for symbol, result in pending:
+                try:
+                    results[symbol] = result.get()
+                except Exception as e:
+                    log_exception('read_batch', e, 1)
+                    results[symbol] = e
+        finally:
+            pool.close()
+            pool.join()
+        return results
+
     @mongo_retry
     def get_info(self, symbol, as_of=None):
         """
@@ -449,6 +609,8 @@ class VersionStore(object):
                 kwargs.get('date_range') and \
                 not self.handler_supports_read_option(handler, 'date_range'):
             raise ArcticException("Date range arguments not supported by handler in %s" % symbol)
+        if kwargs.get('where') is not None and not self.handler_supports_read_option(handler, 'where'):
+            raise ArcticException("where is not supported by the handler of %s" % symbol)
 
         data = handler.read(self._arctic_lib, version, symbol, from_version=from_version, **kwargs)
         return VersionedItem(symbol=symbol, library=self._arctic_lib.get_name(), version=version['version'],
@@ -492,7 +654,15 @@ class VersionStore(object):
         versions_coll = self._versions.with_options(read_preference=read_preference)
 
         _version = None
-        if as_of is None:
+        if as_of is None and version_cache.enabled:
+            key = version_key(self._versions, symbol)
+            _version = version_cache.get(key)
+            if _version is None:
+                fetched = time.time()
+                _version = versions_coll.find_one({'symbol': symbol}, sort=[('version', pymongo.DESCENDING)])
+                if _version:
+                    version_cache.put(key, _version, fetched)
+        elif as_of is None:
             _version = versions_coll.find_one({'symbol': symbol}, sort=[('version', pymongo.DESCENDING)])
         elif isinstance(as_of, six.string_types):
             # as_of is a snapshot
@@ -520,6 +690,51 @@ class VersionStore(object):
 
         return _version
 
+    @mongo_retry
+    def _read_metadata_batch(self, symbols, as_of=None, read_preference=None):
+        """
+        _read_metadata for many symbols, with one query. Returns a dict of symbol -> version document, or
+        the NoDataFoundException raised for symbols without one.
+        """
+        if read_preference is None:
+            read_preference = ReadPreference.PRIMARY_PREFERRED if not self._allow_secondary else ReadPreference.SECONDARY_PREFERRED
+
+        versions_coll = self._versions.with_options(read_preference=read_preference)
+        symbols = list(symbols)
+
+        if as_of is None or isinstance(as_of, dt):
+            match = {'symbol': {'$in': symbols}}
+            if isinstance(as_of, dt):
+                if not as_of.tzinfo:
+                    as_of = as_of.replace(tzinfo=mktz())
+                match['_id'] = {'$lt': bson.ObjectId.from_datetime(as_of + timedelta(seconds=1))}
+            # The latest version of each symbol, walking the (symbol, version) index
+            found = {x['_id']: x['version'] for x in versions_coll.aggregate([
+                {'$match': match},
+                {'$sort': {'symbol': pymongo.ASCENDING, 'version': pymongo.DESCENDING}},
+                {'$group': {'_id': '$symbol', 'version': {'$first': '$$ROOT'}}}], allowDiskUse=True)}
+        elif isinstance(as_of, six.string_types):
+            # as_of is a snapshot
+            snapshot = self._snapshots.find_one({'name': as_of})
+            found = {}
+            if snapshot:
+                found = {x['symbol']: x for x in versions_coll.find({'symbol': {'$in': symbols},
+                                                                     'parent': snapshot['_id']})}
+        else:
+            # Backward compatibility - as of is a version number
+            found = {x['symbol']: x for x in versions_coll.find({'symbol': {'$in': symbols}, 'version': as_of})}
+
+        versions = {}
+        for symbol in symbols:
+            _version = found.get(symbol)
+            metadata = _version.get('metadata', None) if _version else None
+            if not _version or (metadata is not None and metadata.get('deleted', False) is True):
+                versions[symbol] = NoDataFoundException("No data found for %s in library %s" %
+                                                        (symbol, self._arctic_lib.get_name()))
+            else:
+                versions[symbol] = _version
+        return versions
+
     def _insert_version(self, version):
         try:
             # Keep here the mongo_retry to avoid incrementing versions and polluting the DB with garbage segments,
@@ -530,6 +745,119 @@ class VersionStore(object):
         except DuplicateKeyError as err:
             logger.exception(err)
             raise OperationFailure("A version with the same _id exists, force a clean retry")
+        self._invalidate_version_cache([version['symbol']])
+        self._update_symbol_catalogue([version])
+
+    def _invalidate_version_cache(self, symbols):
+        if version_cache.enabled:
+            version_cache.invalidate([version_key(self._versions, symbol) for symbol in symbols])
+
+    def watch_versions(self, poll_interval=1.):
+        """
+        Keep the version cache (see arctic.store._version_cache.enable_version_cache) up to date with the writes of
+        other processes to this library, by following its versions with a change stream, or where those aren't
+        available, polling for new versions every poll_interval seconds. Polling doesn't see the deletes of other
+        processes, those are only seen once the cached versions expire. Returns the watcher thread.
+        """
+        return version_cache.watch(self._versions, poll_interval)
+
+    def _symbol_catalogue_state(self, refresh=False):
+        # Cached, or each write to a library without a catalogue would look it up. The states short of ready are
+        # looked up again once ARCTIC_SYMBOL_CATALOGUE_STATE_SECONDS old (or on refresh): writers check the state
+        # after inserting their version, so rebuild_symbol_catalogue, which waits that long after marking the
+        # catalogue as being built, either finds the version or has it recorded by the writer.
+        now = time.time()
+        if self._symbol_catalogue_checked is None or (self._symbol_catalogue != CATALOGUE_READY and (
+                refresh or now - self._symbol_catalogue_checked > ARCTIC_SYMBOL_CATALOGUE_STATE_SECONDS)):
+            self._symbol_catalogue = self._arctic_lib.get_library_metadata(SYMBOL_CATALOGUE_KEY)
+            self._symbol_catalogue_checked = now
+        return self._symbol_catalogue
+
+    @staticmethod
+    def _catalogue_entry(version):
+        metadata = version.get('metadata')
+        return {'version': version['version'],
+                'deleted': isinstance(metadata, dict) and metadata.get('deleted', False) is True}
+
+    def _update_symbol_catalogue(self, versions):
+        """
+        Record newly inserted versions in the symbol catalogue.
+
+        Multi-document transactions need a (4.0+) replica set, so the catalogue isn't updated in the same transaction
+        as the versions. Instead a symbol's entry is only ever replaced by a later version, so that concurrent writers
+        leave it at the latest one whatever the order of their updates.
+        """
+        if not versions or self._symbol_catalogue_state() not in (CATALOGUE_BUILDING, CATALOGUE_READY):
+            return
+        # The upsert of an entry which already has a later version fails on the unique symbol index
+        bulk = [pymongo.UpdateOne({'symbol': v['symbol'], 'version': {'$lte': v['version']}},
+                                  {'$set': self._catalogue_entry(v)}, upsert=True) for v in versions]
+
+        def _upsert():
+            try:
+                self._symbols.bulk_write(bulk, ordered=False)
+            except BulkWriteError as bwe:
+                if any(err.get('code') != 11000 for err in bwe.details['writeErrors']):
+                    raise
+        mongo_retry(_upsert)()
+
+    @mongo_retry
+    def _refresh_symbol_catalogue(self, symbol, version_num):
+        """
+        Update the catalogue entry of the symbol after its version version_num has been deleted
+        """
+        if self._symbol_catalogue_state(refresh=True) not in (CATALOGUE_BUILDING, CATALOGUE_READY):
+            return
+        latest = self._versions.find_one({'symbol': symbol}, sort=[('version', pymongo.DESCENDING)],
+                                         projection={'version': 1, 'metadata.deleted': 1})
+        # Leave alone entries already updated by a later write
+        spec = {'symbol': symbol, 'version': {'$lte': version_num}}
+        if latest is None:
+            self._symbols.delete_one(spec)
+        else:
+            self._symbols.update_one(spec, {'$set': self._catalogue_entry(latest)})
+
+    def rebuild_symbol_catalogue(self):
+        """
+        (Re)build the catalogue of the library's symbols, which list_symbols and has_symbol are then served from,
+        rather than from aggregations over all the versions. Writers maintain the catalogue while it's being built,
+        so the library can be in use: the rebuild waits ARCTIC_SYMBOL_CATALOGUE_STATE_SECONDS for the processes
+        which already had the library open to notice, before cataloguing the existing symbols.
+        """
+        logger.info("Building the symbol catalogue of %s" % self._arctic_lib.get_name())
+        self._symbols.create_index('symbol', unique=True, background=True)
+        if self._symbol_catalogue_state(refresh=True) != CATALOGUE_READY:
+            self._arctic_lib.set_library_metadata(SYMBOL_CATALOGUE_KEY, CATALOGUE_BUILDING)
+            self._symbol_catalogue = CATALOGUE_BUILDING
+            # From then on, the writes of every process are recorded in the catalogue
+            time.sleep(ARCTIC_SYMBOL_CATALOGUE_STATE_SECONDS)
+
+        # version_custom is 2*version + (1 if deleted else 0), as in list_symbols
+        latest = {x['_id']: {'symbol': x['_id'], 'version': x['version_custom'] // 2,
+                             'metadata': {'deleted': x['version_custom'] % 2 == 1}}
+                  for x in self._versions.aggregate([
+                      {'$group': {
+                          '_id': '$symbol',
+                          'version_custom': {
+                              '$max': {
+                                  '$add': [
+                                      {'$multiply': ['$version', 2]},
+                                      {'$cond': [{'$eq': ['$metadata.deleted', True]}, 1, 0]}
+                                  ]
+                              }
+                          },
+                      }}], allowDiskUse=True)}
+        versions = list(latest.values())
+        for i in range(0, len(versions), 1000):
+            self._update_symbol_catalogue(versions[i:i + 1000])
+        # Fix the entries of symbols whose versions were deleted without updating the catalogue
+        for entry in self._symbols.find({}, projection={'symbol': 1, 'version': 1}):
+            if entry['symbol'] not in latest or entry['version'] > latest[entry['symbol']]['version']:
+                self._refresh_symbol_catalogue(entry['symbol'], entry['version'])
+
+        self._arctic_lib.set_library_metadata(SYMBOL_CATALOGUE_KEY, CATALOGUE_READY)
+        self._symbol_catalogue = CATALOGUE_READY
+        logger.info("Catalogued %d symbols" % len(latest))
 
     @mongo_retry
     def append(self, symbol, data, metadata=None, prune_previous_version=True, upsert=True, **kwargs):
@@ -617,6 +945,55 @@ class VersionStore(object):
                              metadata=version.pop('metadata', None), data=None,
                              host=self._arctic_lib.arctic.mongo_host)
 
+    @mongo_retry
+    def compact(self, symbol, prune_previous_version=True):
+        """
+        Rewrite the latest version of symbol as a new version with the same data and metadata, if its data is
+        spread over more segments than needed, e.g. after many appends. Its rows, from the first segment which
+        isn't full onwards, are re-chunked into full segments; the segments before that are shared.
+
+        Parameters
+        ----------
+        symbol : `str`
+            symbol name for the item
+        prune_previous_version : `bool`
+            Removes previous (non-snapshotted) versions from the database.
+            Default: True
+
+        Returns
+        -------
+        (segments before, segments after) tuple of the segment counts of the latest version
+        """
+        self._arctic_lib.check_quota()
+        previous_version = self._versions.find_one({'symbol': symbol}, sort=[('version', pymongo.DESCENDING)])
+        if previous_version is None:
+            raise NoDataFoundException("No data found for %s in library %s" % (symbol, self._arctic_lib.get_name()))
+        segments = previous_version.get('segment_count', 0)
+        handler = self._read_handler(previous_version, symbol)
+        if not callable(getattr(handler, 'compact', None)) or not handler.can_compact(previous_version):
+            return segments, segments
+
+        version = {'_id': bson.ObjectId()}
+        version['arctic_version'] = ARCTIC_VERSION_NUMERICAL
+        version['symbol'] = symbol
+        version['version'] = self._version_nums.find_one_and_update({'symbol': symbol},
+                                                                    {'$inc': {'version': 1}},
+                                                                    upsert=False, new=True)['version']
+        if version['version'] != previous_version['version'] + 1:
+            # Written concurrently (or a previous write failed): leave the symbol to the next compaction
+            logger.info("Not compacting %s, which changed since version %s" % (symbol, previous_version['version']))
+            return segments, segments
+        if 'metadata' in previous_version:
+            version['metadata'] = previous_version['metadata']
+
+        handler.compact(self._arctic_lib, version, symbol, previous_version)
+
+        if prune_previous_version:
+            self._prune_previous_versions(symbol, new_version_shas=version.get(FW_POINTERS_REFS_KEY))
+        self._insert_version(version)
+        logger.info("Compacted %s from %d to %d segments" % (symbol, segments, version['segment_count']))
+        return segments, version['segment_count']
+
     @mongo_retry
     def write(self, symbol, data, metadata=None, prune_previous_version=True, **kwargs):
         """
@@ -669,6 +1046,148 @@ class VersionStore(object):
                              metadata=version.pop('metadata', None), data=None,
                              host=self._arctic_lib.arctic.mongo_host)
 
+    def write_batch(self, data, metadata=None, prune_previous_version=True, **kwargs):
+        """
+        Write many symbols at once. The previous versions of all the symbols are looked up with a single query,
+        their data is serialized and compressed on ARCTIC_WRITE_BATCH_WORKERS threads, and the new version
+        documents are inserted (and the previous versions pruned) in bulk. The segments of all the symbols are
+        written together, with bulk writes of at most ARCTIC_WRITE_INFLIGHT_BYTES each preceded by a single lookup
+        of the segments already stored, and checked before the versions are inserted.
+
+        As with write(), a symbol's new version only becomes visible once all of its data has been written, and a
+        symbol which fails to write doesn't affect the others.
+
+        Parameters
+        ----------
+        data : `dict`
+            symbol name -> data to be persisted
+        metadata : `dict`
+            an optional dictionary of metadata to persist along with every symbol.
+            Default: None
+        prune_previous_version : `bool`
+            Removes previous (non-snapshotted) versions from the database.
+            Default: True
+        kwargs :
+            passed through to the write handlers
+
+        Returns
+        -------
+        dict of symbol -> VersionedItem, or the exception raised writing that symbol
+        """
+        self._arctic_lib.check_quota()
+        symbols = list(data)
+        results = {}
+        written = []
+        segment_batch = SegmentBatch(self._collection)
+        pool = ThreadPool(ARCTIC_WRITE_BATCH_WORKERS)
+        try:
+            versions = {}
+            # Version numbers are still taken a symbol at a time, that's what makes them unique
+            for symbol, version_num in zip(symbols, pool.map(self._next_version_num, symbols)):
+                versions[symbol] = {'_id': bson.ObjectId(),
+                                    'arctic_version': ARCTIC_VERSION_NUMERICAL,
+                                    'symbol': symbol,
+                                    'version': version_num,
+                                    'metadata': metadata}
+            previous_versions = self._previous_versions_batch(versions)
+
+            pending = [(symbol, pool.apply_async(self._write_batch_item,
+                                                 (segment_batch, versions[symbol], data[symbol],
+                                                  previous_versions.get(symbol)),
+                                                 kwargs))
+                       for symbol in symbols]
+            for symbol, result in pending:
+                try:
+                    result.get()
+                    written.append(symbol)
+                except Exception as e:
+                    log_exception('write_batch', e, 1)
+                    results[symbol] = e
+        finally:
+            pool.close()
+            pool.join()
+
+        # Write the segments still queued, and check each symbol's segments before its version goes in
+        segment_batch.flush()
+        for symbol in list(written):
+            try:
+                segment_batch.check(symbol)
+            except Exception as e:
+                log_exception('write_batch', e, 1)
+                results[symbol] = e
+                written.remove(symbol)
+
+        if prune_previous_version:
+            self._prune_previous_versions_batch({symbol: versions[symbol].get(FW_POINTERS_REFS_KEY)
+                                                 for symbol in written if previous_versions.get(symbol)})
+
+        # Insert the new versions into the version DB
+        failed = self._insert_versions([versions[symbol] for symbol in written])
+        for symbol in written:
+            if symbol in failed:
+                # Another writer took the version number, do a clean retry of the symbol as write() would
+                try:
+                    results[symbol] = self.write(symbol, data[symbol], metadata=metadata,
+                                                 prune_previous_version=prune_previous_version, **kwargs)
+                except Exception as e:
+                    log_exception('write_batch', e, 1)
+                    results[symbol] = e
+            else:
+                version = versions[symbol]
+                results[symbol] = VersionedItem(symbol=symbol, library=self._arctic_lib.get_name(),
+                                                version=version['version'], metadata=version.pop('metadata', None),
+                                                data=None, host=self._arctic_lib.arctic.mongo_host)
+        logger.debug('Finished writing versions for %d symbols', len(written))
+        return results
+
+    @mongo_retry
+    def _next_version_num(self, symbol):
+        return self._version_nums.find_one_and_update({'symbol': symbol},
+                                                      {'$inc': {'version': 1}},
+                                                      upsert=True, new=True)['version']
+
+    @mongo_retry
+    def _previous_versions_batch(self, versions):
+        """
+        The latest version of each symbol (of the symbol -> new version dict) before its new one, with one query
+        """
+        symbols = list(versions)
+        found = {x['_id']: x['version'] for x in self._versions.aggregate([
+            {'$match': {'symbol': {'$in': symbols}}},
+            {'$sort': {'symbol': pymongo.ASCENDING, 'version': pymongo.DESCENDING}},
+            {'$group': {'_id': '$symbol', 'version': {'$first': '$$ROOT'}}}], allowDiskUse=True)}
+        for symbol, version in versions.items():
+            if symbol in found and found[symbol]['version'] >= version['version']:
+                # A concurrent write has already inserted a later version
+                found[symbol] = self._versions.find_one({'symbol': symbol, 'version': {'$lt': version['version']}},
+                                                        sort=[('version', pymongo.DESCENDING)])
+        return found
+
+    def _write_batch_item(self, segment_batch, version, data, previous_version, **kwargs):
+        handler = self._write_handler(version, version['symbol'], data, **kwargs)
+        with batched_segments(segment_batch):
+            handler.write(self._arctic_lib, version, version['symbol'], data, previous_version, **kwargs)
+
+    def _insert_versions(self, versions):
+        """
+        Insert many version documents with one unordered bulk insert, returning the symbols which failed to insert
+        """
+        if not versions:
+            return set()
+        try:
+            self._versions.insert_many(versions, ordered=False)
+        except (BulkWriteError, AutoReconnect) as e:
+            # Not retried as a whole: some of the versions may have been inserted, the rest are retried by the caller
+            logger.warning("Failed to insert all the versions: %s", e)
+            inserted = set(v['_id'] for v in mongo_retry(self._versions.find)(
+                {'_id': {'$in': [v['_id'] for v in versions]}}, projection={'_id': 1}))
+            self._invalidate_version_cache([v['symbol'] for v in versions if v['_id'] in inserted])
+            self._update_symbol_catalogue([v for v in versions if v['_id'] in inserted])
+            return set(v['symbol'] for v in versions if v['_id'] not in inserted)
+        self._invalidate_version_cache([v['symbol'] for v in versions])
+        self._update_symbol_catalogue(versions)
+        return set()
+
     def _add_new_version_using_reference(self, symbol, new_version, reference_version, prune_previous_version):
         # Attention: better not use this method following an append.
         # It is dangerous because if it deletes the version at the last_look, the segments added by the
@@ -698,6 +1217,8 @@ class VersionStore(object):
         if last_look is None or last_look.get('deleted'):
             # Revert the change
             mongo_retry(self._versions.delete_one)({'_id': new_version['_id']})
+            self._invalidate_version_cache([symbol])
+            self._refresh_symbol_catalogue(symbol, new_version['version'])
             # Indicate the failure
             raise OperationFailure("Failed to write metadata for symbol %s. "
                                    "The previous version (%s, %d) has been removed during the update" %
@@ -889,6 +1410,64 @@ class VersionStore(object):
                              shas_to_delete=shas_to_delete,
                              pointers_cfgs=[v[1] for v in prunable_ids_to_shas.values()])
 
+    @mongo_retry
+    def _find_prunable_version_ids_batch(self, symbols, keep_mins):
+        """
+        _find_prunable_version_ids for many symbols with one query: symbol -> {version _id: (SHAs, pointers config)}
+        """
+        read_preference = ReadPreference.SECONDARY_PREFERRED if keep_mins > 0 else ReadPreference.PRIMARY
+        versions = self._versions.with_options(read_preference=read_preference)
+        query = {'symbol': {'$in': list(symbols)},
+                 '$or': [{'parent': {'$exists': False}}, {'parent': []}],
+                 '_id': {'$lt': bson.ObjectId.from_datetime(dt.utcnow() + timedelta(seconds=1)
+                                                            - timedelta(minutes=keep_mins))}
+                 }
+        cursor = versions.find(query,
+                               sort=[('symbol', pymongo.ASCENDING), ('version', pymongo.DESCENDING)],
+                               projection={'_id': 1, 'symbol': 1, FW_POINTERS_REFS_KEY: 1, FW_POINTERS_CONFIG_KEY: 1})
+        prunable = {}
+        for v in cursor:
+            if v['symbol'] not in prunable:
+                # Keep the latest version of each symbol
+                prunable[v['symbol']] = {}
+                continue
+            prunable[v['symbol']][v['_id']] = ([bson.binary.Binary(x) for x in v.get(FW_POINTERS_REFS_KEY, [])],
+                                               get_fwptr_config(v))
+        return prunable
+
+    def _prune_previous_versions_batch(self, new_version_shas, keep_mins=120):
+        """
+        _prune_previous_versions for many symbols (symbol -> SHAs of its new version), with one query to find the
+        versions to prune, one to find the base versions to keep, and one to delete them.
+        """
+        if not new_version_shas:
+            return
+        prunable = self._find_prunable_version_ids_batch(new_version_shas, keep_mins)
+        prunable_ids = [i for ids in prunable.values() for i in ids]
+        if not prunable_ids:
+            return
+
+        base_version_ids = set(version['base_version_id'] for version in
+                               mongo_retry(self._versions.find)({'symbol': {'$in': list(prunable)},
+                                                                 '_id': {'$nin': prunable_ids},
+                                                                 'base_version_id': {'$exists': True}},
+                                                                projection={'base_version_id': 1}))
+        version_ids = {symbol: [i for i in ids if i not in base_version_ids] for symbol, ids in prunable.items()}
+        version_ids = {symbol: ids for symbol, ids in version_ids.items() if ids}
+        if not version_ids:
+            return
+
+        # Delete the version documents
+        mongo_retry(self._versions.delete_many)({'_id': {'$in': [i for ids in version_ids.values() for i in ids]}})
+
+        for symbol, ids in version_ids.items():
+            # The new versions have not been written yet, so make sure that any SHAs pointed by them are preserved
+            new_shas = new_version_shas[symbol] or []
+            shas_to_delete = [sha for i in ids for sha in prunable[symbol][i][0] if sha not in new_shas]
+            mongo_retry(cleanup)(self._arctic_lib, symbol, ids, self._versions,
+                                 shas_to_delete=shas_to_delete,
+                                 pointers_cfgs=[prunable[symbol][i][1] for i in ids])
+
     @mongo_retry
     def _delete_version(self, symbol, version_num, do_cleanup=True):
         """
@@ -908,6 +1487,8 @@ class VersionStore(object):
                                                                                     snap_name))
                 return
         self._versions.delete_one({'_id': version['_id']})
+        self._invalidate_version_cache([symbol])
+        self._refresh_symbol_catalogue(symbol, version['version'])
         # TODO: for FW pointers, if the above statement fails, they we have no way to delete the orphaned segments.
         #       This would be possible only via FSCK, or by moving the above statement at the end of this method,
         #       but with the risk of failing to delelte the version catastrophically, and ending up with a corrupted v.
@@ -938,6 +1519,8 @@ class VersionStore(object):
                                                    'metadata.deleted': {'$ne': True}})
         if not snapped_version:
             self._delete_version(symbol, sentinel.version)
+        # Lookups racing with the delete may have cached one of the versions it removed
+        self._invalidate_version_cache([symbol])
         assert not self.has_symbol(symbol)
 
     def _write_audit(self, user, message, changed_version):
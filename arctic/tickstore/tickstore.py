@@ -1,8 +1,11 @@
 from __future__ import print_function
 
 import copy
+import itertools
 import logging
+from collections import OrderedDict, deque
 from datetime import datetime as dt, timedelta
+from multiprocessing.pool import ThreadPool
 
 import numpy as np
 import pandas as pd
@@ -10,7 +13,7 @@ import pymongo
 from bson.binary import Binary
 from pymongo import ReadPreference
 from pymongo.errors import OperationFailure
-from six import iteritems, string_types
+from six import iteritems, itervalues, string_types
 
 try:
     from pandas.core.frame import _arrays_to_mgr
@@ -23,6 +26,7 @@ try:
 except ImportError:
     from pandas.lib import infer_dtype
 
+from .._config import ARCTIC_TICKSTORE_DECODE_WORKERS, ARCTIC_TICKSTORE_PREALLOCATE
 from ..date import DateRange, to_pandas_closed_closed, mktz, datetime_to_ms, ms_to_datetime, CLOSED_CLOSED, to_dt, utc_dt_to_local_dt
 from ..decorators import mongo_retry
 from ..exceptions import OverlappingDataException, NoDataFoundException, UnorderedDataException, UnhandledDtypeException, ArcticException
@@ -60,6 +64,7 @@ logger = logging.getLogger(__name__)
 #        ROWMASK: Binary('...', 0)},
 #               ...
 #    }
+#  EMPTY_ROWMASK: Binary('...', 0),  # rows without any value, only if there are any
 #  START: DateTime(...),
 #  END: DateTime(...),
 #  END_SEQ: 31553879L,
@@ -87,6 +92,7 @@ DATA = 'd'
 DTYPE = 't'
 IMAGE_TIME = 't'
 ROWMASK = 'm'
+EMPTY_ROWMASK = 'em'
 
 COUNT = 'c'
 VERSION = 'v'
@@ -262,7 +268,7 @@ class TickStore(object):
         return ReadPreference.NEAREST if allow_secondary else ReadPreference.PRIMARY
 
     def read(self, symbol, date_range=None, columns=None, include_images=False, allow_secondary=None,
-             _target_tick_count=0):
+             decode_workers=None, preallocate=None, _target_tick_count=0):
         """
         Read data for the named symbol.  Returns a VersionedItem object with
         a data and metdata element (as passed into write).
@@ -282,6 +288,13 @@ class TickStore(object):
             `None` : use the settings from the top-level `Arctic` object used to query this version store.
             `True` : allow reads from secondary members
             `False` : only allow reads from primary members
+        decode_workers : `int` or `None`
+            Number of threads decoding the buckets while the rest are being fetched, 1 decodes them serially.
+            Defaults to ARCTIC_TICKSTORE_DECODE_WORKERS.
+        preallocate : `bool` or `None`
+            Size the result from the buckets' headers and decode each bucket straight into its slice of the
+            columns, saving the copies made concatenating per-bucket arrays. Not used with include_images.
+            Defaults to ARCTIC_TICKSTORE_PREALLOCATE.
 
         Returns
         -------
@@ -311,36 +324,66 @@ class TickStore(object):
                                (START, 1),
                                (VERSION, 1),
                                (COLUMNS, 1),
+                               (EMPTY_ROWMASK, 1),
                                (IMAGE_DOC, 1)])
 
+        if preallocate is None:
+            preallocate = ARCTIC_TICKSTORE_PREALLOCATE
+        preallocate = preallocate and not include_images
+        if preallocate:
+            projection[COUNT] = 1
+
         column_dtypes = {}
         ticks_read = 0
         data_coll = self._collection.with_options(read_preference=self._read_preference(allow_secondary))
-        for b in data_coll.find(query, projection=projection).sort([(START, pymongo.ASCENDING)],):
-            data = self._read_bucket(b, column_set, column_dtypes,
-                                     multiple_symbols or (columns is not None and 'SYMBOL' in columns),
-                                     include_images, columns)
-            for k, v in iteritems(data):
-                try:
-                    rtn[k].append(v)
-                except KeyError:
-                    rtn[k] = [v]
-            # For testing
-            ticks_read += len(data[INDEX])
-            if _target_tick_count and ticks_read > _target_tick_count:
-                break
+        cursor = data_coll.find(query, projection=projection).sort([(START, pymongo.ASCENDING)],)
+        include_symbol = multiple_symbols or (columns is not None and 'SYMBOL' in columns)
+        # Buckets only partly in the date range are trimmed before their columns are unpacked
+        ms_range = None
+        if date_range:
+            ms_range = (datetime_to_ms(date_range.start) if date_range.start else None,
+                        datetime_to_ms(date_range.end) if date_range.end else None)
+        if decode_workers is None:
+            decode_workers = ARCTIC_TICKSTORE_DECODE_WORKERS
+        if preallocate:
+            rtn = self._read_preallocated(cursor, column_set, include_symbol, decode_workers, ms_range,
+                                          _target_tick_count)
+        else:
+            if decode_workers > 1:
+                buckets = self._read_buckets_parallel(cursor, decode_workers, column_set, column_dtypes,
+                                                      include_symbol, include_images, columns, ms_range)
+            else:
+                buckets = (self._read_bucket(b, column_set, column_dtypes, include_symbol, include_images, columns,
+                                             ms_range)
+                           for b in cursor)
+            for data in buckets:
+                for k, v in iteritems(data):
+                    try:
+                        rtn[k].append(v)
+                    except KeyError:
+                        rtn[k] = [v]
+                # For testing
+                ticks_read += len(data[INDEX])
+                if _target_tick_count and ticks_read > _target_tick_count:
+                    break
+            # Stops the decoding of any buckets left
+            buckets.close()
 
         if not rtn:
             raise NoDataFoundException("No Data found for {} in range: {}".format(symbol, date_range))
-        rtn = self._pad_and_fix_dtypes(rtn, column_dtypes)
-
-        index = pd.to_datetime(np.concatenate(rtn[INDEX]), utc=True, unit='ms')
+        if preallocate:
+            index = pd.to_datetime(rtn[INDEX], utc=True, unit='ms')
+        else:
+            rtn = self._pad_and_fix_dtypes(rtn, column_dtypes)
+            index = pd.to_datetime(np.concatenate(rtn[INDEX]), utc=True, unit='ms')
         if columns is None:
             columns = [x for x in rtn.keys() if x not in (INDEX, 'SYMBOL')]
         if multiple_symbols and 'SYMBOL' not in columns:
             columns = ['SYMBOL', ] + columns
 
-        if len(index) > 0:
+        if preallocate:
+            arrays = [rtn[k] for k in columns]
+        elif len(index) > 0:
             arrays = [np.concatenate(rtn[k]) for k in columns]
         else:
             arrays = [[] for _ in columns]
@@ -447,17 +490,161 @@ class TickStore(object):
                 document[field] = np.insert(document[field], 0, document[field].dtype.type(val))
         return document
 
-    def _read_bucket(self, doc, column_set, column_dtypes, include_symbol, include_images, columns):
+    def _read_buckets_parallel(self, cursor, workers, column_set, column_dtypes, include_symbol, include_images,
+                               columns, ms_range=None):
+        """
+        Decode the buckets of the cursor on a pool of threads, yielding them (as _read_bucket does) in the cursor's
+        order, i.e. by bucket start. Each bucket is decoded with its own column set, and with the dtypes the
+        buckets before it promote its columns to (worked out from their headers as they are fetched), so that
+        the result is the same as decoding them serially.
+        """
+        requested = set(column_set)
+
+        def _decode(doc, bucket_dtypes):
+            return self._read_bucket(doc, set(requested), bucket_dtypes, include_symbol, include_images,
+                                     columns, ms_range), bucket_dtypes
+
+        def _merge(result):
+            data, bucket_dtypes = result.get()
+            column_dtypes.clear()
+            column_dtypes.update(bucket_dtypes)
+            for c in column_set.difference(data):
+                data[c] = None
+            column_set.update(k for k in data if k not in (INDEX, 'SYMBOL'))
+            return data
+
+        pool = ThreadPool(workers)
+        pending = deque()
+        dtypes = dict(column_dtypes)
+        try:
+            for doc in cursor:
+                pending.append(pool.apply_async(_decode, (doc, dict(dtypes))))
+                self._promote_bucket_dtypes(doc, dtypes, include_images, columns)
+                # Bound the number of decoded buckets waiting to be consumed
+                if len(pending) > 2 * workers:
+                    yield _merge(pending.popleft())
+            while pending:
+                yield _merge(pending.popleft())
+        finally:
+            pool.terminate()
+
+    def _promote_bucket_dtypes(self, doc, column_dtypes, include_images, columns):
+        """
+        Update column_dtypes as _read_bucket does when reading doc, from the bucket's header alone
+        """
+        for c, coldata in iteritems(doc[COLUMNS]):
+            self._set_or_promote_dtype(column_dtypes, c, np.dtype(coldata[DTYPE]))
+        if include_images:
+            # As _prepend_image, for the image's fields the bucket has no column of
+            for field, val in iteritems(doc.get(IMAGE_DOC, {}).get(IMAGE, {})):
+                if field != INDEX and (not columns or field in columns) and field not in doc[COLUMNS]:
+                    column_dtypes[field] = np.dtype(str if isinstance(val, string_types) else 'f8')
+
+    def _read_preallocated(self, cursor, column_set, include_symbol, decode_workers, ms_range=None,
+                           target_tick_count=0):
+        """
+        Read the buckets of the cursor into columns which are allocated once. A first pass over the (still
+        compressed) bucket documents works out the rows each bucket contributes, from the union of its columns'
+        row masks, and the dtypes its columns are promoted to by then. A second pass decodes each bucket straight
+        into its slice of the columns, on a pool of decode_workers threads if more than 1. Buckets are trimmed to
+        ms_range as in _read_bucket.
+
+        The columns get the same dtypes and values as with _read_bucket and _pad_and_fix_dtypes: a column is
+        float64 if it is numeric throughout, otherwise object, with NaNs (and floats) in the slices of the
+        buckets by which it was still numeric and Nones elsewhere.
+
+        Returns a dict of INDEX, 'SYMBOL' (if include_symbol) and each column to its array, in the order of
+        the columns' first appearance in the buckets (as read builds it), or an empty dict if there are no buckets.
+        """
+        buckets = []
+        column_dtypes = {}
+        order = OrderedDict()
+        length = 0
+        for doc in cursor:
+            if doc[VERSION] != 3:
+                raise ArcticException("Unhandled document version: %s" % doc[VERSION])
+            column_set.update(doc[COLUMNS].keys())
+            doc_length = doc[COUNT]
+            lo, hi = 0, doc_length
+            if ms_range is not None:
+                lo, hi = self._rows_in_range(np.cumsum(np.frombuffer(lz4_decompress(doc[INDEX]), dtype='uint64')),
+                                             ms_range)
+            union_mask = self._empty_rowmask(doc, doc_length)
+            for coldata in itervalues(doc[COLUMNS]):
+                union_mask |= np.frombuffer(lz4_decompress(coldata[ROWMASK]), dtype='uint8')
+            union_mask = np.unpackbits(union_mask)[:doc_length][lo:hi].astype('bool')
+            rows = int(np.sum(union_mask))
+            self._promote_bucket_dtypes(doc, column_dtypes, False, None)
+            # The columns _read_bucket would unpack into float64 arrays (NaN for missing values)
+            floats = frozenset(c for c in doc[COLUMNS] if column_dtypes[c] == np.float64)
+            buckets.append((doc, length, rows, lo, hi, None if rows == hi - lo else union_mask, floats))
+            length += rows
+            for c in itertools.chain((c for c in column_set if c not in doc[COLUMNS]),
+                                     (c for c in column_set if c in doc[COLUMNS])):
+                order[c] = None
+            # For testing
+            if target_tick_count and length > target_tick_count:
+                break
+        if not buckets:
+            return {}
+
+        rtn = OrderedDict([(INDEX, np.empty(length, dtype='uint64'))])
+        if include_symbol:
+            rtn['SYMBOL'] = np.empty(length, dtype=np.object_)
+        for c in order:
+            # Only columns of numbers throughout are returned as floats (see _pad_and_fix_dtypes)
+            dtype = column_dtypes.get(c)
+            rtn[c] = self._empty(length, np.float64 if dtype == np.float64 else None)
+
+        def _decode(doc, offset, rows, lo, hi, union_mask, floats):
+            index = np.cumsum(np.frombuffer(lz4_decompress(doc[INDEX]), dtype='uint64'))[lo:hi]
+            rtn[INDEX][offset:offset + rows] = index if union_mask is None else index[union_mask]
+            if include_symbol:
+                rtn['SYMBOL'][offset:offset + rows] = doc[SYMBOL]
+            for c, coldata in iteritems(doc[COLUMNS]):
+                if c not in rtn:
+                    continue
+                values = np.frombuffer(lz4_decompress(coldata[DATA]), dtype=np.dtype(coldata[DTYPE]))
+                rowmask = np.unpackbits(np.frombuffer(lz4_decompress(coldata[ROWMASK]),
+                                        dtype='uint8'))[:doc[COUNT]].astype('bool')
+                values, rowmask = self._column_rows(values, rowmask, lo, hi)
+                if union_mask is not None:
+                    rowmask = rowmask[union_mask]
+                column = rtn[c][offset:offset + rows]
+                if c in floats and column.dtype != np.float64:
+                    # A column which only becomes an object one in a later bucket
+                    column[:] = np.nan
+                    values = values.astype(np.float64)
+                column[rowmask] = values
+
+        if decode_workers > 1:
+            pool = ThreadPool(decode_workers)
+            try:
+                for result in [pool.apply_async(_decode, bucket) for bucket in buckets]:
+                    result.get()
+            finally:
+                pool.terminate()
+        else:
+            for bucket in buckets:
+                _decode(*bucket)
+        return rtn
+
+    def _read_bucket(self, doc, column_set, column_dtypes, include_symbol, include_images, columns, ms_range=None):
+        """
+        ms_range: an inclusive (start, end) range of epoch milliseconds, either of which may be None. Only the
+            rows of the bucket which can fall in it are unpacked, the read still trims the result to its date_range.
+        """
         rtn = {}
         if doc[VERSION] != 3:
             raise ArcticException("Unhandled document version: %s" % doc[VERSION])
         # np.cumsum copies the read-only array created with frombuffer
         rtn[INDEX] = np.cumsum(np.frombuffer(lz4_decompress(doc[INDEX]), dtype='uint64'))
         doc_length = len(rtn[INDEX])
+        lo, hi = self._rows_in_range(rtn[INDEX], ms_range)
         column_set.update(doc[COLUMNS].keys())
 
         # get the mask for the columns we're about to load
-        union_mask = np.zeros((doc_length + 7) // 8, dtype='uint8')
+        union_mask = self._empty_rowmask(doc, doc_length)
         for c in column_set:
             try:
                 coldata = doc[COLUMNS][c]
@@ -466,10 +653,10 @@ class TickStore(object):
                 union_mask = union_mask | mask
             except KeyError:
                 rtn[c] = None
-        union_mask = np.unpackbits(union_mask)[:doc_length].astype('bool')
+        union_mask = np.unpackbits(union_mask)[:doc_length][lo:hi].astype('bool')
         rtn_length = np.sum(union_mask)
 
-        rtn[INDEX] = rtn[INDEX][union_mask]
+        rtn[INDEX] = rtn[INDEX][lo:hi][union_mask]
         if include_symbol:
             rtn['SYMBOL'] = [doc[SYMBOL], ] * rtn_length
 
@@ -486,6 +673,7 @@ class TickStore(object):
                 # unpackbits will make a copy of the read-only array created by frombuffer
                 rowmask = np.unpackbits(np.frombuffer(lz4_decompress(coldata[ROWMASK]),
                                         dtype='uint8'))[:doc_length].astype('bool')
+                values, rowmask = self._column_rows(values, rowmask, lo, hi)
                 rowmask = rowmask[union_mask]
                 rtn[c][rowmask] = values
             except KeyError:
@@ -495,6 +683,48 @@ class TickStore(object):
             rtn = self._prepend_image(rtn, doc[IMAGE_DOC], rtn_length, column_dtypes, column_set, columns)
         return rtn
 
+    @staticmethod
+    def _empty_rowmask(doc, doc_length):
+        """
+        The (packed) mask of the rows of the bucket without any value, which are only fetched by reads of all
+        the columns.
+        """
+        if EMPTY_ROWMASK in doc:
+            # the copy is writable, unlike the array created by frombuffer
+            return np.frombuffer(lz4_decompress(doc[EMPTY_ROWMASK]), dtype='uint8').copy()
+        return np.zeros((doc_length + 7) // 8, dtype='uint8')
+
+    @staticmethod
+    def _rows_in_range(index, ms_range):
+        """
+        The [lo, hi) rows of a bucket's (cumulative) index which can fall in ms_range. Only buckets whose ticks
+        are in order are trimmed.
+        """
+        lo, hi = 0, len(index)
+        if ms_range is None or not hi:
+            return lo, hi
+        start, end = ms_range
+        if (start is None or index[0] >= start) and (end is None or index[-1] <= end):
+            return lo, hi
+        if (index[1:] < index[:-1]).any():
+            return lo, hi
+        if start is not None and start > 0:
+            lo = int(np.searchsorted(index, np.uint64(start), side='left'))
+        if end is not None:
+            hi = int(np.searchsorted(index, np.uint64(end), side='right')) if end >= 0 else 0
+        return lo, max(lo, hi)
+
+    @staticmethod
+    def _column_rows(values, rowmask, lo, hi):
+        """
+        The values and row mask of a column restricted to the rows [lo, hi) of its bucket
+        """
+        if lo == 0 and hi == len(rowmask):
+            return values, rowmask
+        first = np.count_nonzero(rowmask[:lo])
+        rowmask = rowmask[lo:hi]
+        return values[first:first + np.count_nonzero(rowmask)], rowmask
+
     def _empty(self, length, dtype):
         if dtype is not None and dtype == np.float64:
             rtn = np.empty(length, dtype)
@@ -702,13 +932,29 @@ class TickStore(object):
         rtn[END] = end
         rtn[START] = start
 
-        logger.warning("NB treating all values as 'exists' - no longer sparse")
-        rowmask = Binary(lz4_compressHC(np.packbits(np.ones(len(df), dtype='uint8')).tostring()))
-
         index_name = df.index.names[0] or "index"
         recs = df.to_records(convert_datetime64=False)
-        for col in df:
-            array = TickStore._ensure_supported_dtypes(recs[col])
+        # Only the values which aren't NaN / None are stored, as with ticks written as dicts
+        present = pd.notnull(df).values
+        empty_rows = ~present.any(axis=1)
+        if empty_rows.any():
+            # No column holds the rows without any value, so they are kept in a mask of their own
+            rtn[EMPTY_ROWMASK] = Binary(lz4_compressHC(np.packbits(empty_rows).tostring()))
+        dense_rowmask = None
+        for i, col in enumerate(df.columns):
+            array = recs[col]
+            mask = present[:, i]
+            if not mask.any():
+                # As for a field none of the ticks have: there is nothing to store (or to infer a dtype from)
+                continue
+            if mask.all():
+                if dense_rowmask is None:
+                    dense_rowmask = Binary(lz4_compressHC(np.packbits(mask).tostring()))
+                rowmask = dense_rowmask
+            else:
+                array = array[mask]
+                rowmask = Binary(lz4_compressHC(np.packbits(mask).tostring()))
+            array = TickStore._ensure_supported_dtypes(array)
             col_data = {
                 DATA: Binary(lz4_compressHC(array.tostring())),
                 ROWMASK: rowmask,
@@ -722,42 +968,55 @@ class TickStore(object):
                      recs[index_name].astype('datetime64[ms]').view('uint64')))).tostring()))
         return rtn, final_image
 
+    @staticmethod
+    def _ticks_to_ms(dates):
+        """
+        _to_ms of each of the dates, as an int64 array
+        """
+        if all(isinstance(d, dt) and d.tzinfo is not None for d in dates):
+            try:
+                # Converts to UTC in one pass, truncating to the millisecond as datetime_to_ms does
+                return pd.to_datetime(dates, utc=True).asi8 // 1000000
+            except (ValueError, OverflowError):
+                # e.g. out of the range of datetime64[ns]
+                pass
+        return np.array([TickStore._to_ms(d) for d in dates], dtype='int64')
+
     @staticmethod
     def _to_bucket(ticks, symbol, initial_image):
+        """
+        Convert a list of tick dicts to a bucket a column at a time: the values of each field are gathered with one
+        pass over the ticks and its row mask is only computed when some ticks lack it.
+        """
         rtn = {SYMBOL: symbol, VERSION: CHUNK_VERSION_NUMBER, COLUMNS: {}, COUNT: len(ticks)}
-        data = {}
-        rowmask = {}
         start = to_dt(ticks[0]['index'])
         end = to_dt(ticks[-1]['index'])
+        # The fields in the order they first appear in
+        fields = dict.fromkeys(itertools.chain.from_iterable(ticks))
+
+        index = TickStore._ticks_to_ms([t['index'] for t in ticks])
+        unordered = np.flatnonzero(index[1:] < index[:-1])
+        if len(unordered):
+            raise UnorderedDataException("Timestamps out-of-order: %s > %s" % (
+                ms_to_datetime(int(index[unordered[0]])), ticks[unordered[0] + 1]))
+
         final_image = copy.copy(initial_image) if initial_image else {}
-        for i, t in enumerate(ticks):
+        for k in fields:
+            if k == 'index':
+                if initial_image:
+                    final_image[k] = ticks[-1][k]
+                continue
+            v = [t[k] for t in ticks if k in t]
             if initial_image:
-                final_image.update(t)
-            for k, v in iteritems(t):
-                try:
-                    if k != 'index':
-                        rowmask[k][i] = 1
-                    else:
-                        v = TickStore._to_ms(v)
-                        if data[k][-1] > v:
-                            raise UnorderedDataException("Timestamps out-of-order: %s > %s" % (
-                                ms_to_datetime(data[k][-1]), t))
-                    data[k].append(v)
-                except KeyError:
-                    if k != 'index':
-                        rowmask[k] = np.zeros(len(ticks), dtype='uint8')
-                        rowmask[k][i] = 1
-                    data[k] = [v]
-
-        rowmask = dict([(k, Binary(lz4_compressHC(np.packbits(v).tostring())))
-                        for k, v in iteritems(rowmask)])
-        for k, v in iteritems(data):
-            if k != 'index':
-                v = np.array(v)
-                v = TickStore._ensure_supported_dtypes(v)
-                rtn[COLUMNS][k] = {DATA: Binary(lz4_compressHC(v.tostring())),
-                                   DTYPE: TickStore._str_dtype(v.dtype),
-                                   ROWMASK: rowmask[k]}
+                final_image[k] = v[-1]
+            if len(v) == len(ticks):
+                rowmask = np.ones(len(ticks), dtype='uint8')
+            else:
+                rowmask = np.fromiter((k in t for t in ticks), dtype='uint8', count=len(ticks))
+            v = TickStore._ensure_supported_dtypes(np.array(v))
+            rtn[COLUMNS][k] = {DATA: Binary(lz4_compressHC(v.tostring())),
+                               DTYPE: TickStore._str_dtype(v.dtype),
+                               ROWMASK: Binary(lz4_compressHC(np.packbits(rowmask).tostring()))}
 
         if initial_image:
             image_start = initial_image.get('index', start)
@@ -768,7 +1027,7 @@ class TickStore(object):
             rtn[IMAGE_DOC] = {IMAGE_TIME: image_start, IMAGE: initial_image}
         rtn[END] = end
         rtn[START] = start
-        rtn[INDEX] = Binary(lz4_compressHC(np.concatenate(([data['index'][0]], np.diff(data['index']))).tostring()))
+        rtn[INDEX] = Binary(lz4_compressHC(np.concatenate(([index[0]], np.diff(index))).tostring()))
         return rtn, final_image
 
     def max_date(self, symbol):
@@ -0,0 +1,106 @@
+"""
+Benchmark of TickStore._to_bucket, which converts a list of tick dicts to a bucket document, against the
+implementation which converted them a tick and field at a time. Also checks they create identical documents.
+
+    python benchmarks/tickstore/benchmark_to_bucket.py
+"""
+from __future__ import print_function
+
+import copy
+import random
+import timeit
+from datetime import datetime as dt, timedelta
+
+import bson
+import numpy as np
+from bson.binary import Binary
+from six import iteritems
+
+from arctic.date import mktz, ms_to_datetime, to_dt
+from arctic.exceptions import UnorderedDataException
+from arctic.tickstore.tickstore import TickStore, SYMBOL, VERSION, CHUNK_VERSION_NUMBER, COLUMNS, COUNT, DATA, \
+    DTYPE, ROWMASK, IMAGE_DOC, IMAGE_TIME, IMAGE, START, END, INDEX, lz4_compressHC
+
+
+def legacy_to_bucket(ticks, symbol, initial_image):
+    """
+    TickStore._to_bucket as it was before it was vectorized, a tick and field at a time
+    """
+    rtn = {SYMBOL: symbol, VERSION: CHUNK_VERSION_NUMBER, COLUMNS: {}, COUNT: len(ticks)}
+    data = {}
+    rowmask = {}
+    start = to_dt(ticks[0]['index'])
+    end = to_dt(ticks[-1]['index'])
+    final_image = copy.copy(initial_image) if initial_image else {}
+    for i, t in enumerate(ticks):
+        if initial_image:
+            final_image.update(t)
+        for k, v in iteritems(t):
+            try:
+                if k != 'index':
+                    rowmask[k][i] = 1
+                else:
+                    v = TickStore._to_ms(v)
+                    if data[k][-1] > v:
+                        raise UnorderedDataException("Timestamps out-of-order: %s > %s" % (
+                            ms_to_datetime(data[k][-1]), t))
+                data[k].append(v)
+            except KeyError:
+                if k != 'index':
+                    rowmask[k] = np.zeros(len(ticks), dtype='uint8')
+                    rowmask[k][i] = 1
+                data[k] = [v]
+
+    rowmask = dict([(k, Binary(lz4_compressHC(np.packbits(v).tostring())))
+                    for k, v in iteritems(rowmask)])
+    for k, v in iteritems(data):
+        if k != 'index':
+            v = np.array(v)
+            v = TickStore._ensure_supported_dtypes(v)
+            rtn[COLUMNS][k] = {DATA: Binary(lz4_compressHC(v.tostring())),
+                               DTYPE: TickStore._str_dtype(v.dtype),
+                               ROWMASK: rowmask[k]}
+
+    if initial_image:
+        image_start = initial_image.get('index', start)
+        if image_start > start:
+            raise UnorderedDataException("Image timestamp is after first tick: %s > %s" % (
+                image_start, start))
+        start = min(start, image_start)
+        rtn[IMAGE_DOC] = {IMAGE_TIME: image_start, IMAGE: initial_image}
+    rtn[END] = end
+    rtn[START] = start
+    rtn[INDEX] = Binary(lz4_compressHC(np.concatenate(([data['index'][0]], np.diff(data['index']))).tostring()))
+    return rtn, final_image
+
+
+def get_ticks(n, density):
+    """
+    n ticks of 10 fields, each of which is set in a tick with probability density
+    """
+    start = dt(2019, 1, 1, tzinfo=mktz('UTC'))
+    fields = [('BID%d' % i, random.random) for i in range(4)] + \
+             [('SIZE%d' % i, lambda: random.randint(0, 1000)) for i in range(4)] + \
+             [('FLAG%d' % i, lambda: random.choice(['A', 'B', 'XYZ'])) for i in range(2)]
+    ticks = []
+    for i in range(n):
+        tick = {'index': start + timedelta(milliseconds=i)}
+        tick.update((k, f()) for k, f in fields if random.random() < density)
+        ticks.append(tick)
+    return ticks
+
+
+def main(n=100000, repeats=3):
+    for density in (1., 0.3):
+        ticks = get_ticks(n, density)
+        image = {'index': ticks[0]['index'], 'BID0': 1.}
+        assert bson.BSON.encode(legacy_to_bucket(ticks, 'SYM', image)[0]) == \
+            bson.BSON.encode(TickStore._to_bucket(ticks, 'SYM', image)[0])
+        legacy = min(timeit.repeat(lambda: legacy_to_bucket(ticks, 'SYM', image), number=1, repeat=repeats))
+        columnar = min(timeit.repeat(lambda: TickStore._to_bucket(ticks, 'SYM', image), number=1, repeat=repeats))
+        print("%d ticks, density %.1f: legacy %.3fs (%d ticks/s), columnar %.3fs (%d ticks/s), %.1fx" % (
+              n, density, legacy, n / legacy, columnar, n / columnar, legacy / columnar))
+
+
+if __name__ == '__main__':
+    main()
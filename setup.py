@@ -103,6 +103,8 @@ setup(
                                         'arctic_create_user = arctic.scripts.arctic_create_user:main',
                                         'arctic_prune_versions = arctic.scripts.arctic_prune_versions:main',
                                         'arctic_fsck = arctic.scripts.arctic_fsck:main',
+                                        'arctic_rebuild_symbol_catalogue = arctic.scripts.arctic_rebuild_symbol_catalogue:main',
+                                        'arctic_compact_symbols = arctic.scripts.arctic_compact_symbols:main',
                                         ]
                   },
     classifiers=[
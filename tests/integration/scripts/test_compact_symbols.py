@@ -0,0 +1,29 @@
+import numpy as np
+from mock import patch
+
+from arctic.scripts import arctic_compact_symbols as mcs
+from ...util import run_as_main
+
+
+def test_compact_symbols(mongo_host, library, library_name):
+    with patch('arctic.scripts.arctic_compact_symbols.do_db_auth', return_value=True):
+        arr = np.arange(1000000, dtype='float64')
+        library.write('appended', arr[:500000])
+        for i in range(500000, 1000000, 10000):
+            library.append('appended', arr[i:i + 10000])
+        library.write('written', arr)
+        segments = library._versions.find_one({'symbol': 'written'})['segment_count']
+
+        run_as_main(mcs.main, '--host', mongo_host, '--library', library_name)
+
+        assert library.read('appended').version == 52
+        assert library.read('written').version == 1
+        assert library._versions.find_one({'symbol': 'appended', 'version': 52})['segment_count'] == segments
+        assert np.all(library.read('appended').data == arr)
+
+
+def test_compact_symbols_reports_errors(library):
+    library.write('sym', np.arange(10))
+    results = mcs.compact_symbols(library, ['sym', 'missing'], workers=2)
+    assert results['sym'] == (1, 1)
+    assert isinstance(results['missing'], Exception)
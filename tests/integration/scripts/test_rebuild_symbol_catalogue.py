@@ -0,0 +1,23 @@
+from mock import patch
+
+from arctic.scripts import arctic_rebuild_symbol_catalogue as mrc
+from ...util import run_as_main
+
+
+def test_rebuild_symbol_catalogue(mongo_host, library, library_name):
+    with patch('arctic.scripts.arctic_rebuild_symbol_catalogue.do_db_auth', return_value=True), \
+            patch('arctic.store.version_store.ARCTIC_SYMBOL_CATALOGUE_STATE_SECONDS', 0):
+        library.write('symbol', "val1")
+        library.write('symbol', "val2")
+        library.write('deleted', "val1")
+        library.snapshot('snap')
+        library.delete('deleted')
+        assert library._symbols.find_one() is None
+
+        run_as_main(mrc.main, '--host', mongo_host, '--library', library_name)
+
+        assert {x['symbol']: (x['version'], x['deleted']) for x in library._symbols.find()} == \
+            {'symbol': (2, False), 'deleted': (2, True)}
+        assert library.list_symbols() == ['symbol']
+        assert library.has_symbol('symbol')
+        assert not library.has_symbol('deleted')
@@ -8,6 +8,7 @@ from pymongo.server_type import SERVER_TYPE
 
 from arctic._config import FwPointersCfg, FW_POINTERS_REFS_KEY
 from arctic._util import mongo_count
+from arctic.exceptions import DataIntegrityException
 from arctic.store._ndarray_store import NdarrayStore
 from arctic.store.version_store import register_versioned_storage
 from tests.integration.store.test_version_store import _query, FwPointersCtx
@@ -94,6 +95,18 @@ def test_save_read_big_2darray(library, fw_pointers_cfg):
         assert np.all(ndarr == saved_arr)
 
 
+@pytest.mark.parametrize('fw_pointers_cfg', [FwPointersCfg.DISABLED, FwPointersCfg.HYBRID, FwPointersCfg.ENABLED])
+def test_save_read_parallel_fetch(library, fw_pointers_cfg):
+    with FwPointersCtx(fw_pointers_cfg):
+        with patch('arctic.store._ndarray_store._CHUNK_SIZE', 1000):
+            ndarr = np.random.rand(10000)
+            library.write('MYARR', ndarr[:9000])
+            library.append('MYARR', ndarr[9000:])
+        assert np.all(library.read('MYARR', fetch_parallelism=4).data == ndarr)
+        assert np.all(library.read('MYARR', fetch_parallelism=1000).data == ndarr)
+        assert np.all(library.read('MYARR', as_of=1, fetch_parallelism=4).data == ndarr[:9000])
+
+
 def test_get_info_bson_object(library):
     ndarr = np.ones(1000)
     library.write('MYARR', ndarr)
@@ -157,6 +170,35 @@ def test_mutable_ndarray(library):
     assert saved_arr.flags['WRITEABLE']
 
 
+def test_read_detects_segment_size_mismatch(library):
+    with patch('arctic.store._ndarray_store._CHUNK_SIZE', 1000):
+        library.write('MYARR', np.arange(1024, dtype='float64'))
+    # Simulate a version document whose row count doesn't agree with its segments
+    library._versions.update_one({'symbol': 'MYARR'}, {'$inc': {'up_to': 1}})
+    with pytest.raises(DataIntegrityException):
+        library.read('MYARR')
+
+
+@pytest.mark.parametrize('fw_pointers_cfg', [FwPointersCfg.DISABLED, FwPointersCfg.HYBRID, FwPointersCfg.ENABLED])
+def test_write_in_batches_produces_identical_segments(library, fw_pointers_cfg):
+    def _segments():
+        return sorted(((x['segment'], x['sha'], x['data']) for x in library._collection.find({'symbol': 'MYARR'})))
+
+    with FwPointersCtx(fw_pointers_cfg):
+        ndarr = np.arange(100000, dtype='float64')
+        with patch('arctic.store._ndarray_store._CHUNK_SIZE', 10000):
+            library.write('MYARR', ndarr)
+            expected_segments = _segments()
+            expected_index = library._versions.find_one({'symbol': 'MYARR'}).get('segment_index')
+            library.delete('MYARR')
+            assert not _segments()
+            with patch('arctic.store._ndarray_store.ARCTIC_WRITE_INFLIGHT_BYTES', 25000):
+                library.write('MYARR', ndarr)
+        assert _segments() == expected_segments
+        assert library._versions.find_one({'symbol': 'MYARR'}).get('segment_index') == expected_index
+        assert np.all(library.read('MYARR').data == ndarr)
+
+
 @pytest.mark.xfail(reason="delete_version not safe with append...")
 def test_delete_version_shouldnt_break_read(library):
     data = np.arange(30)
@@ -5,6 +5,7 @@ import pytest
 from numpy.testing import assert_equal
 
 from arctic._util import FwPointersCfg
+from arctic.store._append_verifier import append_verifier, append_stats
 from arctic.store._ndarray_store import NdarrayStore, _APPEND_COUNT
 from arctic.store.version_store import register_versioned_storage
 from tests.integration.store.test_version_store import FwPointersCtx
@@ -328,3 +329,43 @@ def test_append_reorder_columns(library):
     library.append('MYARR', foo)
 
     assert np.all(library.read('MYARR').data == np.array([(2, 1), (1, 2)], dtype=[('b', 'u1'), ('a', 'u1')]))
+
+
+@pytest.mark.parametrize('fw_pointers_cfg', [FwPointersCfg.DISABLED, FwPointersCfg.HYBRID, FwPointersCfg.ENABLED])
+def test_fast_append(library, fw_pointers_cfg):
+    with FwPointersCtx(fw_pointers_cfg):
+        append_verifier.reset()
+        ndarr = np.arange(500, dtype='int64')
+        library.write('MYARR', ndarr[:10])
+        for i in range(10, 500, 10):
+            library.append('MYARR', ndarr[i:i + 10], fast_append=True)
+        append_verifier.join()
+
+        # Every append added a segment, none were rewritten
+        assert library._versions.find_one({'symbol': 'MYARR'}, sort=[('version', -1)])['segment_count'] == 50
+        assert np.all(ndarr == library.read('MYARR').data)
+        assert append_stats() == {'fast': 49, 'slow': {}, 'verified': 49, 'failed': 0, 'pending': 0}
+
+        # Changing the dtype rewrites the symbol
+        library.append('MYARR', np.arange(10, dtype='float64'), fast_append=True)
+        assert append_stats()['slow'] == {'dtype': 1}
+        assert np.all(np.concatenate([ndarr, np.arange(10)]) == library.read('MYARR').data)
+
+
+@pytest.mark.parametrize('fw_pointers_cfg', [FwPointersCfg.DISABLED, FwPointersCfg.HYBRID, FwPointersCfg.ENABLED])
+def test_fast_append_rewrites_appended_segments(library, fw_pointers_cfg):
+    with FwPointersCtx(fw_pointers_cfg):
+        append_verifier.reset()
+        ndarr = np.arange(10 * (_APPEND_COUNT + 2), dtype='int64')
+        library.write('MYARR', ndarr[:10])
+        for i in range(10, len(ndarr), 10):
+            library.append('MYARR', ndarr[i:i + 10], fast_append=True)
+        append_verifier.join()
+
+        # The _APPEND_COUNT-th append rewrote the appended segments, the next one appended a segment again
+        version = library._versions.find_one({'symbol': 'MYARR'}, sort=[('version', -1)])
+        assert version['append_count'] == 1
+        assert version['segment_count'] < _APPEND_COUNT
+        assert np.all(ndarr == library.read('MYARR').data)
+        assert append_stats() == {'fast': _APPEND_COUNT, 'slow': {'threshold': 1}, 'verified': _APPEND_COUNT,
+                                  'failed': 0, 'pending': 0}
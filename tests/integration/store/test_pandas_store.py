@@ -13,8 +13,10 @@ from pandas.tseries.offsets import DateOffset
 from pandas.util.testing import assert_frame_equal, assert_series_equal
 from six import StringIO
 
+from arctic import VERSION_STORE
 from arctic._compression import decompress
 from arctic.date import DateRange, mktz
+from arctic.store._ndarray_store import NdarrayStore
 # Do not remove PandasStore, used in global scope
 from arctic.store._pandas_ndarray_store import PandasDataFrameStore, PandasSeriesStore, PandasStore
 from arctic.store.version_store import register_versioned_storage
@@ -1160,3 +1162,128 @@ def test_forced_encodings_with_df_py3_multi_index(library):
         type(df_forced_unicode.index.get_level_values(level)[0]) == unicode_type
         for level in range(len(df_forced_unicode.index.levels))
     ])
+
+
+@pytest.fixture(scope="function")
+def columnar_library(arctic):
+    arctic.initialize_library('columnar_test', VERSION_STORE, columnar_layout=True)
+    return arctic['columnar_test']
+
+
+def _wide_df(n=100000):
+    index = date_range('2000-01-01', periods=n, freq='S', name='date')
+    df = DataFrame({'c%d' % i: np.random.randn(n) for i in range(50)}, index=index)
+    df['i'] = np.arange(n)
+    return df
+
+
+def test_columnar_layout_roundtrip(columnar_library):
+    df = _wide_df()
+    columnar_library.write('wide', df)
+    segment = columnar_library._collection.find_one({'symbol': 'wide'})
+    assert segment['layout'] == 'columnar'
+    assert 'data' not in segment
+    assert_frame_equal(df, columnar_library.read('wide').data)
+
+
+def test_columnar_layout_read_columns(columnar_library):
+    df = _wide_df()
+    columnar_library.write('wide', df)
+    assert_frame_equal(df[['c7', 'i']], columnar_library.read('wide', columns=['c7', 'i']).data)
+
+
+def test_columnar_layout_read_columns_and_date_range(columnar_library):
+    df = _wide_df()
+    columnar_library.write('wide', df)
+    dr = DateRange(dt(2000, 1, 1, 10), dt(2000, 1, 1, 12))
+    assert_frame_equal(df[['c3']].loc[dr.start:dr.end],
+                       columnar_library.read('wide', columns=['c3'], date_range=dr).data)
+
+
+def test_columnar_layout_append(columnar_library):
+    df = _wide_df()
+    columnar_library.write('wide', df)
+    appended = [df.iloc[-10:].shift(i + 1, freq='D') for i in range(100)]
+    for item in appended:
+        columnar_library.append('wide', item)
+    expected = concat([df] + appended)
+    assert_frame_equal(expected, columnar_library.read('wide').data)
+    assert_frame_equal(expected[['c1', 'c0']], columnar_library.read('wide', columns=['c1', 'c0']).data)
+
+
+def test_columnar_layout_read_multi_column(columnar_library):
+    df = DataFrame(np.random.randn(10, 4), index=date_range('2000-01-01', periods=10, name='date'),
+                   columns=MultiIndex.from_tuples([('a', 'x'), ('a', 'y'), ('b', 'x'), ('b', 'y')], names=['l1', 'l2']))
+    columnar_library.write('multi', df)
+    assert_frame_equal(df[[('b', 'x')]], columnar_library.read('multi', columns=[('b', 'x')]).data)
+
+
+def test_read_columns_of_row_major_version(library):
+    df = _wide_df(1000)
+    library.write('wide', df)
+    assert 'layout' not in library._versions.find_one({'symbol': 'wide'})
+    assert_frame_equal(df[['c2']], library.read('wide', columns=['c2']).data)
+
+
+def test_read_unknown_column(library):
+    library.write('wide', _wide_df(10))
+    with pytest.raises(KeyError):
+        library.read('wide', columns=['nope'])
+
+
+@pytest.fixture(scope="function")
+def zone_map_library(arctic):
+    arctic.initialize_library('zone_map_test', VERSION_STORE, zone_maps=['price'])
+    return arctic['zone_map_test']
+
+
+def test_read_where_with_zone_map(zone_map_library):
+    df = DataFrame({'price': np.arange(100000, dtype='float64'), 'size': np.arange(100000)},
+                   index=date_range('2000-01-01', periods=100000, freq='S', name='date'))
+    zone_map_library.write('prices', df)
+    assert zone_map_library._versions.find_one({'symbol': 'prices'})['zone_map']['fields'] == ['price']
+    with patch('arctic.store._ndarray_store.NdarrayStore._do_read', autospec=True,
+               side_effect=NdarrayStore._do_read) as do_read:
+        result = zone_map_library.read('prices', where=('price', '>', 99990)).data
+    assert_frame_equal(df[df.price > 99990], result)
+    # Only the last segment was read
+    assert do_read.call_args[1]['index_range'][0] > 0
+
+
+def test_read_where_after_append(zone_map_library):
+    df = DataFrame({'price': np.arange(1000, dtype='float64')},
+                   index=date_range('2000-01-01', periods=1000, name='date'))
+    zone_map_library.write('prices', df.iloc[:500])
+    zone_map_library.append('prices', df.iloc[500:])
+    assert_frame_equal(df[(df.price >= 450) & (df.price < 550)],
+                       zone_map_library.read('prices', where=[('price', '>=', 450), ('price', '<', 550)]).data)
+
+
+def test_read_where_without_zone_map(library):
+    df = DataFrame({'price': np.arange(1000, dtype='float64'), 'size': np.arange(1000) % 7},
+                   index=date_range('2000-01-01', periods=1000, name='date'))
+    library.write('prices', df)
+    assert_frame_equal(df[df['size'] == 3][['price']],
+                       library.read('prices', columns=['price'], where=('size', '==', 3)).data)
+
+
+def test_iter_read(library):
+    df = DataFrame({'price': np.arange(300000, dtype='float64'), 'size': np.arange(300000)},
+                   index=date_range('2000-01-01', periods=300000, freq='S', name='date'))
+    library.write('prices', df.iloc[:200000])
+    library.append('prices', df.iloc[200000:])
+    batches = list(library.iter_read('prices', rows_per_batch=100000))
+    assert len(batches) > 2
+    assert max(len(b) for b in batches) < 200000
+    assert_frame_equal(df, concat(batches))
+
+    dr = DateRange(dt(2000, 1, 1, 10), dt(2000, 1, 2, 10))
+    assert_frame_equal(library.read('prices', date_range=dr, columns=['size']).data,
+                       concat(library.iter_read('prices', date_range=dr, columns=['size'], rows_per_batch=10000)))
+    assert list(library.iter_read('prices', date_range=DateRange(dt(2001, 1, 1), None))) == []
+
+
+def test_iter_read_series(library):
+    s = Series(np.arange(100000, dtype='float64'), index=date_range('2000-01-01', periods=100000, freq='S'))
+    library.write('series', s)
+    assert_series_equal(library.read('series').data, concat(library.iter_read('series', rows_per_batch=10000)))
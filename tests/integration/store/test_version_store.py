@@ -24,6 +24,7 @@ from arctic.date._mktz import mktz
 from arctic.exceptions import NoDataFoundException, DuplicateSnapshotException, ArcticException
 from arctic.store import _version_store_utils
 from arctic.store import version_store
+from arctic.store._version_cache import VersionCache
 from tests.unit.serialization.serialization_test_data import _mixed_test_data
 from ...util import read_str_as_pandas
 
@@ -1684,6 +1685,24 @@ def test_handler_check_set_true(arctic):
     assert arctic[lib_name]._with_strict_handler_match is True
 
 
+@pytest.mark.parametrize('codec', ['shuffle_lz4', 'lz4'])
+def test_compression_codec(arctic, codec):
+    lib_name = 'codec_test_' + codec
+    arctic.initialize_library(lib_name, VERSION_STORE, compression_codec=codec)
+    library = arctic[lib_name]
+    df = pd.DataFrame({'a': np.arange(100000, dtype='float64')})
+    library.write('sym', df)
+    library.append('sym', df)
+    assert_frame_equal(pd.concat([df, df], ignore_index=True), library.read('sym').data)
+    segment = library._collection.find_one({'symbol': 'sym', 'compressed': True})
+    assert segment.get('codec', 'lz4') == codec
+
+
+def test_compression_codec_unknown(arctic):
+    with pytest.raises(ValueError):
+        arctic.initialize_library('codec_test_unknown', VERSION_STORE, compression_codec='snappy')
+
+
 def test_write_df_with_objects_in_index(library):
     df = _mixed_test_data()['multiindex_with_object'][0]
     library.write(symbol='symX', data=df)
@@ -1944,3 +1963,188 @@ def test_prune_crossref_fwpointer_configs(library, first_write_cfg, second_write
     library.delete(symbol)
     assert mongo_count(library._versions, {'symbol': symbol}) == 0
     assert mongo_count(library._collection, {'symbol': symbol}) == 0
+
+
+def test_read_batch(library):
+    dfs = {'sym%d' % i: pd.DataFrame({'a': np.arange(1000.) + i},
+                                     index=pd.date_range('2000-01-01', periods=1000, freq='H', name='date'))
+           for i in range(5)}
+    for symbol, df in dfs.items():
+        library.write(symbol, df)
+    library.append('sym1', dfs['sym1'].shift(1000, freq='H'))
+    library.write('pickled', {'a': 1})
+
+    res = library.read_batch(list(dfs) + ['pickled', 'missing'])
+    for symbol in ('sym0', 'sym2', 'sym3', 'sym4'):
+        assert_frame_equal(dfs[symbol], res[symbol].data)
+    assert_frame_equal(pd.concat([dfs['sym1'], dfs['sym1'].shift(1000, freq='H')]), res['sym1'].data)
+    assert res['sym1'].version == 2
+    assert res['pickled'].data == {'a': 1}
+    assert isinstance(res['missing'], NoDataFoundException)
+
+
+def test_read_batch_as_of_and_date_range(library):
+    df = pd.DataFrame({'a': np.arange(1000.)}, index=pd.date_range('2000-01-01', periods=1000, freq='H', name='date'))
+    library.write('sym', df)
+    library.write('sym', df * 2)
+    dr = DateRange('2000-01-10', '2000-01-12')
+    res = library.read_batch(['sym'], as_of=1, date_range=dr)
+    assert_frame_equal(df.loc[dr.start:dr.end], res['sym'].data)
+    assert res['sym'].version == 1
+
+
+def test_write_batch(library):
+    dfs = {'sym%d' % i: pd.DataFrame({'a': np.arange(1000.) + i},
+                                     index=pd.date_range('2000-01-01', periods=1000, freq='H', name='date'))
+           for i in range(5)}
+    library.write('sym0', dfs['sym0'] * 2)
+
+    res = library.write_batch(dict(dfs, pickled={'a': 1}), metadata={'source': 'batch'})
+
+    assert res['sym0'].version == 2
+    assert res['sym1'].version == 1
+    for symbol, df in dfs.items():
+        item = library.read(symbol)
+        assert_frame_equal(df, item.data)
+        assert item.metadata == {'source': 'batch'}
+    assert library.read('pickled').data == {'a': 1}
+    assert_frame_equal(dfs['sym0'] * 2, library.read('sym0', as_of=1).data)
+
+
+def test_prune_previous_versions_batch(library):
+    df = pd.DataFrame({'a': np.arange(1000.)}, index=pd.date_range('2000-01-01', periods=1000, freq='H', name='date'))
+    for symbol in ('a', 'b'):
+        library.write(symbol, df)
+    library.write_batch({'a': df * 2, 'b': df * 3})
+    library.snapshot('snap', versions={'b': 1})
+
+    library._prune_previous_versions_batch({'a': None, 'b': None}, keep_mins=0)
+
+    assert [v['version'] for v in library.list_versions('a')] == [2]
+    assert [v['version'] for v in library.list_versions('b')] == [2, 1]
+    assert_frame_equal(df * 2, library.read('a').data)
+    assert_frame_equal(df, library.read('b', as_of='snap').data)
+
+
+@pytest.fixture(scope="function")
+def catalogue_library(arctic):
+    arctic.initialize_library('catalogue_test', VERSION_STORE, symbol_catalogue=True)
+    return arctic['catalogue_test']
+
+
+def test_symbol_catalogue(catalogue_library):
+    catalogue_library.write('a', {'foo': 'bar'})
+    catalogue_library.write('b', {'foo': 'bar'})
+    catalogue_library.write('b', {'foo': 'baz'})
+    catalogue_library.write_batch({'c': {'foo': 'bar'}, 'a': {'foo': 'baz'}})
+    catalogue_library.write('d', {'foo': 'bar'})
+    catalogue_library.snapshot('snap')
+    catalogue_library.delete('d')
+
+    with patch.object(catalogue_library._versions, 'aggregate') as aggregate:
+        assert catalogue_library.list_symbols() == ['a', 'b', 'c']
+        assert catalogue_library.list_symbols(regex='^[ab]') == ['a', 'b']
+        assert sorted(catalogue_library.list_symbols(all_symbols=True)) == ['a', 'b', 'c', 'd']
+        assert catalogue_library.has_symbol('a')
+        assert not catalogue_library.has_symbol('d')
+    assert not aggregate.called
+    assert catalogue_library.has_symbol('d', as_of='snap')
+    assert {x['symbol']: (x['version'], x['deleted']) for x in catalogue_library._symbols.find()} == \
+        {'a': (2, False), 'b': (2, False), 'c': (1, False), 'd': (2, True)}
+
+
+def test_symbol_catalogue_delete_version(catalogue_library):
+    catalogue_library.write('a', {'foo': 'bar'})
+    catalogue_library.delete('a')
+    assert catalogue_library._symbols.find_one({'symbol': 'a'}) is None
+    v1 = catalogue_library.write('a', {'foo': 'bar'}, prune_previous_version=False).version
+    v2 = catalogue_library.write('a', {'foo': 'baz'}, prune_previous_version=False).version
+    assert catalogue_library._symbols.find_one({'symbol': 'a'})['version'] == v2
+    catalogue_library._delete_version('a', v2)
+    assert catalogue_library._symbols.find_one({'symbol': 'a'})['version'] == v1
+    assert catalogue_library.list_symbols() == ['a']
+
+
+def test_rebuild_symbol_catalogue(library):
+    library.write('a', {'foo': 'bar'})
+    library.write('b', {'foo': 'bar'})
+    library.delete('b')
+    with patch('arctic.store.version_store.ARCTIC_SYMBOL_CATALOGUE_STATE_SECONDS', 0):
+        library.rebuild_symbol_catalogue()
+    assert library._arctic_lib.get_library_metadata('SYMBOL_CATALOGUE') == 'ready'
+    assert library.list_symbols() == ['a']
+    library.write('c', {'foo': 'bar'})
+    assert library.list_symbols() == ['a', 'c']
+
+
+def test_rebuild_symbol_catalogue_other_writers(library):
+    # Another process, which had the library open before the catalogue was built
+    other = version_store.VersionStore(library._arctic_lib)
+    other.write('a', {'foo': 'bar'})
+    other.write('b', {'foo': 'bar'})
+    with patch('arctic.store.version_store.ARCTIC_SYMBOL_CATALOGUE_STATE_SECONDS', 0.1):
+        library.rebuild_symbol_catalogue()
+        other.write('c', {'foo': 'bar'})
+        other.delete('a')
+    with patch.object(library._versions, 'aggregate') as aggregate:
+        assert library.list_symbols() == ['b', 'c']
+        assert library.has_symbol('c')
+        assert not library.has_symbol('a')
+    assert not aggregate.called
+
+
+def test_version_cache(library):
+    library.write('sym', {'a': 1})
+    with patch('arctic.store.version_store.version_cache', VersionCache(max_age=60, max_entries=10)) as cache:
+        assert library.read('sym').data == {'a': 1}
+        assert library.read_metadata('sym').version == 1
+        assert cache.stats()['hits'] == 1
+        library.write('sym', {'a': 2}, metadata={'b': 1})
+        item = library.read('sym')
+        assert (item.data, item.version, item.metadata) == ({'a': 2}, 2, {'b': 1})
+        library.delete('sym')
+        assert not library.has_symbol('sym')
+
+
+def test_iter_read_unsupported(library):
+    library.write('pickled', {'a': 1})
+    with pytest.raises(ArcticException):
+        library.iter_read('pickled')
+    library.write('df', ts1)
+    library.delete('df')
+    with pytest.raises(NoDataFoundException):
+        library.iter_read('df')
+
+
+@pytest.mark.parametrize('fw_pointers_cfg', [FwPointersCfg.DISABLED, FwPointersCfg.HYBRID, FwPointersCfg.ENABLED])
+def test_compact(library, fw_pointers_cfg):
+    with FwPointersCtx(fw_pointers_cfg):
+        df = pd.DataFrame({'a': np.arange(200000, dtype='float64')},
+                          index=pd.date_range('2000-01-01', periods=200000, freq='S', name='date'))
+        library.write('sym', df.iloc[:150000], metadata={'a': 1})
+        for i in range(150000, 200000, 1000):
+            library.append('sym', df.iloc[i:i + 1000])
+        expected = library.read('sym')
+        before = library._versions.find_one({'symbol': 'sym'}, sort=[('version', -1)])
+
+        segments_before, segments_after = library.compact('sym')
+        assert segments_before == before['segment_count'] > segments_after
+
+        compacted = library.read('sym')
+        assert compacted.version == expected.version + 1
+        assert compacted.metadata == {'a': 1}
+        assert_frame_equal(expected.data, compacted.data)
+        assert_frame_equal(expected.data.iloc[-1500:],
+                           library.read('sym', date_range=DateRange(expected.data.index[-1500], None)).data)
+        assert library.compact('sym') == (segments_after, segments_after)
+
+        library.append('sym', df.iloc[-10:])
+        assert_frame_equal(pd.concat([df, df.iloc[-10:]]), library.read('sym').data)
+        assert_frame_equal(expected.data, library.read('sym', as_of=expected.version).data)
+
+
+def test_compact_unsupported(library):
+    library.write('pickled', {'a': 1})
+    assert library.compact('pickled') == (0, 0)
+    with pytest.raises(NoDataFoundException):
+        library.compact('missing')
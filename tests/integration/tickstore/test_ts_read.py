@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime as dt
+from multiprocessing.pool import ThreadPool
 
 import numpy as np
 import pandas as pd
@@ -14,6 +15,7 @@ from pymongo import ReadPreference
 from arctic._util import mongo_count
 from arctic.date import DateRange, mktz, CLOSED_CLOSED, CLOSED_OPEN, OPEN_CLOSED, OPEN_OPEN
 from arctic.exceptions import NoDataFoundException
+from arctic.tickstore.tickstore import TickStore
 
 
 def test_read(tickstore_lib):
@@ -563,6 +565,95 @@ def test_read_inside_range(tickstore_lib):
                                                                       dt(2013, 6, 1, 15, 0, tzinfo=mktz('UTC')))) == \
         {'s': {'$gte': dt(2013, 6, 1, 10, 0, tzinfo=mktz('UTC')), '$lte': dt(2013, 6, 1, 15, 0, tzinfo=mktz('UTC'))}}
 
+@pytest.mark.parametrize('columns', [None, ['a', 'c', 's']])
+def test_read_decode_workers(tickstore_lib, columns):
+    data = [{'a': float(i), 'index': dt(2013, 1, 1, 0, 0, i, tzinfo=mktz('UTC'))} for i in range(30)]
+    data[4]['c'] = 1
+    data[17]['s'] = 'x'
+    data[25]['c'] = 2.5
+    tickstore_lib._chunk_size = 3
+    tickstore_lib.write('SYM', data)
+    expected = tickstore_lib.read('SYM', columns=columns, decode_workers=1)
+    assert len(expected) == 30
+    with patch('arctic.tickstore.tickstore.ThreadPool', wraps=ThreadPool) as pool:
+        assert_frame_equal(tickstore_lib.read('SYM', columns=columns, decode_workers=4), expected)
+    pool.assert_called_once_with(4)
+
+
+@pytest.mark.parametrize('values', [(1.5, 'x', 2), ('x', 1.5, 2), ('x', 2, 1.5), (2, 'x', 1.5)])
+def test_read_decode_workers_mixed_dtypes(tickstore_lib, values):
+    data = [{'a': float(i), 'index': dt(2013, 1, 1, 0, 0, i, tzinfo=mktz('UTC'))} for i in range(9)]
+    # 'c' has a different dtype in each bucket
+    for i, v in zip((1, 4, 7), values):
+        data[i]['c'] = v
+    tickstore_lib._chunk_size = 3
+    tickstore_lib.write('SYM', data)
+    expected = tickstore_lib.read('SYM', decode_workers=1)
+    df = tickstore_lib.read('SYM', decode_workers=4)
+    assert_frame_equal(df, expected)
+    # assert_frame_equal doesn't tell None from NaN in object columns
+    assert [type(x) for x in df['c']] == [type(x) for x in expected['c']]
+
+
+@pytest.mark.parametrize('columns', [None, ['a', 'c', 's', 'x'], ['SYMBOL', 'c']])
+@pytest.mark.parametrize('decode_workers', [1, 2])
+def test_read_preallocate(tickstore_lib, columns, decode_workers):
+    data = [{'a': float(i), 'index': dt(2013, 1, 1, 0, 0, i, tzinfo=mktz('UTC'))} for i in range(30)]
+    data[4]['c'] = 1
+    data[17]['s'] = 'x'
+    data[25]['c'] = 2.5
+    tickstore_lib._chunk_size = 4
+    tickstore_lib.write('SYM1', data)
+    tickstore_lib.write('SYM2', pd.DataFrame({'a': [np.nan, 7.], 'c': [3, 4]},
+                                             index=[dt(2013, 1, 1, 0, 0, 2, 500000, tzinfo=mktz('UTC')),
+                                                    dt(2013, 1, 1, 0, 0, 3, 500000, tzinfo=mktz('UTC'))]))
+    for symbol in ('SYM1', ['SYM1', 'SYM2']):
+        expected = tickstore_lib.read(symbol, columns=columns, preallocate=False)
+        assert_frame_equal(tickstore_lib.read(symbol, columns=columns, preallocate=True,
+                                              decode_workers=decode_workers), expected)
+
+
+@pytest.mark.parametrize('decode_workers', [1, 2])
+def test_read_preallocate_dtypes(tickstore_lib, decode_workers):
+    data = [{'i': i, 'f': i + 0.5, 'index': dt(2013, 1, 1, 0, 0, i, tzinfo=mktz('UTC'))} for i in range(9)]
+    for i in range(1, 9, 2):
+        data[i]['s'] = 'x%d' % i
+    # Mixed columns: string then number, number then string
+    data[1]['m'], data[4]['m'], data[7]['m'] = 'a', 'b', 2.5
+    data[2]['n'], data[5]['n'] = 1, 'q'
+    tickstore_lib._chunk_size = 3
+    tickstore_lib.write('SYM', data)
+    for columns in (None, ['i', 'n'], ['m', 's']):
+        expected = tickstore_lib.read('SYM', columns=columns, preallocate=False)
+        df = tickstore_lib.read('SYM', columns=columns, preallocate=True, decode_workers=decode_workers)
+        assert_frame_equal(df, expected)
+        # assert_frame_equal doesn't tell None from NaN, or 1 from 1.0, in object columns
+        for c in df:
+            assert [type(x) for x in df[c]] == [type(x) for x in expected[c]]
+
+
+def test_read_preallocate_no_data(tickstore_lib):
+    with pytest.raises(NoDataFoundException):
+        tickstore_lib.read('SYM', preallocate=True)
+
+
+@pytest.mark.parametrize('preallocate', [False, True])
+def test_read_trims_buckets(tickstore_lib, preallocate):
+    data = [{'a': float(i), 'index': dt(2013, 1, 1, 0, 0, i, tzinfo=mktz('UTC'))} for i in range(30)]
+    data[4]['s'] = 'x'
+    data[12]['s'] = 'y'
+    tickstore_lib._chunk_size = 10
+    tickstore_lib.write('SYM', data)
+    full = tickstore_lib.read('SYM', preallocate=preallocate)
+    dr = DateRange(dt(2013, 1, 1, 0, 0, 3, 500000, tzinfo=mktz('UTC')), dt(2013, 1, 1, 0, 0, 12, tzinfo=mktz('UTC')))
+    with patch('arctic.tickstore.tickstore.TickStore._column_rows', wraps=TickStore._column_rows) as column_rows:
+        df = tickstore_lib.read('SYM', date_range=dr, preallocate=preallocate)
+    assert_frame_equal(df, full.loc[dr.start:dr.end])
+    assert list(df['s'].dropna()) == ['x', 'y']
+    # Only the rows of the first two buckets in range are unpacked
+    assert sorted(set((c[0][2], c[0][3]) for c in column_rows.call_args_list)) == [(0, 3), (4, 10)]
+
+
 def test_read_longs(tickstore_lib):
     DUMMY_DATA = [
                   {'a': 1,
@@ -1,5 +1,6 @@
 from datetime import datetime as dt
 
+import pandas as pd
 import pytest
 import pytz
 from pandas.util.testing import assert_frame_equal
@@ -76,6 +77,33 @@ def test_ts_write_pandas(tickstore_lib):
     assert_frame_equal(read, data, check_names=False)
 
 
+@pytest.mark.parametrize('preallocate', [False, True])
+def test_ts_write_pandas_empty_rows(tickstore_lib, preallocate):
+    # No float column to keep the rows without any value in
+    index = pd.date_range('2013-01-01', periods=4, tz=mktz('UTC'))
+    data = pd.DataFrame({'s': ['a', None, None, 'b'], 't': [None, None, 'c', None]}, index=index, columns=['s', 't'])
+    tickstore_lib.write('SYM', data)
+
+    read = tickstore_lib.read('SYM', preallocate=preallocate)
+    assert list(read.index) == list(index)
+    assert list(read['s']) == ['a', None, None, 'b']
+    assert list(read['t']) == [None, None, 'c', None]
+    # Reads of some of the columns only return the rows with a value in them
+    assert list(tickstore_lib.read('SYM', columns=['t'], preallocate=preallocate)['t']) == ['c']
+
+
+def test_ts_write_pandas_column_without_values(tickstore_lib):
+    index = pd.date_range('2013-01-01', periods=4, tz=mktz('UTC'))
+    data = pd.DataFrame({'a': [1., 2., 3., 4.], 's': ['x', 'y', None, None]}, index=index, columns=['a', 's'])
+    tickstore_lib._chunk_size = 2
+    # 's' has no value in the second bucket
+    tickstore_lib.write('SYM', data)
+    read = tickstore_lib.read('SYM')
+    assert list(read.index) == list(index)
+    assert list(read['a']) == [1., 2., 3., 4.]
+    assert list(read['s']) == ['x', 'y', None, None]
+
+
 def test_ts_write_named_col(tickstore_lib):
     data = DUMMY_DATA
     tickstore_lib.write('SYM', data)
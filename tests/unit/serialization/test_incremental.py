@@ -1,9 +1,12 @@
+import hashlib
 import itertools
 
+import numpy as np
 import pytest
+from mock import patch
 
 from arctic.exceptions import ArcticSerializationException
-from arctic.serialization.incremental import IncrementalPandasToRecArraySerializer
+from arctic.serialization.incremental import IncrementalPandasToRecArraySerializer, incremental_checksum
 from arctic.serialization.numpy_records import DataFrameSerializer
 from tests.unit.serialization.serialization_test_data import _mixed_test_data, is_test_data_serializable
 
@@ -27,6 +30,19 @@ def test_incremental_bad_init():
         IncrementalPandasToRecArraySerializer(df_serializer, _mixed_test_data()['small'][0], chunk_size=_CHUNK_SIZE, string_max_len=-1)
 
 
+@pytest.mark.parametrize('arr', [np.arange(100),
+                                 np.arange(100.)[::3],
+                                 np.asfortranarray(np.arange(60.).reshape(20, 3)),
+                                 np.arange(10).astype('datetime64[ns]')[::-1],
+                                 np.array([(1, 2.), (3, 4.)], dtype=[('a', 'i8'), ('b', 'f8')]),
+                                 np.zeros(0)])
+def test_incremental_checksum_matches_tostring(arr):
+    with patch('arctic.serialization.incremental._CHECKSUM_CHUNK_SIZE', 100):
+        assert incremental_checksum(arr).digest() == hashlib.sha1(arr.tostring()).digest()
+        sha = incremental_checksum(arr[:5])
+        assert incremental_checksum(arr[5:], curr_sha=sha).digest() == hashlib.sha1(arr.tostring()).digest()
+
+
 def test_none_df():
     with pytest.raises(ArcticSerializationException):
         incr_ser = IncrementalPandasToRecArraySerializer(df_serializer, None, chunk_size=_CHUNK_SIZE)
@@ -14,6 +14,15 @@ def test_frame_converter():
     assert_frame_equal(f.objify(f.docify(df)), df)
 
 
+def test_frame_converter_objify_many():
+    f = FrameConverter()
+    df1 = pd.DataFrame({'A': [1., np.nan, 3.], 'B': ['a', None, 'c']})
+    df2 = pd.DataFrame({'A': [4., 5.], 'B': ['d', 'e'], 'C': [1, 2]})
+    res = f.objify_many([f.docify(df1), f.docify(df2)], ['A', 'B'])
+    assert_frame_equal(res[0], df1)
+    assert_frame_equal(res[1], df2[['A', 'B']])
+
+
 def test_with_strings():
     f = FrameConverter()
     df = pd.DataFrame(data={'one': ['a', 'b', 'c']})
@@ -0,0 +1,39 @@
+from mock import create_autospec, sentinel
+from pymongo.collection import Collection
+
+from arctic.store._append_verifier import AppendVerifier
+
+
+def _collection(count, last_segment):
+    collection = create_autospec(Collection, full_name='arctic_test.library')
+    collection.count_documents.return_value = count
+    collection.count.return_value = count
+    collection.find_one.return_value = {'segment': last_segment}
+    return collection
+
+
+def test_append_verifier_verifies_appends():
+    verifier = AppendVerifier()
+    collection = _collection(3, 9)
+    verifier.submit(collection, 'sym', {'_id': sentinel.id, 'segment_count': 3, 'up_to': 10}, sentinel.spec)
+    verifier.join()
+    assert verifier.stats()['verified'] == 1
+    assert not verifier.needs_rewrite(collection, 'sym')
+
+
+def test_append_verifier_flags_missing_segments():
+    verifier = AppendVerifier()
+    collection = _collection(2, 9)
+    verifier.submit(collection, 'sym', {'_id': sentinel.id, 'segment_count': 3, 'up_to': 10}, sentinel.spec)
+    verifier.join()
+    assert verifier.stats()['failed'] == 1
+    assert verifier.needs_rewrite(collection, 'sym')
+    assert not verifier.needs_rewrite(collection, 'sym')
+
+
+def test_append_verifier_counts_slow_paths():
+    verifier = AppendVerifier()
+    verifier.fast_path()
+    verifier.slow_path('dtype')
+    verifier.slow_path('dtype')
+    assert verifier.stats() == {'fast': 1, 'slow': {'dtype': 2}, 'verified': 0, 'failed': 0, 'pending': 0}
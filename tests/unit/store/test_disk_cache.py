@@ -0,0 +1,68 @@
+import os
+import time
+
+import numpy as np
+from bson import ObjectId
+from mock import create_autospec, patch
+
+from arctic.arctic import ArcticLibraryBinding
+from arctic.store._disk_cache import DiskCache
+from arctic.store._ndarray_store import NdarrayStore
+
+
+def _version(arr):
+    return {'_id': ObjectId(), 'up_to': len(arr), 'dtype': str(arr.dtype), 'shape': (-1,) + arr.shape[1:]}
+
+
+def test_disk_cache_roundtrip(tmpdir):
+    cache = DiskCache(str(tmpdir), 1000)
+    arr = np.arange(30, dtype='float64').reshape(10, 3)
+    version = _version(arr)
+    assert cache.get(version, arr.dtype) is None
+    cache.put(version, arr)
+    cached = cache.get(version, arr.dtype)
+    assert np.all(cached == arr)
+    # copy-on-write: the cached file isn't modified
+    cached[0] = -1
+    assert np.all(cache.get(version, arr.dtype) == arr)
+    assert cache.stats()['versions'] == 1
+
+
+def test_disk_cache_discards_mismatched_file(tmpdir):
+    cache = DiskCache(str(tmpdir), 1000)
+    arr = np.arange(10)
+    version = _version(arr)
+    cache.put(version, arr)
+    version['up_to'] = 11
+    assert cache.get(version, arr.dtype) is None
+    assert cache.stats()['versions'] == 0
+
+
+def test_disk_cache_evicts_least_recently_read(tmpdir):
+    cache = DiskCache(str(tmpdir), 200)
+    arr = np.arange(10)
+    versions = [_version(arr) for _ in range(3)]
+    cache.put(versions[0], arr)
+    cache.put(versions[1], arr)
+    past = time.time() - 100
+    os.utime(cache._path(versions[1]), (past, past))
+    cache.put(versions[2], arr)
+    assert cache.get(versions[1], arr.dtype) is None
+    assert cache.get(versions[0], arr.dtype) is not None
+    assert cache.get(versions[2], arr.dtype) is not None
+    # too large to cache
+    cache.put(_version(np.arange(100)), np.arange(100))
+    assert cache.stats()['versions'] == 2
+
+
+def test_read_uses_disk_cache(tmpdir):
+    store = NdarrayStore()
+    arctic_lib = create_autospec(ArcticLibraryBinding)
+    arr = np.arange(10)
+    version = _version(arr)
+    with patch('arctic.store._ndarray_store.disk_cache', DiskCache(str(tmpdir), 1000)), \
+            patch.object(NdarrayStore, '_do_read', return_value=arr) as do_read:
+        assert np.all(store.read(arctic_lib, version, 'sym') == arr)
+        assert np.all(store.read(arctic_lib, version, 'sym') == arr)
+        assert np.all(store.read(arctic_lib, version, 'sym', from_version={'up_to': 4}) == arr[4:])
+    assert do_read.call_count == 1
@@ -1,12 +1,18 @@
+from functools import partial
+
 import numpy as np
 import pytest
-from mock import create_autospec, sentinel, call
+from mock import create_autospec, sentinel, call, patch, MagicMock
 from pymongo.collection import Collection
+from pymongo.errors import OperationFailure, BulkWriteError
 from pymongo.results import UpdateResult
 from pytest import raises
 
+from arctic._compression import compress
+from arctic.arctic import ArcticLibraryBinding
 from arctic.exceptions import DataIntegrityException
-from arctic.store._ndarray_store import NdarrayStore, _promote_struct_dtypes
+from arctic.store._ndarray_store import NdarrayStore, _promote_struct_dtypes, _fetch_segments, SegmentBatch, \
+    batched_segments
 
 
 def test_dtype_parsing():
@@ -94,6 +100,7 @@ def test_concat_and_rewrite_checks_chunk_count():
 
 def test_concat_and_rewrite_checks_written():
     self = create_autospec(NdarrayStore)
+    self._rewrite_after.side_effect = partial(NdarrayStore._rewrite_after, self)
     collection = create_autospec(Collection)
     version = {'_id': sentinel.version_id,
                'segment_count': 1}
@@ -119,6 +126,7 @@ def test_concat_and_rewrite_checks_written():
 
 def test_concat_and_rewrite_checks_different_id():
     self = create_autospec(NdarrayStore)
+    self._rewrite_after.side_effect = partial(NdarrayStore._rewrite_after, self)
     collection = create_autospec(Collection)
     version = {'_id': sentinel.version_id,
                'segment_count': 1}
@@ -151,6 +159,7 @@ def test_concat_and_rewrite_checks_different_id():
 
 def test_concat_and_rewrite_checks_fewer_updated():
     self = create_autospec(NdarrayStore)
+    self._rewrite_after.side_effect = partial(NdarrayStore._rewrite_after, self)
     collection = create_autospec(Collection)
     version = {'_id': sentinel.version_id,
                'segment_count': 1}
@@ -180,3 +189,192 @@ def test_concat_and_rewrite_checks_fewer_updated():
         NdarrayStore._concat_and_rewrite(self, collection, version, symbol, item, previous_version)
         assert collection.find.call_args_list[1] == call(expected_verify_find_spec)
     assert str(e.value) == 'Symbol: sentinel.symbol:sentinel.version update_many updated 1 segments instead of 2'
+
+
+def test_do_write_looks_up_only_the_new_shas():
+    store = NdarrayStore()
+    collection = create_autospec(Collection)
+    collection.find.return_value = []
+    version = {'_id': sentinel.version_id}
+    with patch.object(NdarrayStore, 'check_written'), patch('arctic.store._ndarray_store._CHUNK_SIZE', 80), \
+            patch('arctic.store._ndarray_store.ARCTIC_WRITE_INFLIGHT_BYTES', 160):
+        store._do_write(collection, version, 'sym', np.arange(25, dtype='int64'), {'_id': sentinel.id})
+    assert version['segment_count'] == 3
+    # one lookup per batch of (at most 2) segments, for just those segments' SHAs
+    specs = [c[0][0] for c in collection.find.call_args_list]
+    assert [len(spec['sha']['$in']) for spec in specs] == [2, 1]
+    assert all(spec['symbol'] == 'sym' for spec in specs)
+    assert sum(len(c[0][0]) for c in collection.bulk_write.call_args_list) == 3
+
+
+def test_do_write_shares_the_bulk_write_of_a_segment_batch():
+    store = NdarrayStore()
+    collection = create_autospec(Collection)
+    collection.find.return_value = []
+    segment_batch = SegmentBatch(collection)
+    versions = {symbol: {'_id': symbol} for symbol in ('a', 'b', 'c')}
+    with patch('arctic.store._ndarray_store._CHUNK_SIZE', 80), batched_segments(segment_batch):
+        for symbol, version in versions.items():
+            store._do_write(collection, version, symbol, np.arange(25, dtype='int64'),
+                            {'_id': sentinel.id} if symbol != 'c' else None)
+    assert not collection.bulk_write.called
+    segment_batch.flush()
+
+    # One lookup, of the SHAs of the symbols with a previous version, and one write for all the symbols
+    spec, = [c[0][0] for c in collection.find.call_args_list]
+    assert sorted((s['symbol'], len(s['sha']['$in'])) for s in spec['$or']) == [('a', 3), ('b', 3)]
+    assert collection.bulk_write.call_count == 1
+    assert sorted(u._filter['symbol'] for u in collection.bulk_write.call_args[0][0]) == ['a'] * 3 + ['b'] * 3 + \
+        ['c'] * 3
+    with patch.object(NdarrayStore, 'check_written') as check_written:
+        segment_batch.check('a')
+    check_written.assert_called_once_with(collection, 'a', versions['a'])
+
+
+def test_segment_batch_writes_once_its_segments_are_large_enough():
+    collection = create_autospec(Collection)
+    segment_batch = SegmentBatch(collection)
+    with patch('arctic.store._ndarray_store.ARCTIC_WRITE_INFLIGHT_BYTES', 10):
+        segment_batch.add('a', {'_id': 'a'}, [(b'1', {'segment': 0, 'data': b'12345'})], lookup=False)
+        assert not collection.bulk_write.called
+        segment_batch.add('b', {'_id': 'b'}, [(b'2', {'segment': 0, 'data': b'12345'})], lookup=False)
+        assert collection.bulk_write.call_count == 1
+    assert not collection.find.called
+    segment_batch.flush()
+    assert collection.bulk_write.call_count == 1
+
+
+def test_segment_batch_reports_the_symbols_which_failed_to_write():
+    collection = create_autospec(Collection)
+    collection.bulk_write.side_effect = BulkWriteError({'writeErrors': [{'index': 1}]})
+    segment_batch = SegmentBatch(collection)
+    for symbol in ('a', 'b'):
+        segment_batch.add(symbol, {'_id': symbol}, [(b'1', {'segment': 0, 'data': b'1'})], lookup=False)
+        segment_batch.check_later(symbol, {'_id': symbol})
+    segment_batch.flush()
+    with patch.object(NdarrayStore, 'check_written') as check_written:
+        segment_batch.check('a')
+        with raises(BulkWriteError):
+            segment_batch.check('b')
+    check_written.assert_called_once_with(collection, 'a', {'_id': 'a'})
+
+
+@pytest.mark.parametrize('prefix_len', [0, 3, 10, 15])
+def test_checksum_with_prefix(prefix_len):
+    store = NdarrayStore()
+    arr = np.arange(10, dtype='int64')
+    assert store._checksum_with_prefix(arr, prefix_len) == (store.checksum(arr), store.checksum(arr[:prefix_len]))
+
+
+def test_do_read_places_segments_in_any_order():
+    store = NdarrayStore()
+    collection = create_autospec(Collection)
+    arr = np.arange(10, dtype='int64')
+    version = {'_id': sentinel.id, 'version': 1, 'up_to': 10, 'segment_count': 3,
+               'dtype': 'int64', 'shape': [-1]}
+    collection.find.return_value = [{'segment': 9, 'compressed': False, 'data': arr[7:].tostring()},
+                                    {'segment': 3, 'compressed': True, 'data': compress(arr[:4].tostring())},
+                                    {'segment': 6, 'compressed': True, 'data': compress(arr[4:7].tostring())}]
+    assert np.all(store._do_read(collection, version, 'sym') == arr)
+
+    collection.find.return_value = collection.find.return_value[:1] + collection.find.return_value[2:]
+    assert np.all(store._do_read(collection, version, 'sym', index_range=(5, None)) == arr[4:])
+
+
+def test_do_read_checks_segment_count():
+    store = NdarrayStore()
+    collection = create_autospec(Collection)
+    version = {'_id': sentinel.id, 'version': 1, 'up_to': 10, 'segment_count': 2,
+               'dtype': 'int64', 'shape': [-1]}
+    collection.find.return_value = [{'segment': 9, 'compressed': False, 'data': np.arange(10).tostring()}]
+    with pytest.raises(OperationFailure):
+        store._do_read(collection, version, 'sym')
+
+
+def _cursor(docs):
+    cursor = MagicMock()
+    cursor.__iter__.return_value = iter(docs)
+    return cursor
+
+
+def test_fetch_segments_splits_range_across_cursors():
+    collection = create_autospec(Collection)
+    cursors = []
+    collection.find.side_effect = lambda spec: cursors.append(_cursor([spec['segment']])) or cursors[-1]
+    version = {'_id': sentinel.id, 'up_to': 100}
+    segments = list(_fetch_segments(collection, 'sym', version, None, 100, parallelism=3))
+    assert sorted(segments, key=lambda s: s['$gte']) == [{'$gte': 0, '$lt': 33},
+                                                         {'$gte': 33, '$lt': 66},
+                                                         {'$gte': 66, '$lt': 100}]
+    assert all(c.close.called for c in cursors)
+
+
+def test_fetch_segments_stops_cursors_when_abandoned():
+    collection = create_autospec(Collection)
+    cursors = []
+    collection.find.side_effect = lambda spec: cursors.append(_cursor(range(1000))) or cursors[-1]
+    version = {'_id': sentinel.id, 'up_to': 100}
+    segments = _fetch_segments(collection, 'sym', version, None, 100, parallelism=2)
+    next(segments)
+    segments.close()
+    assert len(cursors) == 2
+    assert all(c.close.called for c in cursors)
+
+
+def test_fetch_segments_single_cursor():
+    collection = create_autospec(Collection)
+    version = {'_id': sentinel.id, 'up_to': 100}
+    assert _fetch_segments(collection, 'sym', version, None, 100) == collection.find.return_value
+    assert collection.find.call_args_list == [call({'symbol': 'sym', 'segment': {'$lt': 100}, 'parent': sentinel.id})]
+
+
+def test_fetch_segments_raises_cursor_errors():
+    collection = create_autospec(Collection)
+    collection.find.side_effect = OperationFailure('error')
+    version = {'_id': sentinel.id, 'up_to': 100}
+    with pytest.raises(OperationFailure):
+        list(_fetch_segments(collection, 'sym', version, None, 100, parallelism=2))
+
+
+def test_iter_read_reads_each_segment_once():
+    store = NdarrayStore()
+    arctic_lib = create_autospec(ArcticLibraryBinding)
+    collection = arctic_lib.get_top_level_collection.return_value
+    arr = np.arange(10, dtype='int64')
+    version = {'_id': sentinel.id, 'version': 1, 'up_to': 10, 'segment_count': 3,
+               'dtype': 'int64', 'shape': [-1]}
+    segments = [{'segment': 3, 'compressed': False, 'data': arr[:4].tostring()},
+                {'segment': 6, 'compressed': False, 'data': arr[4:7].tostring()},
+                {'segment': 9, 'compressed': False, 'data': arr[7:].tostring()}]
+    collection.find.side_effect = lambda spec: [s for s in segments
+                                                if spec['segment']['$gte'] <= s['segment'] < spec['segment']['$lt']]
+    with patch('arctic.store._ndarray_store._CHUNK_SIZE', 8):
+        batches = list(store.iter_read(arctic_lib, version, 'sym', 5))
+    assert [list(b) for b in batches] == [list(arr[:4]), list(arr[4:])]
+
+
+def test_can_compact():
+    store = NdarrayStore()
+    version = {'dtype': 'int64', 'shape': [-1], 'up_to': 20, 'segment_count': 3}
+    with patch('arctic.store._ndarray_store._CHUNK_SIZE', 80):
+        assert store.can_compact(version)
+        assert not store.can_compact(dict(version, segment_count=2))
+        assert not store.can_compact(dict(version, up_to=0, segment_count=0))
+
+
+def test_compact_rewrites_after_full_compressed_segments():
+    self = create_autospec(NdarrayStore)
+    self._rows_per_chunk.return_value = 4
+    arctic_lib = create_autospec(ArcticLibraryBinding)
+    collection = arctic_lib.get_top_level_collection.return_value
+    segments = [{'_id': sentinel.id_1, 'segment': 3, 'compressed': True, 'sha': 'abc0'},
+                {'_id': sentinel.id_2, 'segment': 7, 'compressed': True, 'sha': 'abc1'},
+                {'_id': sentinel.id_3, 'segment': 9, 'compressed': True, 'sha': 'abc2'},
+                {'_id': sentinel.id_4, 'segment': 13, 'compressed': True, 'sha': 'abc3'}]
+    collection.find.return_value = segments
+    version = {'_id': sentinel.version_id}
+    previous_version = {'_id': sentinel.id, 'dtype': 'int64', 'shape': [-1], 'up_to': 14, 'segment_count': 4}
+    NdarrayStore.compact(self, arctic_lib, version, sentinel.symbol, previous_version)
+    assert self._rewrite_after.call_count == 1
+    assert self._rewrite_after.call_args[0] == (collection, version, sentinel.symbol, None, previous_version,
+                                                segments[:2])
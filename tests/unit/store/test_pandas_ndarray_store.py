@@ -55,3 +55,27 @@ def test_read_multi_index_with_no_ts_info():
     record = np.array(record.tolist(), dtype=np.dtype([('index 1', '<M8[ns]'), ('index 2', '<M8[ns]'), ('SPAM', '<f8')],
                                                       metadata={'index': ['index 1', 'index 2'], 'columns': ['SPAM']}))
     assert store.SERIALIZER._index_from_records(record).equals(df.index)
+
+
+def test_column_fields():
+    version = {'symbol': 'sym', 'dtype_metadata': {'index': ['date'], 'columns': ['a', 'b', 'c']}}
+    fields, metadata = PandasDataFrameStore._column_fields(version, ['c', 'a'])
+    assert fields == ['date', 'c', 'a']
+    assert metadata == {'index': ['date'], 'columns': ['c', 'a']}
+    # The version's metadata is left alone
+    assert version['dtype_metadata']['columns'] == ['a', 'b', 'c']
+
+
+def test_column_fields_multi_column():
+    version = {'symbol': 'sym', 'dtype_metadata': {'index': ['date'], 'columns': ["('a', 'x')", "('b', 'y')"],
+                                                   'multi_column': {'names': [None, None],
+                                                                    'values': [['a', 'b'], ['x', 'y']]}}}
+    fields, metadata = PandasDataFrameStore._column_fields(version, [('b', 'y')])
+    assert fields == ['date', "('b', 'y')"]
+    assert metadata['multi_column'] == {'names': [None, None], 'values': [['b'], ['y']]}
+
+
+def test_column_fields_unknown_column():
+    version = {'symbol': 'sym', 'dtype_metadata': {'index': ['date'], 'columns': ['a']}}
+    with raises(KeyError):
+        PandasDataFrameStore._column_fields(version, ['b'])
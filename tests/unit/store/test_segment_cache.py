@@ -0,0 +1,61 @@
+import numpy as np
+from mock import create_autospec, patch, sentinel
+from pymongo.collection import Collection
+
+from arctic._compression import compress
+from arctic.store._ndarray_store import NdarrayStore
+from arctic.store._segment_cache import SegmentCache
+
+
+def test_segment_cache_evicts_least_recently_used():
+    cache = SegmentCache(max_bytes=10)
+    cache.put('a', b'1234')
+    cache.put('b', b'1234')
+    assert cache.get('a') == b'1234'
+    cache.put('c', b'1234')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'1234'
+    assert cache.get('c') == b'1234'
+    assert cache.stats() == {'hits': 3, 'misses': 1, 'evictions': 1, 'segments': 2, 'bytes': 8, 'max_bytes': 10}
+
+
+def test_segment_cache_ignores_segments_larger_than_the_cache():
+    cache = SegmentCache(max_bytes=10)
+    cache.put('a', b'12345678901')
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] == 0
+
+
+def test_segment_cache_resize():
+    cache = SegmentCache(max_bytes=10)
+    cache.put('a', b'1234')
+    cache.put('b', b'1234')
+    cache.resize(5)
+    assert cache.stats()['segments'] == 1
+    assert cache.get('b') == b'1234'
+    assert not SegmentCache().enabled
+
+
+def test_do_read_uses_segment_cache():
+    store = NdarrayStore()
+    collection = create_autospec(Collection)
+    collection.full_name = 'arctic_test.library'
+    arr = np.arange(10, dtype='int64')
+    version = {'_id': sentinel.id, 'version': 1, 'up_to': 10, 'segment_count': 2, 'dtype': 'int64', 'shape': [-1]}
+    segments = [{'segment': 4, 'sha': b'sha1', 'compressed': True, 'data': compress(arr[:5].tostring())},
+                {'segment': 9, 'sha': b'sha2', 'compressed': False, 'data': arr[5:].tostring()}]
+
+    def find(spec, projection=None):
+        if projection:
+            return [{k: x[k] for k in projection if k in x} for x in segments]
+        return [x for x in segments if x['sha'] in spec['sha']['$in']]
+    collection.find.side_effect = find
+
+    with patch('arctic.store._ndarray_store.segment_cache', SegmentCache(1000)) as cache:
+        assert np.all(store._do_read(collection, version, 'sym') == arr)
+        assert cache.stats()['misses'] == 2
+        assert collection.find.call_count == 2
+        assert np.all(store._do_read(collection, version, 'sym') == arr)
+        assert cache.stats()['hits'] == 2
+        # only the segments' SHAs were fetched the second time
+        assert collection.find.call_count == 3
@@ -0,0 +1,120 @@
+import time
+
+from mock import create_autospec, patch, Mock, MagicMock, sentinel
+from pymongo.collection import Collection
+from pymongo.errors import OperationFailure
+
+from arctic.store._version_cache import VersionCache, VersionWatcher
+from arctic.store.version_store import VersionStore
+
+
+def test_version_cache_hands_out_copies():
+    cache = VersionCache(max_age=60, max_entries=10)
+    cache.put('a', {'_id': 1, 'metadata': {'m': 1}}, time.time())
+    cache.get('a').pop('metadata')
+    assert cache.get('a') == {'_id': 1, 'metadata': {'m': 1}}
+    assert cache.get('b') is None
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['misses'] == 1
+
+
+def test_version_cache_hands_out_deep_copies():
+    cache = VersionCache(max_age=60, max_entries=10)
+    version = {'_id': 1, 'metadata': {'m': [1]}}
+    cache.put('a', version, time.time())
+    version['metadata']['m'].append(2)
+    cache.get('a')['metadata']['m'].append(3)
+    assert cache.get('a') == {'_id': 1, 'metadata': {'m': [1]}}
+
+
+def test_version_cache_expires_entries():
+    cache = VersionCache(max_age=60, max_entries=10)
+    cache.put('a', {'_id': 1}, time.time() - 61)
+    assert cache.get('a') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_version_cache_evicts_least_recently_used():
+    cache = VersionCache(max_age=60, max_entries=2)
+    for key in ('a', 'b'):
+        cache.put(key, {'_id': key}, time.time())
+    cache.get('a')
+    cache.put('c', {'_id': 'c'}, time.time())
+    assert cache.get('b') is None
+    assert cache.get('a') == {'_id': 'a'}
+    assert cache.stats()['evictions'] == 1
+
+
+def test_version_cache_ignores_lookups_started_before_an_invalidation():
+    cache = VersionCache(max_age=60, max_entries=10)
+    started = time.time() - 1
+    cache.invalidate(['a'])
+    cache.put('a', {'_id': 1}, started)
+    assert cache.get('a') is None
+    cache.put('a', {'_id': 1}, time.time() + 1)
+    assert cache.get('a') == {'_id': 1}
+
+
+def test_version_cache_invalidate_ids():
+    cache = VersionCache(max_age=60, max_entries=10)
+    cache.put('a', {'_id': 1}, time.time())
+    cache.put('b', {'_id': 2}, time.time())
+    cache.invalidate_ids([2, 3])
+    assert cache.get('a') == {'_id': 1}
+    assert cache.get('b') is None
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_version_cache_disabled():
+    cache = VersionCache(max_age=60, max_entries=10)
+    cache.put('a', {'_id': 1}, time.time())
+    cache.configure(0, 10)
+    assert not cache.enabled
+    assert cache.stats()['entries'] == 0
+
+
+def test_version_watcher_follows_change_stream():
+    cache = create_autospec(VersionCache)
+    versions = create_autospec(Collection, full_name='arctic_test.library.versions')
+    versions.watch.return_value.__enter__.return_value = [
+        {'operationType': 'insert', 'fullDocument': {'symbol': 'a'}},
+        {'operationType': 'delete', 'documentKey': {'_id': sentinel.id}}]
+    VersionWatcher(cache, versions).run()
+    cache.invalidate.assert_called_once_with([('arctic_test.library.versions', 'a')])
+    cache.invalidate_ids.assert_called_once_with([sentinel.id])
+
+
+def test_version_watcher_polls_without_change_streams():
+    cache = create_autospec(VersionCache)
+    versions = create_autospec(Collection, full_name='arctic_test.library.versions')
+    versions.watch.side_effect = OperationFailure('The $changeStream stage is only supported on replica sets')
+    watcher = VersionWatcher(cache, versions, poll_interval=0.01)
+
+    def poll(*args, **kwargs):
+        watcher.stop()
+        return Mock(distinct=Mock(return_value=['a']))
+    versions.find.side_effect = poll
+    watcher.run()
+    cache.invalidate.assert_called_once_with([('arctic_test.library.versions', 'a')])
+
+
+def test_read_metadata_uses_version_cache():
+    vs = create_autospec(VersionStore, instance=True, _versions=MagicMock(), _arctic_lib=Mock(), _allow_secondary=False)
+    vs._versions.full_name = 'arctic_test.library.versions'
+    versions = vs._versions.with_options.return_value
+    versions.find_one.return_value = {'_id': 1, 'symbol': 'a', 'version': 2}
+    with patch('arctic.store.version_store.version_cache', VersionCache(max_age=60, max_entries=10)):
+        assert VersionStore._read_metadata(vs, 'a')['version'] == 2
+        assert VersionStore._read_metadata(vs, 'a')['version'] == 2
+        assert versions.find_one.call_count == 1
+        VersionStore._invalidate_version_cache(vs, ['a'])
+        assert VersionStore._read_metadata(vs, 'a')['version'] == 2
+        assert versions.find_one.call_count == 2
+
+
+def test_delete_invalidates_version_cache():
+    vs = create_autospec(VersionStore, instance=True, _versions=MagicMock(), _arctic_lib=Mock())
+    vs._versions.find_one.return_value = None
+    vs.has_symbol.return_value = False
+    VersionStore.delete(vs, 'a')
+    vs._invalidate_version_cache.assert_called_with(['a'])
@@ -2,18 +2,20 @@ import datetime
 from datetime import datetime as dt, timedelta as dtd
 
 import bson
+import numpy as np
 import pymongo
 import pytest
 from bson import ObjectId
 from mock import patch, MagicMock, sentinel, create_autospec, Mock, call
 from pymongo import ReadPreference
 from pymongo.collection import Collection
-from pymongo.errors import OperationFailure, DuplicateKeyError
+from pymongo.errors import OperationFailure, DuplicateKeyError, BulkWriteError
 
 from arctic.arctic import ArcticLibraryBinding, Arctic
 from arctic.date import mktz
 from arctic.exceptions import DuplicateSnapshotException, NoDataFoundException
 from arctic.store import version_store
+from arctic.store._ndarray_store import NdarrayStore
 from arctic.store.version_store import VersionStore, VersionedItem
 
 
@@ -288,6 +290,78 @@ def test_list_symbols_default_pipeline():
     versions.aggregate.assert_called_once_with(pipeline, allowDiskUse=True)
 
 
+def test_list_symbols_from_catalogue():
+    vs = create_autospec(VersionStore, _versions=Mock(), _symbols=Mock())
+    vs._symbol_catalogue_state.return_value = version_store.CATALOGUE_READY
+    vs._symbols.find.return_value = [{'symbol': 'b'}, {'symbol': 'a'}]
+
+    assert VersionStore.list_symbols(vs, regex='^[ab]') == ['a', 'b']
+
+    vs._symbols.find.assert_called_once_with({'symbol': {'$regex': '^[ab]'}, 'deleted': False},
+                                             projection={'symbol': 1, '_id': 0})
+    assert not vs._versions.aggregate.called
+
+
+def test_list_symbols_catalogue_building():
+    vs = create_autospec(VersionStore, _versions=Mock(), _symbols=Mock())
+    vs._symbol_catalogue_state.return_value = version_store.CATALOGUE_BUILDING
+    vs._versions.aggregate.return_value = [{'_id': 'a'}]
+    assert VersionStore.list_symbols(vs) == ['a']
+    assert not vs._symbols.find.called
+
+
+def test_has_symbol_from_catalogue():
+    vs = create_autospec(VersionStore, _symbols=Mock())
+    vs._symbol_catalogue_state.return_value = version_store.CATALOGUE_READY
+    vs._symbols.find_one.return_value = None
+    assert VersionStore.has_symbol(vs, 'a') is False
+    vs._symbols.find_one.assert_called_once_with({'symbol': 'a', 'deleted': False}, projection={'_id': 1})
+    assert not vs._read_metadata.called
+
+
+def test_update_symbol_catalogue_keeps_later_versions():
+    vs = create_autospec(VersionStore, _symbols=Mock())
+    vs._symbol_catalogue_state.return_value = version_store.CATALOGUE_READY
+    vs._catalogue_entry.side_effect = VersionStore._catalogue_entry
+    # The entry of 'a' already has a later version, so its upsert failed
+    vs._symbols.bulk_write.side_effect = BulkWriteError({'writeErrors': [{'index': 0, 'code': 11000}]})
+
+    VersionStore._update_symbol_catalogue(vs, [{'symbol': 'a', 'version': 3, 'metadata': None},
+                                               {'symbol': 'b', 'version': 2, 'metadata': {'deleted': True}}])
+
+    assert vs._symbols.bulk_write.call_args == call([
+        pymongo.UpdateOne({'symbol': 'a', 'version': {'$lte': 3}}, {'$set': {'version': 3, 'deleted': False}},
+                          upsert=True),
+        pymongo.UpdateOne({'symbol': 'b', 'version': {'$lte': 2}}, {'$set': {'version': 2, 'deleted': True}},
+                          upsert=True)], ordered=False)
+
+
+def test_update_symbol_catalogue_without_catalogue():
+    vs = create_autospec(VersionStore, _symbols=Mock())
+    vs._symbol_catalogue_state.return_value = None
+    VersionStore._update_symbol_catalogue(vs, [{'symbol': 'a', 'version': 3}])
+    assert not vs._symbols.bulk_write.called
+
+
+def test_symbol_catalogue_state_is_cached():
+    vs = create_autospec(VersionStore, _arctic_lib=Mock(), _symbol_catalogue=None, _symbol_catalogue_checked=None)
+    vs._arctic_lib.get_library_metadata.return_value = None
+    with patch('arctic.store.version_store.time.time', return_value=100.):
+        assert VersionStore._symbol_catalogue_state(vs) is None
+        assert VersionStore._symbol_catalogue_state(vs) is None
+    assert vs._arctic_lib.get_library_metadata.call_count == 1
+    # Looked up again once older than ARCTIC_SYMBOL_CATALOGUE_STATE_SECONDS
+    vs._arctic_lib.get_library_metadata.return_value = version_store.CATALOGUE_BUILDING
+    with patch('arctic.store.version_store.time.time', return_value=111.):
+        assert VersionStore._symbol_catalogue_state(vs) == version_store.CATALOGUE_BUILDING
+    vs._arctic_lib.get_library_metadata.return_value = version_store.CATALOGUE_READY
+    assert VersionStore._symbol_catalogue_state(vs, refresh=True) == version_store.CATALOGUE_READY
+    # The complete state is never looked up again
+    with patch('arctic.store.version_store.time.time', return_value=1000.):
+        assert VersionStore._symbol_catalogue_state(vs, refresh=True) == version_store.CATALOGUE_READY
+    assert vs._arctic_lib.get_library_metadata.call_count == 3
+
+
 def test_snapshot_duplicate_raises_exception():
     vs = create_autospec(VersionStore, _snapshots=Mock())
     with pytest.raises(DuplicateSnapshotException) as e:
@@ -591,3 +665,139 @@ def test_append_insert_version_operror():
     assert vs._versions.find_one.call_count == 1
     assert read_handler.append.call_count == 1
     assert vs._versions.insert_one.call_count == 2
+
+
+def test_read_metadata_batch_no_asof():
+    vs = create_autospec(VersionStore, instance=True, _versions=Mock(), _allow_secondary=False,
+                         _arctic_lib=create_autospec(ArcticLibraryBinding))
+    versions = vs._versions.with_options.return_value
+    versions.aggregate.return_value = [{'_id': 'a', 'version': {'symbol': 'a', 'version': 2}},
+                                       {'_id': 'b', 'version': {'symbol': 'b', 'metadata': {'deleted': True}}}]
+    res = VersionStore._read_metadata_batch(vs, ['a', 'b', 'c'])
+    assert versions.aggregate.call_args_list == [call([
+        {'$match': {'symbol': {'$in': ['a', 'b', 'c']}}},
+        {'$sort': {'symbol': pymongo.ASCENDING, 'version': pymongo.DESCENDING}},
+        {'$group': {'_id': '$symbol', 'version': {'$first': '$$ROOT'}}}], allowDiskUse=True)]
+    assert res['a'] == {'symbol': 'a', 'version': 2}
+    assert isinstance(res['b'], NoDataFoundException)
+    assert isinstance(res['c'], NoDataFoundException)
+
+
+def test_read_metadata_batch_version_number():
+    vs = create_autospec(VersionStore, instance=True, _versions=Mock(), _allow_secondary=False,
+                         _arctic_lib=create_autospec(ArcticLibraryBinding))
+    versions = vs._versions.with_options.return_value
+    versions.find.return_value = [{'symbol': 'a', 'version': 3}]
+    assert VersionStore._read_metadata_batch(vs, ['a'], 3) == {'a': {'symbol': 'a', 'version': 3}}
+    assert versions.find.call_args_list == [call({'symbol': {'$in': ['a']}, 'version': 3})]
+
+
+def test_read_batch_fetches_segments_together():
+    handler = Mock(segments_spec=lambda version, symbol, **kwargs: {'symbol': symbol})
+    vs = create_autospec(VersionStore, instance=True, _collection=Mock())
+    vs._read_preference.return_value = sentinel.read_preference
+    vs._read_metadata_batch.return_value = {'a': {'version': 1}, 'b': {'version': 1},
+                                            'c': NoDataFoundException('c')}
+    vs._read_handler.return_value = handler
+    segments = vs._collection.with_options.return_value
+    segments.find.return_value = [{'symbol': 'a', 'segment': 0}, {'symbol': 'b', 'segment': 0},
+                                  {'symbol': 'a', 'segment': 1}]
+    vs._do_read.side_effect = lambda symbol, version, **kwargs: (symbol, kwargs['segments'])
+
+    res = VersionStore.read_batch(vs, ['a', 'b', 'c'])
+
+    assert segments.find.call_args_list == [call({'$or': [{'symbol': 'a'}, {'symbol': 'b'}]})]
+    assert res['a'] == ('a', [{'symbol': 'a', 'segment': 0}, {'symbol': 'a', 'segment': 1}])
+    assert res['b'] == ('b', [{'symbol': 'b', 'segment': 0}])
+    assert isinstance(res['c'], NoDataFoundException)
+
+
+def test_read_batch_reports_errors():
+    vs = create_autospec(VersionStore, instance=True, _collection=Mock())
+    vs._read_metadata_batch.return_value = {'a': {'version': 1}, 'b': {'version': 1}}
+    vs._read_handler.return_value = Mock(spec=[])  # Can't fetch its segments in batches
+    vs._do_read.side_effect = lambda symbol, version, **kwargs: sentinel.read if symbol == 'a' else 1 / 0
+    with patch('arctic.store.version_store.log_exception'):
+        res = VersionStore.read_batch(vs, ['a', 'b'])
+    assert res['a'] == sentinel.read
+    assert isinstance(res['b'], ZeroDivisionError)
+
+
+def test_write_batch():
+    vs = create_autospec(VersionStore, instance=True, _arctic_lib=Mock(), _collection=Mock())
+    vs._next_version_num.side_effect = lambda symbol: {'a': 3, 'b': 1}[symbol]
+    vs._previous_versions_batch.return_value = {'a': {'symbol': 'a', 'version': 2}}
+    vs._insert_versions.return_value = set()
+
+    res = VersionStore.write_batch(vs, {'a': sentinel.a, 'b': sentinel.b}, metadata={'m': 1})
+
+    assert {s: (r.version, r.metadata) for s, r in res.items()} == {'a': (3, {'m': 1}), 'b': (1, {'m': 1})}
+    assert sorted((c[0][1]['symbol'], c[0][3]) for c in vs._write_batch_item.call_args_list) == [
+        ('a', {'symbol': 'a', 'version': 2}), ('b', None)]
+    # Only the symbols with a previous version are pruned
+    vs._prune_previous_versions_batch.assert_called_once_with({'a': None})
+    inserted, = vs._insert_versions.call_args[0]
+    assert sorted((v['symbol'], v['version']) for v in inserted) == [('a', 3), ('b', 1)]
+
+
+def test_write_batch_reports_errors_and_retries_duplicate_versions():
+    vs = create_autospec(VersionStore, instance=True, _arctic_lib=Mock(), _collection=Mock())
+    vs._next_version_num.return_value = 1
+    vs._previous_versions_batch.return_value = {}
+    vs._write_batch_item.side_effect = lambda segment_batch, version, data, previous_version: \
+        1 / 0 if data == 'bad' else None
+    vs._insert_versions.return_value = {'dup'}
+    vs.write.return_value = sentinel.retried
+
+    with patch('arctic.store.version_store.log_exception'):
+        res = VersionStore.write_batch(vs, {'ok': 'ok', 'bad': 'bad', 'dup': 'dup'}, prune_previous_version=False)
+
+    assert res['ok'].version == 1
+    assert isinstance(res['bad'], ZeroDivisionError)
+    assert res['dup'] == sentinel.retried
+    vs.write.assert_called_once_with('dup', 'dup', metadata=None, prune_previous_version=False)
+    assert sorted(v['symbol'] for v in vs._insert_versions.call_args[0][0]) == ['dup', 'ok']
+    assert not vs._prune_previous_versions_batch.called
+
+
+def test_write_batch_shares_the_segments_bulk_write():
+    collection = create_autospec(Collection)
+    collection.find.return_value = []
+    arctic_lib = create_autospec(ArcticLibraryBinding, instance=True, arctic=Mock())
+    arctic_lib.get_top_level_collection.return_value = collection
+    arctic_lib.get_cached_library_metadata.return_value = None
+    vs = create_autospec(VersionStore, instance=True, _arctic_lib=arctic_lib, _collection=collection)
+    vs._next_version_num.return_value = 1
+    vs._previous_versions_batch.return_value = {}
+    vs._insert_versions.return_value = set()
+    vs._write_handler.return_value = NdarrayStore()
+    vs._write_batch_item.side_effect = lambda *args: VersionStore._write_batch_item(vs, *args)
+
+    with patch.object(NdarrayStore, 'check_written') as check_written:
+        res = VersionStore.write_batch(vs, {'a': np.arange(10), 'b': np.arange(20), 'c': np.arange(30)})
+
+    assert sorted(res) == ['a', 'b', 'c']
+    assert collection.bulk_write.call_count == 1
+    assert sorted(u._filter['symbol'] for u in collection.bulk_write.call_args[0][0]) == ['a', 'b', 'c']
+    assert sorted(c[0][1] for c in check_written.call_args_list) == ['a', 'b', 'c']
+
+
+def test_insert_versions_returns_failed_symbols():
+    vs = create_autospec(VersionStore, instance=True, _versions=Mock())
+    versions = [{'_id': 1, 'symbol': 'a'}, {'_id': 2, 'symbol': 'b'}, {'_id': 3, 'symbol': 'c'}]
+    vs._versions.insert_many.side_effect = BulkWriteError({'writeErrors': [{'index': 1}]})
+    vs._versions.find.__name__ = 'find'  # feh: mongo_retry decorator cares about this
+    vs._versions.find.return_value = [{'_id': 1}, {'_id': 3}]
+    assert VersionStore._insert_versions(vs, versions) == {'b'}
+    vs._versions.insert_many.assert_called_once_with(versions, ordered=False)
+
+
+def test_find_prunable_version_ids_batch_keeps_latest_version():
+    vs = create_autospec(VersionStore, instance=True, _versions=Mock())
+    versions = vs._versions.with_options.return_value
+    versions.find.return_value = [{'_id': 4, 'symbol': 'a'}, {'_id': 3, 'symbol': 'a'}, {'_id': 2, 'symbol': 'a'},
+                                  {'_id': 1, 'symbol': 'b'}]
+    with patch('arctic.store.version_store.get_fwptr_config', return_value=sentinel.cfg):
+        res = VersionStore._find_prunable_version_ids_batch(vs, ['a', 'b'], 0)
+    assert res == {'a': {3: ([], sentinel.cfg), 2: ([], sentinel.cfg)}, 'b': {}}
+    vs._versions.with_options.assert_called_once_with(read_preference=ReadPreference.PRIMARY)
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from arctic.store._zone_map import zone_map, zone_map_fields, read_zone_map, parse_where, where_mask, \
+    candidate_ranges
+
+DTYPE = np.dtype([('date', '<M8[ns]'), ('price', '<f8'), ('size', '<i8'), ('name', 'S4')])
+
+
+def _item(n):
+    item = np.zeros(n, dtype=DTYPE)
+    item['price'] = np.arange(n, dtype='f8')
+    item['size'] = np.arange(n)[::-1]
+    return item
+
+
+def _version(item, rows_per_segment):
+    segments = list(range(rows_per_segment - 1, len(item), rows_per_segment))
+    return {'up_to': len(item), 'zone_map': zone_map(item, zone_map_fields(item.dtype), None, 0, segments)}
+
+
+def test_zone_map_fields():
+    assert zone_map_fields(DTYPE) == ['price', 'size']
+    assert zone_map_fields(DTYPE, ['size', 'name']) == ['size']
+    assert zone_map_fields(np.dtype('f8')) == []
+
+
+def test_zone_map():
+    item = _item(10)
+    item['price'][5:] = np.nan
+    zm = read_zone_map(zone_map(item, ['price', 'size'], None, 0, [4, 9]))
+    assert list(zm['segment']) == [4, 9]
+    assert list(zm['min_0'])[0] == 0 and np.isnan(zm['min_0'][1])
+    assert list(zm['max_0'])[0] == 4 and np.isnan(zm['max_0'][1])
+    assert list(zm['nulls_0']) == [0, 5]
+    assert list(zm['min_1']) == [5, 0]
+    assert list(zm['max_1']) == [9, 4]
+    assert list(zm['nulls_1']) == [0, 0]
+
+
+def test_zone_map_appended():
+    item = _item(10)
+    existing = zone_map(item[:8], ['price'], None, 0, [4, 7])
+    # Rewrite from row 5: the first segment's statistics are kept
+    zm = read_zone_map(zone_map(item[5:], ['price'], existing, 5, [9]))
+    assert list(zm['segment']) == [4, 9]
+    assert list(zm['min_0']) == [0, 5]
+    assert list(zm['max_0']) == [4, 9]
+
+
+def test_zone_map_appended_without_existing():
+    item = _item(10)
+    assert zone_map(item[5:], ['price'], None, 5, [9]) is None
+
+
+def test_parse_where():
+    assert parse_where(('price', '>', 1)) == [('price', '>', 1)]
+    assert parse_where([('price', 'isnull'), ('size', 'in', [1])]) == [('price', 'isnull', None), ('size', 'in', [1])]
+    with pytest.raises(ValueError):
+        parse_where([('price', '~', 1)])
+    with pytest.raises(ValueError):
+        parse_where([('price', 'isnull', 1)])
+    with pytest.raises(ValueError):
+        parse_where(['price > 1'])
+
+
+def test_where_mask():
+    item = _item(10)
+    item['price'][0] = np.nan
+    assert list(np.flatnonzero(where_mask(item, parse_where([('price', '>', 2), ('size', '>=', 3)])))) == [3, 4, 5, 6]
+    assert list(np.flatnonzero(where_mask(item, parse_where(('price', 'isnull'))))) == [0]
+    assert list(np.flatnonzero(where_mask(item, parse_where(('size', 'in', [1, 2]))))) == [7, 8]
+    with pytest.raises(ValueError):
+        where_mask(item, parse_where(('nope', '>', 1)))
+
+
+@pytest.mark.parametrize('where, expected', [
+    (('price', '>', 25), [(20, 30)]),
+    (('price', '<', 12), [(0, 20)]),
+    (('price', '==', 15), [(10, 20)]),
+    (('price', 'in', [1, 25]), [(0, 10), (20, 30)]),
+    (('price', '>', 100), []),
+    (('price', 'isnull'), []),
+    (('price', 'notnull'), [(0, 30)]),
+    (('name', '==', b'x'), [(0, 30)]),  # No statistics
+    ([('price', '>', 5), ('size', '>', 15)], [(0, 20)]),
+])
+def test_candidate_ranges(where, expected):
+    version = _version(_item(30), 10)
+    assert candidate_ranges(version, parse_where(where)) == expected
+
+
+def test_candidate_ranges_index_range():
+    version = _version(_item(30), 10)
+    assert candidate_ranges(version, parse_where(('price', '>', 5)), (12, 25)) == [(10, 30)]
+    assert candidate_ranges(version, parse_where(('price', '>', 5)), (None, 12)) == [(0, 20)]
+
+
+def test_candidate_ranges_rows_without_statistics():
+    version = _version(_item(30), 10)
+    version['up_to'] = 40
+    assert candidate_ranges(version, parse_where(('price', '>', 5))) == [(0, 30), (30, None)]
+    assert candidate_ranges(version, parse_where(('price', '>', 5)), (35, 38)) == [(35, 38)]
+    assert candidate_ranges(version, parse_where(('price', '>', 5)), (12, 25)) == [(10, 30)]
+    assert candidate_ranges(version, parse_where(('price', '>', 5)), (12, 30)) == [(10, 30)]
+
+
+def test_candidate_ranges_without_zone_map():
+    assert candidate_ranges({'up_to': 10}, parse_where(('price', '>', 5)), (2, None)) == [(2, None)]
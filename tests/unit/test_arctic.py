@@ -185,6 +185,17 @@ def test_register_library_type():
     assert "ArcticException: Library new_dummy_type already registered" in str(e)
 
 
+def test_get_cached_library_metadata():
+    m = MagicMock(spec=ArcticLibraryBinding, _cached_metadata=None, arctic=MagicMock())
+    find_one = m._library_coll.__getitem__.return_value.find_one
+    find_one.return_value = {'COMPRESSION_CODEC': 'zstd'}
+    assert ArcticLibraryBinding.get_cached_library_metadata(m, 'COMPRESSION_CODEC') == 'zstd'
+    assert ArcticLibraryBinding.get_cached_library_metadata(m, 'ZONE_MAPS') is None
+    assert find_one.call_count == 1
+    ArcticLibraryBinding.set_library_metadata(m, 'COMPRESSION_CODEC', 'lz4')
+    assert m._cached_metadata is None
+
+
 def test_set_quota():
     m = Mock(spec=ArcticLibraryBinding)
     ArcticLibraryBinding.set_quota(m, 10000)
@@ -1,6 +1,10 @@
+import numpy as np
+import pytest
 from mock import patch, Mock
 
-from arctic._compression import compress, compress_array, decompress, decompress_array, enable_parallel_lz4
+from arctic._compression import compress, compress_array, decompress, decompress_array, enable_parallel_lz4, \
+    decompressed_size, decompress_into, available_codecs, get_codec, enable_adaptive_compression, \
+    compression_stats, reset_compression_stats, _AdaptiveTuner
 
 
 def test_compress():
@@ -42,6 +46,112 @@ def test_decompress_array():
     assert decompress_array(compress_array(ll)) == ll
 
 
+def test_decompressed_size():
+    for _str in (b'', b'foo', b'spam ' * 10000):
+        assert decompressed_size(compress(_str)) == len(_str)
+
+
+@pytest.mark.parametrize('parallel', [True, False])
+def test_decompress_into(parallel):
+    chunks = [b'foo', b'', b'spam ' * 1000, b'bar']
+    buf = bytearray(sum(len(c) for c in chunks))
+    offsets = [0, 3, 3, 5003]
+    with patch('arctic._compression.ENABLE_PARALLEL', parallel):
+        # order of the chunks does not matter
+        decompress_into(reversed([(o, compress(c), 'lz4') for o, c in zip(offsets, chunks)]), memoryview(buf))
+    assert bytes(buf) == b''.join(chunks)
+
+
+@pytest.mark.parametrize('size, parallel', [(1000, False), (2 * 1024 ** 2, True)])
+def test_decompress_into_parallel_by_total_size(size, parallel):
+    buf = bytearray(2 * size)
+    pool = Mock(apply_async=Mock(side_effect=lambda f, args: Mock(get=lambda: f(*args))))
+    with patch('arctic._compression.ENABLE_PARALLEL', True), \
+            patch('arctic._compression._compress_pool_size', 2), \
+            patch('arctic._compression._get_compression_pool', return_value=pool):
+        decompress_into([(0, compress(b'x' * size), 'lz4'), (size, compress(b'y' * size), 'lz4')], memoryview(buf))
+    assert bytes(buf) == b'x' * size + b'y' * size
+    assert pool.apply_async.called == parallel
+
+
+def test_decompress_into_bounds_chunks_in_flight():
+    size = 1024 ** 2
+    in_flight, most_in_flight = [0], [0]
+
+    def _apply_async(f, args):
+        in_flight[0] += 1
+        most_in_flight[0] = max(most_in_flight[0], in_flight[0])
+
+        def _get():
+            in_flight[0] -= 1
+            f(*args)
+        return Mock(get=_get)
+
+    buf = bytearray(10 * size)
+    pool = Mock(apply_async=Mock(side_effect=_apply_async))
+    with patch('arctic._compression.ENABLE_PARALLEL', True), \
+            patch('arctic._compression._compress_pool_size', 2), \
+            patch('arctic._compression._get_compression_pool', return_value=pool):
+        decompress_into(((i * size, compress(b'x' * size), 'lz4') for i in range(10)), memoryview(buf))
+    assert bytes(buf) == b'x' * 10 * size
+    assert pool.apply_async.call_count == 10
+    assert most_in_flight[0] == 4
+
+
+def test_decompress_into_waits_for_chunks_in_flight_on_error():
+    size = 1024 ** 2
+    done = []
+    results = [Mock(get=Mock(side_effect=ValueError('bad chunk'))),
+               Mock(wait=Mock(side_effect=lambda: done.append(1)))]
+    pool = Mock(apply_async=Mock(side_effect=results))
+    with patch('arctic._compression.ENABLE_PARALLEL', True), \
+            patch('arctic._compression._compress_pool_size', 4), \
+            patch('arctic._compression._get_compression_pool', return_value=pool):
+        with pytest.raises(ValueError):
+            decompress_into([(0, b'', 'lz4'), (size, b'', 'lz4')], memoryview(bytearray(2 * size)))
+    assert done == [1]
+
+
+@pytest.mark.parametrize('codec', available_codecs())
+def test_codec_roundtrip(codec):
+    data = np.arange(1000, dtype='float64').tostring()
+    compressed = compress_array([data, b''], codec=codec, typesize=8)
+    assert [decompressed_size(c, codec) for c in compressed] == [len(data), 0]
+    assert decompress_array(compressed, codec=codec) == [data, b'']
+    assert decompress_array(compress_array([data], withHC=True, codec=codec, typesize=8), codec=codec) == [data]
+
+
+def test_shuffle_lz4_odd_typesize():
+    assert decompress(compress_array([b'abcdefg'], codec='shuffle_lz4', typesize=2)[0], 'shuffle_lz4') == b'abcdefg'
+
+
+def test_shuffle_lz4_compresses_numeric_data_better():
+    data = np.arange(100000, dtype='int64').tostring()
+    assert len(compress_array([data], codec='shuffle_lz4', typesize=8)[0]) < len(compress(data))
+
+
+def test_zstd_codec():
+    pytest.importorskip('zstandard')
+    assert 'zstd' in available_codecs()
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError) as e:
+        get_codec('snappy')
+    assert 'snappy' in str(e.value)
+
+
+@pytest.mark.parametrize('n, size, parallel', [(2, 1024 ** 2, True), (100, 1000, False), (1, 2 * 1024 ** 2, False)])
+def test_decompress_array_parallel_by_total_size(n, size, parallel):
+    a = [b'x' * size] * n
+    compressed = compress_array(a)
+    pool = Mock(map=Mock(side_effect=lambda f, chunks: [f(x) for x in chunks]))
+    with patch('arctic._compression.ENABLE_PARALLEL', True), \
+            patch('arctic._compression._get_compression_pool', return_value=pool):
+        assert decompress_array(compressed) == a
+    assert pool.map.called == parallel
+
+
 def test_compression_equal_regardless_parallel_mode():
     a = [b'spam '] * 666
     with patch('arctic._compression.ENABLE_PARALLEL', True):
@@ -60,5 +170,69 @@ def test_enable_parallel_lz4():
     assert(ENABLE_PARALLEL is False)
 
 
+def test_enable_adaptive_compression():
+    enable_adaptive_compression(True)
+    from arctic._compression import LZ4_ADAPTIVE
+    assert LZ4_ADAPTIVE is True
+    enable_adaptive_compression(False)
+    from arctic._compression import LZ4_ADAPTIVE
+    assert LZ4_ADAPTIVE is False
+
+
+def test_adaptive_compression_roundtrip():
+    a = [b'spam %d ' % i * 1000 for i in range(50)]
+    reset_compression_stats()
+    with patch('arctic._compression.LZ4_ADAPTIVE', True):
+        for _ in range(5):
+            assert decompress_array(compress_array(a)) == a
+        stats = compression_stats()
+    assert stats['adaptive'] is True
+    assert sum(stats['operations']['compress']['decisions'].values()) == 5
+    assert sum(stats['operations']['decompress']['decisions'].values()) == 5
+    assert 1 in stats['operations']['compress']['decisions']
+
+
+def test_adaptive_decompress_into():
+    chunks = [b'spam %d ' % i * 1000 for i in range(50)]
+    offsets = np.cumsum([0] + [len(c) for c in chunks[:-1]])
+    reset_compression_stats()
+    with patch('arctic._compression.LZ4_ADAPTIVE', True):
+        for _ in range(5):
+            buf = bytearray(sum(len(c) for c in chunks))
+            decompress_into([(int(o), compress(c), 'lz4') for o, c in zip(offsets, chunks)], memoryview(buf),
+                            nchunks=len(chunks))
+            assert bytes(buf) == b''.join(chunks)
+        stats = compression_stats()
+    decisions = stats['operations']['decompress_into']['decisions']
+    assert sum(decisions.values()) == 5
+    assert 1 in decisions and len(decisions) > 1
+
+
+def test_adaptive_tuner_tries_each_choice_then_picks_fastest():
+    tuner = _AdaptiveTuner(explore_every=1000)
+    assert tuner._candidates(8, 100) == [1, 2, 4, 8]
+    assert tuner._candidates(8, 3) == [1, 2, 3]
+    assert tuner._candidates(8, 1) == [1]
+    tried = []
+    for seconds in [1., 0.25, 0.5, 2.]:
+        workers = tuner.choose('compress', 1000, 100, 8)
+        tried.append(workers)
+        tuner.record('compress', 1000, 100, workers, seconds)
+    assert tried == [1, 2, 4, 8]
+    assert tuner.choose('compress', 1000, 100, 8) == 2
+    # a different chunk size is tuned separately
+    assert tuner.choose('compress', 10 ** 6, 100, 8) == 1
+    assert tuner.stats()['compress']['decisions'] == {1: 2, 2: 2, 4: 1, 8: 1}
+
+
+def test_adaptive_tuner_explores_runner_up():
+    tuner = _AdaptiveTuner(explore_every=3)
+    for workers, seconds in [(1, 1.), (2, 0.5)]:
+        assert tuner.choose('decompress', 1000, 2, 2) == workers
+        tuner.record('decompress', 1000, 2, workers, seconds)
+    assert tuner.choose('decompress', 1000, 2, 2) == 1  # 3rd call explores
+    assert tuner.choose('decompress', 1000, 2, 2) == 2
+
+
 def test_compress_empty_string():
     assert(decompress(compress(b'')) == b'')
@@ -13,7 +13,7 @@ from arctic.date._daterange import DateRange
 from arctic.date._mktz import mktz
 from arctic.exceptions import UnorderedDataException
 from arctic.tickstore.tickstore import TickStore, IMAGE_DOC, IMAGE, START, \
-    DTYPE, END, COUNT, SYMBOL, COLUMNS, ROWMASK, DATA, INDEX, IMAGE_TIME
+    DTYPE, END, COUNT, SYMBOL, COLUMNS, ROWMASK, DATA, INDEX, IMAGE_TIME, EMPTY_ROWMASK
 
 
 def test_mongo_date_range_query():
@@ -132,6 +132,26 @@ def get_coldata(coldata):
     return list(values), list(rowmask)
 
 
+def test_tickstore_to_bucket_sparse_columns():
+    data = [{'index': 1388534460000, 'B': 1.5, 'A': 1},
+            {'index': 1388534520000, 'A': 2},
+            {'index': 1388534580000, 'C': 'x', 'A': 3, 'B': 2.5}]
+    bucket, final_image = TickStore._to_bucket(data, 'SYM', {'index': dt(2014, 1, 1, tzinfo=mktz('UTC')), 'D': 4})
+    assert list(bucket[COLUMNS]) == ['B', 'A', 'C']
+    assert get_coldata(bucket[COLUMNS]['A']) == ([1, 2, 3], [1, 1, 1, 0, 0, 0, 0, 0])
+    assert get_coldata(bucket[COLUMNS]['B']) == ([1.5, 2.5], [1, 0, 1, 0, 0, 0, 0, 0])
+    assert get_coldata(bucket[COLUMNS]['C'])[1] == [0, 0, 1, 0, 0, 0, 0, 0]
+    assert list(np.cumsum(np.frombuffer(decompress(bucket[INDEX]), dtype='uint64'))) == [t['index'] for t in data]
+    assert final_image == {'index': 1388534580000, 'A': 3, 'B': 2.5, 'C': 'x', 'D': 4}
+
+
+def test_tickstore_to_bucket_out_of_order_in_the_middle():
+    data = [{'index': dt(2014, 1, 1, 0, i, tzinfo=mktz('UTC')), 'A': i} for i in (1, 2, 4, 3, 5)]
+    with pytest.raises(UnorderedDataException) as e:
+        TickStore._to_bucket(data, 'SYM', None)
+    assert "'A': 3" in str(e.value)
+
+
 def test_tickstore_pandas_to_bucket_image():
     symbol = 'SYM'
     tz = 'UTC'
@@ -150,13 +170,8 @@ def test_tickstore_pandas_to_bucket_image():
     assert set(bucket[COLUMNS]) == set(('A', 'B', 'D'))
     assert set(bucket[COLUMNS]['A']) == set((ROWMASK, DTYPE, DATA))
     assert get_coldata(bucket[COLUMNS]['A']) == ([120, 122, 3], [1, 1, 1, 0, 0, 0, 0, 0])
-    values, rowmask = get_coldata(bucket[COLUMNS]['B'])
-    assert np.isnan(values[0]) and values[1:] == [2.0, 3.0]
-    assert rowmask == [1, 1, 1, 0, 0, 0, 0, 0]
-    values, rowmask = get_coldata(bucket[COLUMNS]['D'])
-    assert np.isnan(values[1])
-    assert values[0] == 1 and values[2] == 1
-    assert rowmask == [1, 1, 1, 0, 0, 0, 0, 0]
+    assert get_coldata(bucket[COLUMNS]['B']) == ([2.0, 3.0], [0, 1, 1, 0, 0, 0, 0, 0])
+    assert get_coldata(bucket[COLUMNS]['D']) == ([1, 1], [1, 0, 1, 0, 0, 0, 0, 0])
     index = [dt.fromtimestamp(int(i/1000)).replace(tzinfo=mktz(tz)) for i in
              list(np.cumsum(np.frombuffer(decompress(bucket[INDEX]), dtype='uint64')))]
     assert index == tick_index
@@ -167,6 +182,56 @@ def test_tickstore_pandas_to_bucket_image():
                                  IMAGE_TIME: initial_image['index']}
 
 
+def test_tickstore_pandas_to_bucket_sparse():
+    tick_index = pd.date_range('2014-01-01', periods=4, tz=mktz('UTC'))
+    data = pd.DataFrame({'A': [1., np.nan, np.nan, 4.], 'B': [np.nan, np.nan, np.nan, 2.], 'S': ['a', None, None, 'b']},
+                        index=tick_index, columns=['A', 'B', 'S'])
+    bucket, _ = TickStore._pandas_to_bucket(data, 'SYM', None)
+    assert get_coldata(bucket[COLUMNS]['A']) == ([1., 4.], [1, 0, 0, 1, 0, 0, 0, 0])
+    assert get_coldata(bucket[COLUMNS]['B']) == ([2.], [0, 0, 0, 1, 0, 0, 0, 0])
+    assert get_coldata(bucket[COLUMNS]['S']) == (['a', 'b'], [1, 0, 0, 1, 0, 0, 0, 0])
+    # Rows without any value are kept in a mask of their own
+    assert list(np.unpackbits(np.frombuffer(decompress(bucket[EMPTY_ROWMASK]), dtype='uint8'))) == \
+        [0, 1, 1, 0, 0, 0, 0, 0]
+
+
+def test_tickstore_pandas_to_bucket_column_without_values():
+    tick_index = pd.date_range('2014-01-01', periods=3, tz=mktz('UTC'))
+    data = pd.DataFrame({'A': [1., np.nan, 3.], 'S': [None, np.nan, None], 'B': [np.nan] * 3},
+                        index=tick_index, columns=['A', 'S', 'B'])
+    bucket, _ = TickStore._pandas_to_bucket(data, 'SYM', None)
+    assert list(bucket[COLUMNS]) == ['A']
+    assert get_coldata(bucket[COLUMNS]['A']) == ([1., 3.], [1, 0, 1, 0, 0, 0, 0, 0])
+
+
+def test_tickstore_pandas_to_bucket_no_empty_rows():
+    tick_index = pd.date_range('2014-01-01', periods=2, tz=mktz('UTC'))
+    data = pd.DataFrame({'A': [1., np.nan], 'B': [np.nan, 2.]}, index=tick_index)
+    bucket, _ = TickStore._pandas_to_bucket(data, 'SYM', None)
+    assert EMPTY_ROWMASK not in bucket
+
+
+def test_rows_in_range():
+    index = np.array([10, 20, 20, 30, 40], dtype='uint64')
+    assert TickStore._rows_in_range(index, None) == (0, 5)
+    assert TickStore._rows_in_range(index, (20, 30)) == (1, 4)
+    assert TickStore._rows_in_range(index, (21, None)) == (3, 5)
+    assert TickStore._rows_in_range(index, (None, 19)) == (0, 1)
+    assert TickStore._rows_in_range(index, (41, 50)) == (5, 5)
+    assert TickStore._rows_in_range(index, (-5, 5)) == (0, 0)
+    # Ticks out of order aren't trimmed
+    assert TickStore._rows_in_range(index[::-1], (20, 30)) == (0, 5)
+
+
+def test_column_rows():
+    values = np.array([1., 2., 3.])
+    rowmask = np.array([1, 0, 1, 1, 0], dtype=bool)
+    trimmed, mask = TickStore._column_rows(values, rowmask, 1, 4)
+    assert list(trimmed) == [2., 3.]
+    assert list(mask) == [False, True, True]
+    assert TickStore._column_rows(values, rowmask, 0, 5)[0] is values
+
+
 def test__read_preference__allow_secondary_true():
     self = create_autospec(TickStore)
     assert TickStore._read_preference(self, True) == ReadPreference.NEAREST